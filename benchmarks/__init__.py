@@ -0,0 +1,12 @@
+"""Performance benchmarks.
+
+Run from the repository root, e.g.:
+
+    python3 -m benchmarks.bench_builder
+
+"""
+import os
+import sys
+
+# use the sources of this tree rather than an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
@@ -0,0 +1,56 @@
+"""Time the UmlBuilder phases on a large generated diagram.
+
+The build phase dispatches each parsed command to its handler and
+records the resulting graphic primitives; the render phase replays
+them into the SVG renderer and saves the file.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from umlsequence2.parser import Parser
+from umlsequence2.uml_builder import UmlBuilder
+
+
+def make_source(nb_messages: int, nb_objects: int = 8) -> str:
+    lines = [f'O{i} : Object {i}' for i in range(nb_objects)]
+    for i in range(nb_messages):
+        src, dst = i % nb_objects, (i * 3 + 1) % nb_objects
+        if src == dst:
+            lines.append(f'O{src} > self{i}()')
+        elif i % 5 == 0:
+            lines.append(f'O{src} => O{dst} result{i}')
+        else:
+            lines.append(f'O{src} -> O{dst} call{i}()')
+    return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=50_000)
+    parser.add_argument('--repeat', '-r', type=int, default=3)
+    args = parser.parse_args()
+
+    cmds, _ = Parser(make_source(args.messages)).parse()
+    print(f'{args.messages} messages, {len(cmds)} commands')
+
+    best: dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'bench.svg')
+        for _ in range(args.repeat):
+            builder = UmlBuilder(cmds, path, 100, 'white')
+            t0 = time.perf_counter()
+            builder.build()
+            t1 = time.perf_counter()
+            builder.render()
+            t2 = time.perf_counter()
+            for phase, t in (('build', t1 - t0), ('render', t2 - t1)):
+                best[phase] = min(best.get(phase, t), t)
+
+    for phase, t in best.items():
+        print(f'{phase:8s} {t:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Measure the memory and the garbage collector work of the UmlBuilder
+build phase, which records the graphic primitives in the draw list."""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from umlsequence2.parser import Parser
+from umlsequence2.uml_builder import UmlBuilder
+
+from .bench_builder import make_source
+
+
+def gc_collections() -> int:
+    return sum(s['collections'] for s in gc.get_stats())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=100_000)
+    args = parser.parse_args()
+
+    cmds, _ = Parser(make_source(args.messages)).parse()
+    builder = UmlBuilder(cmds, None, 100, 'white')
+    print(f'{args.messages} messages, {len(cmds)} commands')
+
+    gc.collect()
+    collections = gc_collections()
+    t0 = time.perf_counter()
+    builder.build()
+    t = time.perf_counter() - t0
+    collections = gc_collections() - collections
+    entries = sum(len(layer) for layer in builder.g.values())
+
+    builder = UmlBuilder(cmds, None, 100, 'white')
+    gc.collect()
+    tracemalloc.start()
+    builder.build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'draw list entries {entries:10d}')
+    print(f'build time        {t:10.3f} s')
+    print(f'gc collections    {collections:10d}')
+    print(f'retained memory   {current / 1024 / 1024:10.1f} MB')
+    print(f'peak memory       {peak / 1024 / 1024:10.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Compare PDF/EPS rendering through SVG (serialize, then re-parse with
+svglib) against drawing directly with reportlab."""
+import argparse
+import io
+import time
+from typing import Callable
+
+import umlsequence2
+from umlsequence2.converter import convert
+
+from .bench_builder import make_source
+
+
+def via_svg(source: str, format: str) -> bytes:
+    svg = io.BytesIO(umlsequence2.render(source, 'svg'))
+    out = io.BytesIO()
+    convert(svg, out, format)
+    return out.getvalue()
+
+
+def direct(source: str, format: str) -> bytes:
+    return umlsequence2.render(source, format)
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=2_000)
+    parser.add_argument('--repeat', '-r', type=int, default=3)
+    args = parser.parse_args()
+
+    source = make_source(args.messages)
+    print(f'{args.messages} messages')
+    for format in ('pdf', 'eps'):
+        for name, fn in (('via svg', via_svg), ('direct', direct)):
+            t = best_of(args.repeat, lambda: fn(source, format))
+            print(f'{format} {name:8s} {t:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
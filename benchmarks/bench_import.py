@@ -0,0 +1,74 @@
+"""Time importing the package, and running `umlsequence2 --version`, in
+fresh interpreters, as `python -X importtime` reports it. Also check
+that the rendering backends are not imported along with the package;
+they are imported on first use."""
+import argparse
+import subprocess
+import sys
+import time
+
+# modules that must not be imported by `import umlsequence2`
+HEAVY_MODULES = ['reportlab', 'svglib', 'svgwrite', 'pkg_resources']
+
+VERSION_SCRIPT = '''
+import sys
+import umlsequence2
+sys.argv = ['umlsequence2', '--version']
+umlsequence2.main()
+'''
+
+CHECK_SCRIPT = f'''
+import sys
+import umlsequence2
+print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+'''
+
+
+def import_time(module: str) -> float:
+    """Return the cumulative import time of module, in seconds."""
+    cmd = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    stderr = subprocess.run(cmd, capture_output=True, text=True, check=True).stderr
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative) / 1e6
+    raise RuntimeError(f'{module} not found in -X importtime output')
+
+
+def run_time(script: str) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, '-c', script], capture_output=True, check=True)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', '-r', type=int, default=5)
+    parser.add_argument(
+        '--max-ms',
+        type=float,
+        default=None,
+        help='fail if the import takes longer (best of the runs)',
+    )
+    args = parser.parse_args()
+
+    t_python = min(run_time('pass') for _ in range(args.repeat))
+    t_import = min(import_time('umlsequence2') for _ in range(args.repeat))
+    t_version = min(run_time(VERSION_SCRIPT) for _ in range(args.repeat))
+
+    out = subprocess.run(
+        [sys.executable, '-c', CHECK_SCRIPT], capture_output=True, text=True, check=True
+    ).stdout.split()
+
+    print(f'python startup  {t_python * 1000:8.1f} ms')
+    print(f'import          {t_import * 1000:8.1f} ms')
+    print(f'--version       {t_version * 1000:8.1f} ms  (including python startup)')
+    if out:
+        sys.exit(f'imported along with the package: {", ".join(out)}')
+    if args.max_ms is not None and t_import * 1000 > args.max_ms:
+        sys.exit(f'import takes {t_import * 1000:.1f} ms, more than {args.max_ms} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Time parsing and layout of diagrams with many lifelines, created and
+destroyed in turn, so that columns are constantly freed and reused.
+
+The former object bookkeeping, kept here for comparison, searched the
+lowest free column by scanning the columns of all live objects, and
+scanned all live objects to draw the new ones; its layout time grows
+with the cube of the number of lifelines, so it is only run on sizes
+up to --legacy-max.
+"""
+import argparse
+import time
+
+from umlsequence2.parser import Parser
+from umlsequence2.uml_builder import UmlBuilder
+
+
+class LegacyBuilder(UmlBuilder):
+    def compute_object_index(self) -> int:
+        if not self.objects_dic:
+            index = 0
+        else:
+            index = None
+            indices = [o.index for o in self.objects_dic.values()]
+            for i in range(len(self.objects_dic)):
+                if i not in indices:
+                    index = i
+                    break
+            if index is None:
+                index = max(indices) + 1
+        return index
+
+    def leave_objects(self) -> None:
+        self.run_objects = None
+        super().leave_objects()
+
+
+def make_source(nb_lifelines: int) -> str:
+    lines = [f'O{i} : Object {i}' for i in range(nb_lifelines)]
+    for i in range(nb_lifelines):
+        # destroy a lifeline, create one in its column, and use it
+        lines.append(f'O{i}~')
+        lines.append(f'N{i} : New {i}')
+        lines.append(f'N{i} -> O{i + 1} call{i}()' if i + 1 < nb_lifelines else 'N0 : ')
+    return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--legacy-max', type=int, default=1_000)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        t0 = time.perf_counter()
+        cmds, _ = Parser(make_source(n)).parse()
+        t_parse = time.perf_counter() - t0
+        print(f'{n:6d} lifelines: {"parse":13s} {t_parse:8.3f} s')
+
+        builders = [('layout', UmlBuilder)]
+        if n <= args.legacy_max:
+            builders.append(('legacy layout', LegacyBuilder))
+        for name, builder_class in builders:
+            t0 = time.perf_counter()
+            builder_class(cmds, None, 100, 'white').build()
+            t = time.perf_counter() - t0
+            print(f'{n:6d} lifelines: {name:13s} {t:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
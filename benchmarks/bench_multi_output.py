@@ -0,0 +1,36 @@
+"""Time rendering a diagram in several formats and zooms: once per
+output with render(), against a single parse and layout drawn by each
+output's backend with render_all(), sequentially and in parallel."""
+import argparse
+import time
+
+import umlsequence2
+
+from .bench_builder import make_source
+
+OUTPUTS = [(fmt, zoom) for fmt in ('svg', 'pdf', 'eps') for zoom in (100, 200)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=5_000)
+    parser.add_argument('--jobs', '-j', type=int, default=0)
+    args = parser.parse_args()
+
+    source = make_source(args.messages)
+    print(f'{args.messages} messages, {len(OUTPUTS)} outputs')
+
+    t0 = time.perf_counter()
+    for fmt, zoom in OUTPUTS:
+        umlsequence2.render(source, fmt, percent_zoom=zoom)
+    print(f'render() per output   {time.perf_counter() - t0:8.3f} s')
+
+    for jobs in (1, args.jobs):
+        t0 = time.perf_counter()
+        umlsequence2.render_all(source, OUTPUTS, jobs=jobs)
+        name = f'render_all(jobs={jobs})'
+        print(f'{name:21s} {time.perf_counter() - t0:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
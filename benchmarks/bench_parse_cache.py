@@ -0,0 +1,39 @@
+"""Time parsing a source against loading its commands serialized by
+dump_commands(), as done on a parse cache hit, e.g. when the same
+source is rendered at several zoom levels or in several formats."""
+import argparse
+import time
+
+from umlsequence2.parser import Parser, dump_commands, load_commands
+
+from .bench_builder import make_source
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=100_000)
+    args = parser.parse_args()
+
+    source = make_source(args.messages)
+
+    t0 = time.perf_counter()
+    cmds, _ = Parser(source).parse()
+    t_parse = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    data = dump_commands(cmds)
+    t_dump = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    loaded = load_commands(data)
+    t_load = time.perf_counter() - t0
+    assert loaded == cmds
+
+    print(f'{len(cmds)} commands, source {len(source):,} B, dumped {len(data):,} B')
+    print(f'parse {t_parse * 1000:8.1f} ms')
+    print(f'dump  {t_dump * 1000:8.1f} ms')
+    print(f'load  {t_load * 1000:8.1f} ms  ({t_parse / t_load:.1f}x faster than parse)')
+
+
+if __name__ == '__main__':
+    main()
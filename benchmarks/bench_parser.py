@@ -0,0 +1,68 @@
+"""Measure the parser speed in lines per second: identifying statements
+with the former cascade of regular expressions against the single
+statement regular expression, and parsing as a whole."""
+import argparse
+import re
+import time
+from typing import Any, Callable
+
+from umlsequence2.parser import (
+    CONSTRAINT_PATTERN,
+    MESSAGE_PATTERN,
+    OBJ_STATE_PATTERN,
+    Parser,
+)
+
+from .bench_builder import make_source
+
+# the former cascade, each regular expression being tried in turn
+RE_CONSTRAINT = re.compile(CONSTRAINT_PATTERN)
+RE_MESSAGE = re.compile(MESSAGE_PATTERN)
+RE_OBJ_STATE = re.compile(f'({OBJ_STATE_PATTERN})+')
+
+
+def cascade(line: str) -> Any:
+    terms = RE_CONSTRAINT.findall(line)
+    if terms:
+        return terms[0]
+    terms = RE_MESSAGE.findall(line)
+    if terms:
+        return terms[0]
+    terms = RE_OBJ_STATE.findall(line)
+    if terms == line.split():
+        return terms
+    return None
+
+
+def single(line: str) -> Any:
+    return Parser.RE_STATEMENT.match(line)
+
+
+def lines_per_second(fn: Callable[[str], Any], lines: list[str]) -> float:
+    t0 = time.perf_counter()
+    for line in lines:
+        fn(line)
+    return len(lines) / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=100_000)
+    args = parser.parse_args()
+
+    source = make_source(args.messages)
+    source += 'O0 {constraint}\nO1+ O2-\n' * (args.messages // 10)
+    lines = source.splitlines()
+    print(f'{len(lines)} lines')
+
+    for name, fn in (('cascade', cascade), ('single', single)):
+        print(f'statements, {name:8s} {lines_per_second(fn, lines):12,.0f} lines/s')
+
+    t0 = time.perf_counter()
+    Parser(source).parse()
+    speed = len(lines) / (time.perf_counter() - t0)
+    print(f'parse                 {speed:12,.0f} lines/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Time line-continuation preprocessing on a pathological input: long
+chains of '\\'-continued lines, deeply indented.
+
+The former implementation, kept here for comparison, repeated
+whole-input replacements once per level of indentation, so its time
+grows with input size times indentation; it is run on a fraction of
+the input only.
+"""
+import argparse
+import time
+
+from umlsequence2.parser import Parser
+
+
+def legacy_preprocess(raw: str) -> list[str]:
+    raw = raw.replace("\t", " ")
+    while raw.find("\\\n ") >= 0:
+        raw = raw.replace("\\\n ", "\\\n")
+    while raw.find(" \\\n") >= 0:
+        raw = raw.replace(" \\\n", "\\\n")
+    raw = raw.replace("\\\n", " ")
+    return raw.split('\n')
+
+
+def make_source(size: int, indent: int) -> str:
+    chunk = 'A -> B message \\\n' + ' ' * indent + 'continued  \\\n'
+    chunk += '\t' * indent + 'end\n'
+    return chunk * (size // len(chunk))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--megabytes', '-m', type=float, default=10)
+    parser.add_argument('--indent', '-i', type=int, default=1000)
+    parser.add_argument('--legacy-fraction', type=float, default=0.1)
+    args = parser.parse_args()
+
+    size = int(args.megabytes * 1024 * 1024)
+    raw = make_source(size, args.indent)
+    print(f'{len(raw) / 1024 / 1024:.1f} MB, indentation {args.indent}')
+
+    t0 = time.perf_counter()
+    Parser().preprocess(raw)
+    t = time.perf_counter() - t0
+    print(f'preprocess               {t:8.3f} s')
+
+    # (cut after a complete chain of continued lines)
+    part = raw[: raw.rfind('end\n', 0, int(len(raw) * args.legacy_fraction)) + 4]
+    t0 = time.perf_counter()
+    legacy = legacy_preprocess(part)
+    t = time.perf_counter() - t0
+    print(f'legacy, {args.legacy_fraction:4.0%} of the input {t:8.3f} s')
+    assert legacy[:-1] == Parser().preprocess(part)
+
+
+if __name__ == '__main__':
+    main()
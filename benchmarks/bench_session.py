@@ -0,0 +1,41 @@
+"""Compare rendering a diagram from scratch after each edit against an
+incremental Session, for edits at different positions."""
+import argparse
+import time
+
+import umlsequence2
+
+from .bench_builder import make_source
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=5_000)
+    parser.add_argument('--svg-writer', default='stream')
+    args = parser.parse_args()
+
+    lines = make_source(args.messages).splitlines()
+    session = umlsequence2.Session(svg_writer=args.svg_writer)
+    session.render('\n'.join(lines))
+    print(f'{args.messages} messages')
+
+    for percent in (99, 90, 50, 0):
+        i = len(lines) - 1 - (len(lines) - 1) * percent // 100
+        lines[i] += ' edited'
+        source = '\n'.join(lines)
+
+        t0 = time.perf_counter()
+        full = umlsequence2.render(source, svg_writer=args.svg_writer)
+        t1 = time.perf_counter()
+        incremental = session.render(source)
+        t2 = time.perf_counter()
+
+        assert full == incremental
+        print(
+            f'edit at {100 - percent:3d}% of lines: '
+            f'full {t1 - t0:8.3f} s, session {t2 - t1:8.3f} s'
+        )
+
+
+if __name__ == '__main__':
+    main()
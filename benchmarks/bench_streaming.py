@@ -0,0 +1,51 @@
+"""Compare the peak memory of parsing and laying out a large input file
+read whole, against parsing it as it is read (Parser.iter_commands)."""
+import argparse
+import os
+import tempfile
+import tracemalloc
+from typing import Callable
+
+from umlsequence2.parser import Parser
+from umlsequence2.uml_builder import UmlBuilder
+
+from .bench_builder import make_source
+
+
+def whole(path: str) -> None:
+    with open(path) as f:
+        cmds, _ = Parser(f.read()).parse()
+    UmlBuilder(cmds, None, 100, 'white').build()
+
+
+def streamed(path: str) -> None:
+    with open(path) as f:
+        UmlBuilder(Parser().iter_commands(f), None, 100, 'white').build()
+
+
+def peak_memory(fn: Callable[[str], None], path: str) -> int:
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'bench.umlsequence')
+        with open(path, 'w') as f:
+            f.write(make_source(args.messages))
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f'{args.messages} messages, {size:.1f} MB')
+        for name, fn in (('whole', whole), ('streamed', streamed)):
+            mb = peak_memory(fn, path) / 1024 / 1024
+            print(f'{name:8s} {mb:8.1f} MB peak')
+
+
+if __name__ == '__main__':
+    main()
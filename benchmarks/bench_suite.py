@@ -0,0 +1,201 @@
+"""Time each phase of rendering, on synthetic diagrams of various shapes,
+and compare the times against a baseline.
+
+Phases:
+  preprocess  Parser.preprocess()
+  parse       Parser.parse1()
+  layout      UmlBuilder.build()
+  svg         rendering to SVG, with the svgwrite writer (SvgRenderer)
+  svg_stream  rendering to SVG, with the stream writer
+  pdf         rendering to PDF, with the reportlab backend (RlRenderer)
+  index       UmlBuilder.spatial_index(), for viewports
+  viewport    rendering a VIEWPORT region amid the diagram to SVG, with
+              the stream writer, from the index
+
+Each time is the median of --repeat runs. Results can be saved as JSON
+(--output), e.g. to record a baseline; with --baseline, the run fails
+if a phase got slower than its baseline time by more than --threshold
+(and by more than --min-delta, as very short phases are noisy).
+
+    python3 -m benchmarks.bench_suite --output baseline.json
+    python3 -m benchmarks.bench_suite --baseline baseline.json
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Callable
+
+from umlsequence2.parser import Parser
+from umlsequence2.uml_builder import UmlBuilder
+
+from .workload import Shape, make_workload
+
+WORKLOADS = {
+    'messages': Shape(lifelines=8, messages=2_000),
+    'lifelines': Shape(lifelines=200, messages=2_000),
+    'nested': Shape(lifelines=8, messages=2_000, depth=8),
+    'frames': Shape(lifelines=8, messages=2_000, depth=2, frames=20),
+    'comments': Shape(lifelines=8, messages=2_000, comments=10),
+    'churn': Shape(lifelines=8, messages=2_000, churn=5),
+    'mixed': Shape(
+        lifelines=20, messages=2_000, depth=4, frames=50, comments=25, churn=10
+    ),
+}
+
+PHASES = [
+    'preprocess',
+    'parse',
+    'layout',
+    'svg',
+    'svg_stream',
+    'pdf',
+    'index',
+    'viewport',
+]
+
+# width, height in cm, of the region rendered by the viewport phase
+VIEWPORT = (20.0, 20.0)
+
+
+def time_phases(source: str, phases: list[str]) -> dict[str, float]:
+    """Run the phases on source once, and return the time of each."""
+    times: dict[str, float] = {}
+
+    def timed(phase: str, fn: Callable[[], Any]) -> Any:
+        t0 = time.perf_counter()
+        result = fn()
+        times[phase] = time.perf_counter() - t0
+        return result
+
+    # (later phases need the results of the earlier ones, so all run)
+    parser = Parser(source)
+    lines = timed('preprocess', lambda: parser.preprocess(source))
+    cmds = timed('parse', lambda: parser.parse1(lines))
+    builder = UmlBuilder(cmds, None, 100, 'white')
+    timed('layout', builder.build)
+
+    def render(
+        svg_writer: str,
+        viewport: tuple[float, float, float, float] | None = None,
+        format: str = 'svg',
+    ) -> bytes:
+        builder.format = format
+        builder.svg_writer = svg_writer
+        builder.gfx = builder.make_renderer()
+        fp = io.BytesIO()
+        builder.render(fp, viewport)
+        return fp.getvalue()
+
+    timed('svg', lambda: render('svgwrite'))
+    if 'svg_stream' in phases:
+        timed('svg_stream', lambda: render('stream'))
+    if 'pdf' in phases:
+        timed('pdf', lambda: render('svgwrite', format='pdf'))
+    if 'index' in phases or 'viewport' in phases:
+        timed('index', builder.spatial_index)
+    if 'viewport' in phases:
+        viewport = (0.0, builder.ypos / 2, *VIEWPORT)
+        timed('viewport', lambda: render('stream', viewport))
+    return {phase: times[phase] for phase in phases}
+
+
+def run(
+    workloads: list[str], phases: list[str], scale: float, repeat: int
+) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for name in workloads:
+        shape = WORKLOADS[name].scaled(scale)
+        source = make_workload(shape)
+        runs: dict[str, list[float]] = {}
+        for _ in range(repeat):
+            for phase, t in time_phases(source, phases).items():
+                runs.setdefault(phase, []).append(t)
+        median = {phase: statistics.median(ts) for phase, ts in runs.items()}
+        results[name] = {'shape': asdict(shape), 'phases': median}
+        print(f'{name:10s}', '  '.join(f'{p} {t:7.3f}' for p, t in median.items()))
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'workloads': results,
+    }
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float,
+    min_delta: float,
+) -> list[str]:
+    """Print the times relative to the baseline, and return the phases
+    that regressed, as 'workload/phase' strings."""
+    regressions = []
+    for name, result in results['workloads'].items():
+        base = baseline['workloads'].get(name)
+        if base is None:
+            continue
+        if base['shape'] != result['shape']:
+            print(f'{name:10s} skipped: not the same shape as the baseline')
+            continue
+        for phase, t in result['phases'].items():
+            t0 = base['phases'].get(phase)
+            if not t0:
+                continue
+            regressed = t > t0 * (1 + threshold) and t - t0 > min_delta
+            mark = '  REGRESSION' if regressed else ''
+            print(
+                f'{name:10s} {phase:10s} {t0:7.3f} -> {t:7.3f} s {t / t0:6.2f}x{mark}'
+            )
+            if regressed:
+                regressions.append(f'{name}/{phase}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--workloads', '-w', nargs='+', choices=WORKLOADS, default=list(WORKLOADS)
+    )
+    parser.add_argument('--phases', '-p', nargs='+', choices=PHASES, default=PHASES)
+    parser.add_argument(
+        '--scale', '-s', type=float, default=1.0, help='factor on the messages'
+    )
+    parser.add_argument('--repeat', '-r', type=int, default=5)
+    parser.add_argument('--output', '-o', help='save the results to this JSON file')
+    parser.add_argument('--baseline', '-b', help='compare against this JSON file')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='relative slowdown over the baseline that fails, default 0.2',
+    )
+    parser.add_argument(
+        '--min-delta',
+        type=float,
+        default=0.02,
+        help='absolute slowdown in s below which a phase never fails, ' 'default 0.02',
+    )
+    args = parser.parse_args()
+
+    results = run(args.workloads, args.phases, args.scale, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            sys.exit(f'regressions: {", ".join(regressions)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Compare the SVG writers: svgwrite document tree against text stream.
+Reports the best time and the peak memory of rendering to SVG."""
+import argparse
+import tracemalloc
+
+import umlsequence2
+
+from .bench_builder import make_source
+from .bench_formats import best_of
+
+
+def peak_memory(source: str, svg_writer: str) -> int:
+    tracemalloc.start()
+    umlsequence2.render(source, 'svg', svg_writer=svg_writer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', '-n', type=int, default=20_000)
+    parser.add_argument('--repeat', '-r', type=int, default=3)
+    args = parser.parse_args()
+
+    source = make_source(args.messages)
+    print(f'{args.messages} messages')
+    for svg_writer in umlsequence2.SVG_WRITERS:
+        t = best_of(
+            args.repeat,
+            lambda: umlsequence2.render(source, 'svg', svg_writer=svg_writer),
+        )
+        mb = peak_memory(source, svg_writer) / 1024 / 1024
+        print(f'{svg_writer:8s} {t:8.3f} s {mb:8.1f} MB peak')
+
+
+if __name__ == '__main__':
+    main()
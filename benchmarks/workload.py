@@ -0,0 +1,92 @@
+"""Generate synthetic diagrams of a given shape, for benchmarks.
+
+The diagram is a sequence of calls between lifelines O0, O1, ...:
+with depth 0, independent messages; otherwise, call trees nested up to
+that depth, each call activating its callee until it returns. Frames,
+comments, and creations/destructions of short-lived objects C0, C1, ...
+are interleaved every so many messages. The output only depends on
+the arguments.
+"""
+import random
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class Shape:
+    lifelines: int = 8
+    messages: int = 1_000  # calls and returns
+    depth: int = 0  # of nested activations
+    frames: int = 0  # a frame every so many messages, 0 for none
+    comments: int = 0  # a comment every so many messages, 0 for none
+    churn: int = 0  # an object created and destroyed every so many messages
+    seed: int = 0
+
+    def scaled(self, factor: float) -> 'Shape':
+        return Shape(**{**asdict(self), 'messages': int(self.messages * factor)})
+
+
+def make_workload(shape: Shape) -> str:
+    """Return the source of a diagram of the given shape."""
+    if shape.lifelines < 2:
+        raise ValueError('at least 2 lifelines are needed')
+    rnd = random.Random(shape.seed)
+    names = [f'O{i}' for i in range(shape.lifelines)]
+    lines = [f'{name} : {name.lower()}:Object' for name in names]
+
+    stack: list[str] = []  # callers and callees of the current call tree
+    frame: str | None = None  # the open frame
+    created: str | None = None  # the live short-lived object
+
+    def other(name: str | None) -> str:
+        while True:
+            choice = rnd.choice(names)
+            if choice != name:
+                return choice
+
+    def call(i: int) -> None:
+        if not stack:
+            stack.append(rnd.choice(names))
+        src, dst = stack[-1], other(stack[-1])
+        lines.append(f'{src} -> {dst} call{i}(arg)')
+        lines.append(f'{dst}+')
+        stack.append(dst)
+
+    def ret(i: int) -> None:
+        dst = stack.pop()
+        lines.append(f'{dst} => {stack[-1]} result{i}')
+        lines.append(f'{dst}-')
+        if len(stack) == 1:
+            stack.clear()
+
+    for i in range(shape.messages):
+        if shape.depth == 0:
+            src = rnd.choice(names)
+            lines.append(f'{src} -> {other(src)} call{i}(arg)')
+        elif len(stack) <= shape.depth and (len(stack) < 2 or rnd.random() < 0.5):
+            call(i)
+        else:
+            ret(i)
+
+        if shape.frames and i % shape.frames == 0:
+            if frame is None:
+                frame = f'F{i}'
+                lines.append(f'{frame} [ {rnd.choice(names)} frame {i}')
+            else:
+                lines.append(f'{rnd.choice(names)} ] {frame}')
+                frame = None
+        if shape.comments and i % shape.comments == 0:
+            lines.append(f'{rnd.choice(names)} // comment {i}')
+        if shape.churn and i % shape.churn == 0:
+            if created is not None:
+                lines.append(f'{rnd.choice(names)} #> {created}')
+            created = f'C{i}'
+            lines.append(f'{rnd.choice(names)} :> {created} c{i}:Created')
+
+    # close what is still open
+    while stack:
+        ret(shape.messages)
+    if frame is not None:
+        lines.append(f'{rnd.choice(names)} ] {frame}')
+    if created is not None:
+        lines.append(f'{rnd.choice(names)} #> {created}')
+    return '\n'.join(lines) + '\n'
@@ -47,6 +47,7 @@ setup(
     entry_points={
         "console_scripts": [
             "umlsequence2=umlsequence2:main",
+            "umlsequence2-client=umlsequence2.client:main",
         ],
     },
     project_urls={
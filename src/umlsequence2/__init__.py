@@ -12,38 +12,335 @@ Orchestrate the work.
 
 Parse commandline args, read input, generate diagram, and convert to
 desired output format.
+
+Library use: render(source) returns the diagram as bytes, render_to()
+writes it to a binary file object; neither touches the filesystem.
+Session renders successive versions of a diagram incrementally.
 """
 import argparse
+import functools
 import io
+import json
 import os
 import re
 import sys
-import tempfile
-from typing import TextIO
-
-import pkg_resources
+from typing import TYPE_CHECKING, Any, BinaryIO, Iterable, Iterator, Sequence, TextIO
 
-from .config import get_config, set_config
-from .converter import convert
-from .parser import Parser
-from .uml_builder import UmlBuilder
+from .cache import RenderCache, cache_key, default_directory, parse_key
+from .config import get_config, override_config, set_config
+from .pagination import paginate
+from .parser import Parser, dump_commands, load_commands
+from .session import Session
+from .spatial_index import check_viewport
+from .draw_list import DrawList
+from .uml_builder import SVG_WRITERS, UmlBuilder
 from . import error, model
 
-VERSION = pkg_resources.require("umlsequence2")[0].version
+if TYPE_CHECKING:
+    from reportlab.graphics.shapes import Drawing
+
+    from .profiling import Profile
+
+
+@functools.cache
+def get_version() -> str:
+    # looked up on first use, as reading the metadata takes time
+    from importlib.metadata import version
+
+    return version('umlsequence2')
+
 
+def __getattr__(name: str) -> Any:
+    # VERSION is kept for compatibility, and is computed lazily
+    if name == 'VERSION':
+        return get_version()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-def generate_svg(
-    input_fp: TextIO, output_path: str, percent_zoom: int, debug: bool, bgcolor: str
+
+RX_MARKDOWN_SNIPPET = re.compile(
+    r'^```\s*umlsequence\s+(?P<output>.*?)\s*' r'^(?P<src>.*?)^\s*```',
+    re.DOTALL | re.M,
+)
+
+
+def render_to(
+    fileobj: BinaryIO,
+    source: str | TextIO | list[model.Command],
+    fmt: str = 'svg',
+    *,
+    percent_zoom: int = 100,
+    bgcolor: str = 'white',
+    debug: bool = False,
+    svg_writer: str = 'svgwrite',
+    profile: 'Profile | None' = None,
+    viewport: Sequence[float] | None = None,
+    line_index: TextIO | None = None,
+    **config: Any,
 ) -> None:
-    cmds, raw = Parser(input_fp.read()).parse()
+    """Render the diagram described by source, and write it in the given
+    format to the binary file object fileobj.
+
+    source may also be a text file object, which is then parsed and laid
+    out as it is read, without holding the whole input in memory, or the
+    commands already parsed from it, see parse_cached().
+
+    svg_writer selects the SVG backend, 'svgwrite' or 'stream'; both
+    produce the same output, 'stream' is faster but does not validate
+    attribute values.
+
+    profile, a profiling.Profile, records measurements of the phases of
+    the render; the input is then parsed completely before layout.
 
-    if debug:
+    viewport, (x, y, width, height) in cm before zooming, renders only
+    that region of the diagram, drawing only the elements that intersect
+    it, see spatial_index.
+
+    line_index, a text file object, receives the line index of the whole
+    diagram, as JSON, see line_index; SVG_LINES=True tags the SVG
+    elements with their source lines.
+
+    Extra keyword arguments override configuration values, e.g.
+    COLUMN_WIDTH=3.5.
+    """
+    if svg_writer not in SVG_WRITERS:
+        raise ValueError(f'unknown SVG writer: {svg_writer}')
+    cfg = override_config(**config)
+    region = check_viewport(viewport)
+
+    # non-SVG formats are drawn directly with reportlab
+    options = (percent_zoom, bgcolor, cfg, fmt, svg_writer)
+    if profile is None:
+        builder = UmlBuilder(_commands(source, debug), None, *options)
+        builder.run(fileobj, region)
+    else:
+        with profile:
+            builder = _profiled_build(source, debug, profile, *options)
+            _profiled_render(builder, fileobj, profile, region)
+    if line_index is not None:
+        json.dump(builder.line_index(), line_index)
+
+
+def _commands(
+    source: str | TextIO | list[model.Command], debug: bool
+) -> Iterable[model.Command]:
+    cmds: Iterable[model.Command]
+    if isinstance(source, list):
+        cmds = source
+    elif debug:
+        if not isinstance(source, str):
+            source = source.read()
+        cmds, raw = Parser(source).parse()
         print(raw, file=sys.stderr)
         print("----------", file=sys.stderr)
         for cmd in cmds:
             print(cmd.cmd, ', '.join([repr(a) for a in cmd.args]))
+    elif isinstance(source, str):
+        cmds, _ = Parser(source).parse()
+    else:
+        cmds = Parser().iter_commands(source)
+    return cmds
+
+
+def _profiled_build(
+    source: str | TextIO | list[model.Command],
+    debug: bool,
+    profile: 'Profile',
+    *options: Any,
+) -> UmlBuilder:
+    # parse and lay out, as separate phases
+    with profile.phase('parse'):
+        cmds = list(_commands(source, debug))
+    profile.count_commands(cmds)
+    builder = UmlBuilder(cmds, None, *options)
+    with profile.phase('layout'):
+        builder.build()
+    profile.count_layers(builder.g)
+    return builder
+
+
+def _profiled_render(
+    builder: UmlBuilder,
+    fileobj: BinaryIO,
+    profile: 'Profile',
+    viewport: tuple[float, float, float, float] | None = None,
+    size: tuple[float, float] | None = None,
+) -> None:
+    with profile.phase('draw'):
+        builder.draw(viewport)
+        if size is not None:
+            builder.set_size(*size)
+    fp = io.BytesIO()
+    with profile.phase('write'):
+        builder.write(fp)
+    data = fp.getvalue()
+    profile.output_bytes += len(data)
+    fileobj.write(data)
 
-    UmlBuilder(cmds, output_path, percent_zoom, bgcolor).run()
+
+def render(
+    source: str | TextIO | list[model.Command], fmt: str = 'svg', **options: Any
+) -> bytes:
+    """Render the diagram described by source, and return it in the given
+    format. See render_to() for the options."""
+    fp = io.BytesIO()
+    render_to(fp, source, fmt, **options)
+    return fp.getvalue()
+
+
+def render_all(
+    source: str | TextIO | list[model.Command],
+    outputs: Iterable[tuple[str, int]],
+    *,
+    bgcolor: str = 'white',
+    debug: bool = False,
+    svg_writer: str = 'svgwrite',
+    jobs: int = 1,
+    profile: 'Profile | None' = None,
+    viewport: Sequence[float] | None = None,
+    line_index: TextIO | None = None,
+    **config: Any,
+) -> list[bytes]:
+    """Render the diagram described by source in each of the given
+    (format, percent zoom) outputs, and return them in the same order.
+
+    The diagram is parsed and laid out once, then drawn by each output's
+    backend; with jobs other than 1, outputs are drawn by that many
+    parallel processes (0 for one per CPU), unless profiled. See
+    render_to() for the other options.
+    """
+    if svg_writer not in SVG_WRITERS:
+        raise ValueError(f'unknown SVG writer: {svg_writer}')
+    if jobs < 0:
+        raise ValueError(f'jobs must be 0 or more: {jobs}')
+    cfg = override_config(**config)
+    region = check_viewport(viewport)
+
+    if profile is not None:
+        # (measured in this process, drawing the outputs in turn)
+        with profile:
+            builder = _profiled_build(source, debug, profile, 100, bgcolor, cfg)
+            if line_index is not None:
+                json.dump(builder.line_index(), line_index)
+            g = builder.g if region is None else builder.spatial_index().query(*region)
+            return [
+                _render_output(g, fmt, zoom, bgcolor, cfg, svg_writer, profile, region)
+                for fmt, zoom in outputs
+            ]
+
+    # (the layout does not depend on the format or zoom)
+    builder = UmlBuilder(_commands(source, debug), None, 100, bgcolor, cfg)
+    builder.build()
+    if line_index is not None:
+        json.dump(builder.line_index(), line_index)
+    g = builder.g if region is None else builder.spatial_index().query(*region)
+
+    tasks = [
+        (g, fmt, zoom, bgcolor, cfg, svg_writer, None, region) for fmt, zoom in outputs
+    ]
+    if jobs == 1 or len(tasks) < 2:
+        return [_render_output(*task) for task in tasks]
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        min(jobs or os.cpu_count() or 1, len(tasks)),
+        initializer=_init_worker,
+        initargs=(cfg,),
+    ) as executor:
+        return list(executor.map(_render_output, *zip(*tasks)))
+
+
+def _render_output(
+    g: dict[int, DrawList],
+    fmt: str,
+    percent_zoom: int,
+    bgcolor: str,
+    cfg: model.Config,
+    svg_writer: str,
+    profile: 'Profile | None' = None,
+    viewport: tuple[float, float, float, float] | None = None,
+) -> bytes:
+    # draw the layers of a laid out diagram; with viewport, g holds the
+    # region only, moved to the origin, see SpatialIndex.query(), and is
+    # drawn as is, in an output of the size of the region
+    builder = UmlBuilder([], None, percent_zoom, bgcolor, cfg, fmt, svg_writer)
+    builder.g = g
+    size = None if viewport is None else (viewport[2], viewport[3])
+    fp = io.BytesIO()
+    if profile is None:
+        builder.draw()
+        if size is not None:
+            builder.set_size(*size)
+        builder.write(fp)
+    else:
+        _profiled_render(builder, fp, profile, size=size)
+    return fp.getvalue()
+
+
+def render_pages(
+    source: str | TextIO | list[model.Command],
+    fmt: str = 'svg',
+    *,
+    page_width: float | None = None,
+    page_height: float | None = None,
+    percent_zoom: int = 100,
+    bgcolor: str = 'white',
+    debug: bool = False,
+    svg_writer: str = 'svgwrite',
+    **config: Any,
+) -> Iterator[bytes]:
+    """Render the diagram described by source split into pages of at
+    most page_width by page_height cm before zooming (None for no limit),
+    and return an iterator over the pages, by rows then columns, each a
+    separate document in the given format, rendered when iterated over.
+
+    Rows of pages end before messages, and repeat the headers of the
+    objects alive at their top; lifelines, activation bars and frames
+    continue across pages. See pagination, and render_to() for the other
+    options.
+    """
+    if svg_writer not in SVG_WRITERS:
+        raise ValueError(f'unknown SVG writer: {svg_writer}')
+    cfg = override_config(**config)
+
+    builder = UmlBuilder(_commands(source, debug), None, 100, bgcolor, cfg)
+    builder.build()
+    pages = paginate(builder, page_width, page_height)
+    return (
+        _render_output(page.g, fmt, percent_zoom, bgcolor, cfg, svg_writer)
+        for page in pages
+    )
+
+
+def _page_drawing(
+    g: dict[int, DrawList], percent_zoom: int, bgcolor: str, cfg: model.Config
+) -> 'Drawing':
+    # draw a page with reportlab, to add it to a PDF document
+    from .rl_renderer import RlRenderer
+
+    builder = UmlBuilder([], None, percent_zoom, bgcolor, cfg, 'pdf')
+    builder.g = g
+    builder.draw()
+    assert isinstance(builder.gfx, RlRenderer)
+    return builder.gfx.get_drawing()
+
+
+def parse_cached(source: str | TextIO, cache: RenderCache) -> list[model.Command]:
+    """Return the commands parsed from source, a string or a seekable
+    text file object, taking them from the cache if it has them."""
+    key = parse_key(source)
+    data = cache.load(key)
+    if data is not None:
+        try:
+            return load_commands(data)
+        except (EOFError, ValueError, TypeError):
+            pass  # corrupt entry: parse again, and replace it
+    if isinstance(source, str):
+        cmds, _ = Parser(source).parse()
+    else:
+        source.seek(0)
+        cmds = list(Parser().iter_commands(source))
+    cache.store(key, dump_commands(cmds))
+    return cmds
 
 
 def generate(
@@ -54,30 +351,274 @@ def generate(
     debug: bool,
     bgcolor: str,
     format: str,
+    cache: RenderCache | None = None,
+    svg_writer: str = 'svgwrite',
+    profile: 'Profile | None' = None,
+    viewport: Sequence[float] | None = None,
+    line_index: str | None = None,
 ) -> None:
-    if debug:
-        print(
-            dict(
-                input=input_fp.name,
-                output=output_path,
+    generate_outputs(
+        input_fp,
+        [(output_path, format, percent_zoom)],
+        verbose,
+        debug,
+        bgcolor,
+        cache,
+        svg_writer,
+        profile=profile,
+        viewport=viewport,
+        line_index=line_index,
+    )
+
+
+def generate_outputs(
+    input_fp: TextIO,
+    outputs: list[tuple[str, str, int]],
+    verbose: bool,
+    debug: bool,
+    bgcolor: str,
+    cache: RenderCache | None = None,
+    svg_writer: str = 'svgwrite',
+    jobs: int = 1,
+    profile: 'Profile | None' = None,
+    viewport: Sequence[float] | None = None,
+    line_index: str | None = None,
+) -> None:
+    """Generate the given (output path, format, percent zoom) outputs of
+    the same input, parsing and laying it out once, see render_all(),
+    and the line index file line_index, if given."""
+    for output_path, format, percent_zoom in outputs:
+        if debug:
+            print(
+                dict(
+                    input=input_fp.name,
+                    output=output_path,
+                    percent_zoom=percent_zoom,
+                    debug=debug,
+                    bgcolor=bgcolor,
+                    format=format,
+                ),
+                file=sys.stderr,
+            )
+
+        if verbose:
+            print(f'umlsequence2: generating file \'{output_path}\'', file=sys.stderr)
+
+    # parse the input as it is read, unless it must be kept for hashing
+    source: str | TextIO = input_fp
+    if cache and not input_fp.seekable():
+        source = input_fp.read()
+
+    # debug output requires actual parsing, and profiling and the line
+    # index actual rendering, so bypass the cache
+    todo: list[tuple[str, str, int, str | None]] = []
+    cmds = None
+    if cache and not debug and profile is None and line_index is None:
+        # (viewports are only part of the keys of viewports, so that the
+        # keys of whole diagrams stay the same)
+        region = {} if viewport is None else dict(viewport=list(viewport))
+        for output_path, format, percent_zoom in outputs:
+            if source is input_fp:
+                input_fp.seek(0)
+            key = cache_key(
+                source,
+                get_config(),
                 percent_zoom=percent_zoom,
-                debug=debug,
                 bgcolor=bgcolor,
                 format=format,
-            ),
-            file=sys.stderr,
-        )
+                version=get_version(),
+                **region,
+            )
+            if cache.fetch(key, output_path):
+                if verbose:
+                    print(
+                        f'umlsequence2: \'{output_path}\' from cache', file=sys.stderr
+                    )
+            else:
+                todo.append((output_path, format, percent_zoom, key))
+        if not todo:
+            return
+        if source is input_fp:
+            input_fp.seek(0)
+        # the same source may have been rendered with other parameters
+        cmds = parse_cached(source, cache)
+    else:
+        todo = [(path, format, zoom, None) for path, format, zoom in outputs]
 
+    # render fully before creating the files, so errors leave no file
+    index = io.StringIO() if line_index else None
+    datas = render_all(
+        source if cmds is None else cmds,
+        [(format, percent_zoom) for _, format, percent_zoom, _ in todo],
+        bgcolor=bgcolor,
+        debug=debug,
+        svg_writer=svg_writer,
+        jobs=jobs,
+        profile=profile,
+        viewport=viewport,
+        line_index=index,
+    )
+    for (output_path, _, _, key), data in zip(todo, datas):
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        if cache and key:
+            cache.store(key, data)
+    if line_index and index:
+        write_line_index(line_index, index.getvalue(), verbose)
+
+
+def write_line_index(path: str, data: str, verbose: bool) -> None:
     if verbose:
-        print(f'umlsequence2: generating file \'{output_path}\'', file=sys.stderr)
+        print(f'umlsequence2: generating file \'{path}\'', file=sys.stderr)
+    with open(path, 'w') as f:
+        f.write(data)
 
-    if format == 'svg':
-        generate_svg(input_fp, output_path, percent_zoom, debug, bgcolor)
-    else:
-        with tempfile.TemporaryDirectory() as d:
-            path = os.path.join(d, 'file.svg')
-            generate_svg(input_fp, path, percent_zoom, debug, bgcolor)
-            convert(path, output_path, format)
+
+def generate_pages(
+    input_fp: TextIO,
+    outputs: list[tuple[str, str, int]],
+    verbose: bool,
+    debug: bool,
+    bgcolor: str,
+    svg_writer: str,
+    page_width: float | None,
+    page_height: float | None,
+) -> None:
+    """Generate the given (output path, format, percent zoom) outputs of
+    the same input split into pages, see render_pages(). A PDF output is
+    a single document of several pages; other formats are written to a
+    file per page, suffixed with -pN. Each page is written as soon as it
+    is rendered."""
+    from .converter import draw_pages_to
+
+    cfg = get_config()
+    builder = UmlBuilder(_commands(input_fp, debug), None, 100, bgcolor, cfg)
+    builder.build()
+    for output_path, format, percent_zoom in outputs:
+        pages = paginate(builder, page_width, page_height)
+        if format == 'pdf':
+            if verbose:
+                print(
+                    f'umlsequence2: generating file \'{output_path}\'', file=sys.stderr
+                )
+            drawings = (
+                _page_drawing(page.g, percent_zoom, bgcolor, cfg) for page in pages
+            )
+            with open(output_path, 'wb') as f:
+                draw_pages_to(drawings, f)
+            continue
+        base, ext = os.path.splitext(output_path)
+        for i, page in enumerate(pages, 1):
+            path = f'{base}-p{i}{ext}'
+            if verbose:
+                print(f'umlsequence2: generating file \'{path}\'', file=sys.stderr)
+            data = _render_output(
+                page.g, format, percent_zoom, bgcolor, cfg, svg_writer
+            )
+            with open(path, 'wb') as f:
+                f.write(data)
+
+
+def generate_snippets(
+    snippets: list[tuple[str, str]], args: argparse.Namespace
+) -> list[str | None]:
+    """Generate the given (output name, source) snippets, and return the
+    error of each snippet, or None if it succeeded.
+
+    Snippets writing the same output are generated in order by the
+    same task, so that the last one wins, as when run sequentially.
+    """
+    groups: dict[str, list[int]] = {}
+    for i, (name, _) in enumerate(snippets):
+        groups.setdefault(name, []).append(i)
+    tasks = [[(i, *snippets[i]) for i in indices] for indices in groups.values()]
+    options = dict(
+        percent_zoom=args.percent_zoom,
+        verbose=args.verbose,
+        debug=args.debug,
+        bgcolor=args.background_color,
+        format=args.format,
+        cache=get_cache(args),
+        svg_writer=args.svg_writer,
+    )
+    jobs = args.jobs or os.cpu_count()
+    errors: list[str | None] = [None] * len(snippets)
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        jobs, initializer=_init_worker, initargs=(get_config(),)
+    ) as executor:
+        futures = [
+            executor.submit(_generate_snippet_task, task, options) for task in tasks
+        ]
+        for future in futures:
+            for i, error in future.result():
+                errors[i] = error
+    return errors
+
+
+def _init_worker(cfg: model.Config) -> None:
+    # apply the config overrides; backends are imported on first use
+    set_config(cfg)
+
+
+def _generate_snippet_task(
+    task: list[tuple[int, str, str]], options: dict[str, Any]
+) -> list[tuple[int, str | None]]:
+    results: list[tuple[int, str | None]] = []
+    for i, name, src in task:
+        inp = io.StringIO(src)
+        inp.name = name
+        try:
+            generate(inp, name, **options)
+        except model.UmlSequenceError as e:
+            results.append((i, str(e)))
+        else:
+            results.append((i, None))
+    return results
+
+
+def get_cache(args: argparse.Namespace) -> RenderCache | None:
+    if args.no_cache:
+        return None
+    return RenderCache(
+        args.cache_dir or default_directory(), args.cache_size * 1024 * 1024
+    )
+
+
+def job_count(text: str) -> int:
+    jobs = int(text)
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f'expected 0 or more: {text}')
+    return jobs
+
+
+def percent_zoom_list(text: str) -> list[int]:
+    return [int(zoom) for zoom in text.split(',')]
+
+
+def viewport_rect(text: str) -> tuple[float, float, float, float]:
+    values = [float(v) for v in text.split(',')]
+    if len(values) != 4 or values[2] <= 0 or values[3] <= 0:
+        raise argparse.ArgumentTypeError(
+            f'expected X,Y,WIDTH,HEIGHT, with a positive size: {text}'
+        )
+    x, y, w, h = values
+    return x, y, w, h
+
+
+def output_paths(
+    name: str, formats: list[str], percent_zooms: list[int]
+) -> list[tuple[str, str, int]]:
+    """Return the (path, format, percent zoom) outputs for all the
+    formats and zooms, named after name."""
+    base = os.path.splitext(name)[0]
+    outputs = []
+    for format in formats:
+        for percent_zoom in percent_zooms:
+            suffix = f'-{percent_zoom}' if len(percent_zooms) > 1 else ''
+            outputs.append((f'{base}{suffix}.{format}', format, percent_zoom))
+    return outputs
 
 
 def parse_args() -> argparse.Namespace:
@@ -110,22 +651,105 @@ def parse_args() -> argparse.Namespace:
         '```umlsequence OUTFILE, and closing marker: ```',
     )
 
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        metavar='N',
+        required=False,
+        default=1,
+        type=job_count,
+        help='with --markdown, generate snippets with N parallel processes '
+        '(0 for one per CPU), reporting all failed snippets; with several '
+        'formats or zooms, draw the outputs with N parallel processes; '
+        'default is 1',
+    )
+
     parser.add_argument(
         '--format',
         '-f',
         required=False,
         default='svg',
         help='output format: gif, jpg, tiff, bmp, pnm, eps, '
-        'pdf, svg (any supported by reportlab); default is svg',
+        'pdf, svg (any supported by reportlab), or a comma-separated list '
+        'of formats, e.g. svg,png,pdf, all generated from a single layout '
+        'into files named after the output file; default is svg',
+    )
+
+    parser.add_argument(
+        '--svg-writer',
+        required=False,
+        default='svgwrite',
+        choices=SVG_WRITERS,
+        help='SVG backend: \'svgwrite\' builds and validates a document '
+        'tree, \'stream\' writes elements directly, which is faster and '
+        'uses less memory; the output is the same; default is svgwrite',
+    )
+
+    parser.add_argument(
+        '--svg-symbols',
+        action='store_true',
+        default=False,
+        help='in SVG output, define actors, crosses and arrow heads once, '
+        'and reference them, for smaller files',
+    )
+
+    parser.add_argument(
+        '--svg-lines',
+        action='store_true',
+        default=False,
+        help='in SVG output, group the elements drawn from each source line '
+        '(or range of lines) under a data-line attribute',
+    )
+
+    parser.add_argument(
+        '--line-index',
+        metavar='FILE',
+        required=False,
+        help='also write to FILE, as JSON, the bounding boxes of the '
+        'elements drawn from each source line or range of lines, for '
+        'editors; bypasses the render cache',
     )
 
     parser.add_argument(
         '--percent-zoom',
         '-p',
         required=False,
-        default=100,
-        type=int,
-        help='magnification percentage; default is 100',
+        default=[100],
+        type=percent_zoom_list,
+        help='magnification percentage, or a comma-separated list of them, '
+        'e.g. 100,200, each generated into a file whose name is suffixed '
+        'with -PERCENT; default is 100',
+    )
+
+    parser.add_argument(
+        '--page-height',
+        metavar='CM',
+        required=False,
+        type=float,
+        help='split the diagram into pages of at most CM centimeters high '
+        '(before zooming), between messages, repeating the object headers '
+        'at the top of each page; PDF output is a document of several '
+        'pages, other formats a file per page, suffixed with -pN; '
+        'bypasses the render cache',
+    )
+
+    parser.add_argument(
+        '--page-width',
+        metavar='CM',
+        required=False,
+        type=float,
+        help='split the diagram into pages of at most CM centimeters wide '
+        '(before zooming), between lifelines; see --page-height',
+    )
+
+    parser.add_argument(
+        '--viewport',
+        metavar='X,Y,W,H',
+        required=False,
+        type=viewport_rect,
+        help='render only the region of W by H centimeters at X,Y of the '
+        'diagram (before zooming), drawing only the elements that '
+        'intersect it',
     )
 
     parser.add_argument(
@@ -139,6 +763,77 @@ def parse_args() -> argparse.Namespace:
         ' for a list of valid names; default is white',
     )
 
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        default=False,
+        help='always generate output files, instead of copying unchanged '
+        'diagrams from the render cache',
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        required=False,
+        help='render cache directory; default is '
+        '$XDG_CACHE_HOME/umlsequence2 or ~/.cache/umlsequence2',
+    )
+
+    parser.add_argument(
+        '--cache-size',
+        metavar='MB',
+        required=False,
+        default=100,
+        type=int,
+        help='render cache size limit, least recently used diagrams are '
+        'evicted beyond it; default is 100',
+    )
+
+    parser.add_argument(
+        '--serve',
+        metavar='SOCKET',
+        nargs='?',
+        const='-',
+        help='run as a persistent render server, reading JSON-lines jobs '
+        'from the Unix socket SOCKET, or from stdin if SOCKET is omitted '
+        'or \'-\'; see umlsequence2-client',
+    )
+
+    parser.add_argument(
+        '--watch',
+        metavar='DIR',
+        action='append',
+        help='watch the .umlsequence and markdown files of DIR (may be '
+        'repeated), and regenerate the diagrams of changed files and '
+        'changed markdown snippets, until interrupted',
+    )
+
+    parser.add_argument(
+        '--once',
+        action='store_true',
+        default=False,
+        help='with --watch, generate the diagrams of all the files once, ' 'then exit',
+    )
+
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='text',
+        choices=['text', 'json'],
+        help='report the time, CPU time and peak memory of each phase of '
+        'the render, the number of commands per kind, of draw list entries '
+        'per layer, and the output size, to stderr, as text or JSON; '
+        'bypasses the render cache',
+    )
+
+    parser.add_argument(
+        '--profile-dump',
+        metavar='FILE',
+        required=False,
+        help='with --profile, run each phase under cProfile, and write the '
+        'statistics of the slowest phase to FILE, for pstats or snakeviz',
+    )
+
     parser.add_argument(
         '--verbose', action='store_true', default=False, help='emits verbose messages'
     )
@@ -163,10 +858,46 @@ def parse_args() -> argparse.Namespace:
         )
 
     args = parser.parse_args()
-    args.format = args.format.lower()
+    args.formats = list(dict.fromkeys(f for f in args.format.lower().split(',') if f))
+    args.percent_zooms = list(dict.fromkeys(args.percent_zoom))
+    if not args.formats:
+        parser.error('argument --format/-f: no format given')
+    args.format = args.formats[0]
+    args.percent_zoom = args.percent_zooms[0]
+    if len(args.formats) * len(args.percent_zooms) > 1:
+        if args.markdown or args.watch or args.serve:
+            parser.error('several formats or zooms require an input file')
+    if args.profile_dump and not args.profile:
+        parser.error('argument --profile-dump: requires --profile')
+    args.paged = args.page_height is not None or args.page_width is not None
+    if args.paged and (args.markdown or args.watch or args.serve or args.profile):
+        parser.error(
+            'arguments --page-height/--page-width: not supported with '
+            '--markdown, --watch, --serve or --profile'
+        )
+    if args.viewport and (args.paged or args.markdown or args.watch or args.serve):
+        parser.error(
+            'argument --viewport: not supported with --page-height, '
+            '--page-width, --markdown, --watch or --serve'
+        )
+    if args.line_index and (
+        args.paged or args.viewport or args.markdown or args.watch or args.serve
+    ):
+        parser.error(
+            'argument --line-index: not supported with --page-height, '
+            '--page-width, --viewport, --markdown, --watch or --serve'
+        )
+    if args.profile and (args.markdown or args.watch or args.serve):
+        parser.error(
+            'argument --profile: not supported with --markdown, ' '--watch or --serve'
+        )
 
     # parse back config modifiers args
     conf_args = {k: args.__dict__[k] for k in conf_keys if args.__dict__[k] is not None}
+    if args.svg_symbols:
+        conf_args['SVG_SYMBOLS'] = True
+    if args.svg_lines:
+        conf_args['SVG_LINES'] = True
     if conf_args:
         cfg.update(conf_args)
         set_config(model.Config(**cfg))
@@ -174,34 +905,45 @@ def parse_args() -> argparse.Namespace:
     return args
 
 
-def run(args: argparse.Namespace) -> None:
+def run(args: argparse.Namespace, profile: 'Profile | None' = None) -> None:
     # treat input
     if args.INPUT_FILE is None:
         inp = sys.stdin
     else:
         inp = open(args.INPUT_FILE)
 
+    cache = get_cache(args)
+
     # markdown
     if args.markdown:
-        rx = re.compile(
-            r'^```\s*umlsequence\s+(?P<output>.*?)\s*' r'^(?P<src>.*?)^\s*```',
-            re.DOTALL | re.M,
-        )
         md = inp.read()
-        for snippet in rx.finditer(md):
-            inp = io.StringIO(snippet['src'])
-            name = snippet['output']
-            inp.name = name
-            generate(
-                inp,
-                name,
-                args.percent_zoom,
-                args.debug,
-                args.verbose,
-                args.background_color,
-                args.format,
-            )
-            print(f'{sys.argv[0]}: generated {name}', file=sys.stderr)
+        snippets = [(m['output'], m['src']) for m in RX_MARKDOWN_SNIPPET.finditer(md)]
+
+        if args.jobs == 1:
+            for name, src in snippets:
+                inp = io.StringIO(src)
+                inp.name = name
+                generate(
+                    inp,
+                    name,
+                    args.percent_zoom,
+                    args.verbose,
+                    args.debug,
+                    args.background_color,
+                    args.format,
+                    cache,
+                    args.svg_writer,
+                )
+                print(f'{sys.argv[0]}: generated {name}', file=sys.stderr)
+            return
+
+        errors = generate_snippets(snippets, args)
+        for (name, _), error in zip(snippets, errors):
+            if error is None:
+                print(f'{sys.argv[0]}: generated {name}', file=sys.stderr)
+        failed = [f'{name}: {e}' for (name, _), e in zip(snippets, errors) if e]
+        if failed:
+            raise model.UmlSequenceError('\n'.join(failed))
         return
 
     # treat output
@@ -213,46 +955,126 @@ def run(args: argparse.Namespace) -> None:
     else:
         name = args.output_file
 
+    several = len(args.formats) * len(args.percent_zooms) > 1
+    if name == '-' and several:
+        raise model.UmlSequenceError(
+            'several formats or zooms require an input or output file name'
+        )
+    if name == '-' and args.paged:
+        raise model.UmlSequenceError('pages require an input or output file name')
+
     if name == '-':
         # output to stdout
-        with tempfile.TemporaryDirectory() as d:
-            path = os.path.join(d, 'file.svg')
-            generate(
-                inp,
-                path,
-                args.percent_zoom,
-                args.debug,
-                args.verbose,
-                args.background_color,
-                args.format,
-            )
-            with open(path) as f:
-                print(f.read())
+        index = io.StringIO() if args.line_index else None
+        render_to(
+            sys.stdout.buffer,
+            inp,
+            args.format,
+            percent_zoom=args.percent_zoom,
+            bgcolor=args.background_color,
+            debug=args.debug,
+            svg_writer=args.svg_writer,
+            profile=profile,
+            viewport=args.viewport,
+            line_index=index,
+        )
+        if args.line_index and index:
+            write_line_index(args.line_index, index.getvalue(), args.verbose)
+    elif args.paged:
+        # output to a file per page, or a document of several pages
+        generate_pages(
+            inp,
+            output_paths(name, args.formats, args.percent_zooms),
+            args.verbose,
+            args.debug,
+            args.background_color,
+            args.svg_writer,
+            args.page_width,
+            args.page_height,
+        )
+    elif several:
+        # output to files, from a single layout
+        generate_outputs(
+            inp,
+            output_paths(name, args.formats, args.percent_zooms),
+            args.verbose,
+            args.debug,
+            args.background_color,
+            cache,
+            args.svg_writer,
+            args.jobs,
+            profile,
+            args.viewport,
+            args.line_index,
+        )
     else:
         # output to file
         generate(
             inp,
             name,
             args.percent_zoom,
-            args.debug,
             args.verbose,
+            args.debug,
             args.background_color,
             args.format,
+            cache,
+            args.svg_writer,
+            profile,
+            args.viewport,
+            args.line_index,
         )
 
 
+def report_profile(profile: 'Profile', args: argparse.Namespace) -> None:
+    if args.profile == 'json':
+        print(json.dumps(profile.to_dict(), indent=2), file=sys.stderr)
+    else:
+        print(profile.format(), file=sys.stderr)
+    if args.profile_dump:
+        name = profile.dump_hottest(args.profile_dump)
+        if name is not None:
+            print(
+                f'umlsequence2: cProfile statistics of phase \'{name}\' '
+                f'written to \'{args.profile_dump}\'',
+                file=sys.stderr,
+            )
+
+
 def main() -> None:
     args = parse_args()
 
     # version?
     if args.version:
-        print('umlsequence2', VERSION)
+        print('umlsequence2', get_version())
+        sys.exit(0)
+
+    # server?
+    if args.serve:
+        from .server import serve
+
+        serve(args.serve)
         sys.exit(0)
 
+    # watch?
+    if args.watch:
+        from .watch import watch
+
+        nb_errors = watch(args.watch, args, args.once)
+        sys.exit(1 if args.once and nb_errors else 0)
+
+    profile = None
+    if args.profile:
+        from .profiling import Profile
+
+        profile = Profile(cprofile=args.profile_dump is not None)
+
     try:
-        run(args)
+        run(args, profile)
     except model.UmlSequenceError as e:
         error.print_error(str(e))
         sys.exit(1)
 
+    if profile is not None:
+        report_profile(profile, args)
+
     sys.exit(0)
@@ -0,0 +1,164 @@
+"""Content-addressed cache of rendered diagrams.
+
+Entries are keyed by a hash of everything the output depends on:
+source text, effective configuration, render parameters, and the
+package version and code. A hit is copied to the output file instead
+of being generated again.
+
+The commands parsed from a source are cached too, keyed by the source
+only, so that rendering it with other parameters skips parsing.
+
+The cache directory is bounded in size; when it grows too large, the
+least recently used entries are evicted (hits refresh the entry's
+modification time).
+"""
+import dataclasses
+import functools
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, TextIO
+
+from . import model
+
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+# eviction frees the cache down to this fraction of its size limit, so
+# that the following stores do not evict again
+EVICT_RATIO = 0.9
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def default_directory() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'umlsequence2')
+
+
+@functools.cache
+def code_fingerprint() -> str:
+    # so that a modified installation does not reuse stale entries
+    h = hashlib.sha256()
+    here = os.path.dirname(__file__)
+    for name in sorted(os.listdir(here)):
+        if name.endswith('.py'):
+            st = os.stat(os.path.join(here, name))
+            h.update(f'{name}:{st.st_size}:{st.st_mtime_ns};'.encode())
+    return h.hexdigest()
+
+
+def hash_source(h: Any, source: str | TextIO) -> None:
+    if isinstance(source, str):
+        h.update(source.encode('utf-8'))
+    else:
+        # (by chunks, so that large inputs are not held in memory)
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), ''):
+            h.update(chunk.encode('utf-8'))
+
+
+def cache_key(source: str | TextIO, cfg: model.Config, **params: Any) -> str:
+    """Return the key of source, a string or a text file object, which
+    is then read to its end, rendered with the given config and
+    parameters."""
+    h = hashlib.sha256()
+    blob = json.dumps(
+        [dataclasses.asdict(cfg), params, code_fingerprint()],
+        sort_keys=True,
+    )
+    h.update(blob.encode('utf-8'))
+    hash_source(h, source)
+    return h.hexdigest()
+
+
+def parse_key(source: str | TextIO) -> str:
+    """Return the key of the commands parsed from source, like
+    cache_key(). Serialized commands depend on the Python version."""
+    h = hashlib.sha256()
+    blob = json.dumps(['commands', sys.implementation.cache_tag, code_fingerprint()])
+    h.update(blob.encode('utf-8'))
+    hash_source(h, source)
+    return h.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        # total size of the entries, scanned on the first store, then
+        # kept up to date by this instance (others may share the cache,
+        # so it is scanned again on eviction)
+        self.size: int | None = None
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """Copy the entry to output_path and return True, or return
+        False if there is no such entry."""
+        path = self.path(key)
+        try:
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            return False
+        os.utime(path)
+        return True
+
+    def load(self, key: str) -> bytes | None:
+        """Return the entry, or None if there is no such entry."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def store(self, key: str, data: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # write atomically, as parallel jobs may share the cache
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        path = self.path(key)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self.size is None:
+            self.evict()
+            return
+        self.size += len(data) - replaced
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used entries, if the cache exceeds
+        max_size, down to EVICT_RATIO of it."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        limit = self.max_size if total <= self.max_size else self.max_size * EVICT_RATIO
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # evicted by a parallel job
+            total -= size
+        self.size = total
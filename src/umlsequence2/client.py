@@ -0,0 +1,103 @@
+"""Thin client for the render server (see server.py).
+
+Has the same basic command-line interface as umlsequence2, but sends
+the job to a server started by 'umlsequence2 --serve SOCKET', instead
+of rendering in-process. Only the standard library is used here.
+"""
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+from typing import Any
+
+from .error import print_error
+
+
+def request(socket_path: str, jobs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Send a batch of jobs to the server, and return the replies."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        with s.makefile('rwb') as f:
+            f.write(json.dumps(jobs).encode('utf-8') + b'\n')
+            f.flush()
+            replies: list[dict[str, Any]] = json.loads(f.readline())
+    return replies
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Render a UML sequence diagram through a running '
+        '\'umlsequence2 --serve SOCKET\' server.'
+    )
+    parser.add_argument(
+        'INPUT_FILE',
+        nargs='?',
+        help='UML sequence input file; if omitted, stdin is used',
+    )
+    parser.add_argument(
+        '--socket',
+        '-s',
+        default=os.environ.get('UMLSEQUENCE2_SOCKET'),
+        help='server socket path; default is $UMLSEQUENCE2_SOCKET',
+    )
+    parser.add_argument(
+        '--output-file',
+        '-o',
+        help='output file name; pass \'-\' to use stdout; '
+        'if omitted, use INPUT_FILE base name with the format '
+        'extension, or stdout',
+    )
+    parser.add_argument('--format', '-f', default='svg', help='output format')
+    parser.add_argument(
+        '--percent-zoom', '-p', type=int, default=100, help='magnification percentage'
+    )
+    parser.add_argument(
+        '--background-color', '-b', default='white', help='background color name'
+    )
+    args = parser.parse_args()
+    if not args.socket:
+        parser.error('no server socket given (use --socket or $UMLSEQUENCE2_SOCKET)')
+    args.format = args.format.lower()
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.INPUT_FILE is None:
+        source = sys.stdin.read()
+    else:
+        with open(args.INPUT_FILE) as f:
+            source = f.read()
+
+    if args.output_file is None:
+        if args.INPUT_FILE is not None:
+            name = os.path.splitext(args.INPUT_FILE)[0] + '.' + args.format
+        else:
+            name = '-'
+    else:
+        name = args.output_file
+
+    job = dict(
+        source=source,
+        format=args.format,
+        options=dict(percent_zoom=args.percent_zoom, bgcolor=args.background_color),
+    )
+    try:
+        (reply,) = request(args.socket, [job])
+    except OSError as e:
+        print_error(f'Cannot reach server at {args.socket}: {e}')
+        sys.exit(1)
+    if 'error' in reply:
+        print_error(reply['error'])
+        sys.exit(1)
+
+    data = base64.b64decode(reply['data'])
+    if name == '-':
+        sys.stdout.buffer.write(data)
+    else:
+        with open(name, 'wb') as f:
+            f.write(data)
+    sys.exit(0)
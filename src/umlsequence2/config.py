@@ -3,6 +3,8 @@
 All size and style values are set here.
 
 """
+import dataclasses
+from typing import Any
 
 from . import model
 
@@ -24,6 +26,8 @@ _CONFIG = model.Config(
     OBJECT_STEP=0.90,
     STEP_NORMAL=0.60,
     STEP_SMALL=0.30,
+    SVG_LINES=False,
+    SVG_SYMBOLS=False,
     TEXT_CHAR_WIDTH=0.145,
     TEXT_DOGEAR=0.20,
     TEXT_HEIGHT=0.40,
@@ -40,3 +44,14 @@ def set_config(cfg: model.Config) -> None:
 
 def get_config() -> model.Config:
     return _CONFIG
+
+
+def override_config(**overrides: Any) -> model.Config:
+    """Return the configuration with the given values replaced, e.g.
+    COLUMN_WIDTH=3.5."""
+    unknown = [k for k in overrides if k not in _CONFIG.__dict__]
+    if unknown:
+        raise TypeError(f'unexpected render option(s): {", ".join(unknown)}')
+    if not overrides:
+        return _CONFIG
+    return dataclasses.replace(_CONFIG, **overrides)
@@ -2,16 +2,47 @@
 
 All formats supported by reportlab, plus PDF, can be used.
 
+Input and output can be given as paths or as binary file objects.
+
+The reportlab writers and svglib are imported on first use, as each
+takes time to import, and only one is needed per format.
 """
-from reportlab.graphics import renderPDF, renderPM, renderPS
-from svglib.svglib import svg2rlg
+from typing import TYPE_CHECKING, BinaryIO, Iterable
+
+if TYPE_CHECKING:
+    from reportlab.graphics.shapes import Drawing
+
 
+def convert(from_svg: str | BinaryIO, to: str | BinaryIO, format: str) -> None:
+    from svglib.svglib import svg2rlg
 
-def convert(from_svg_path: str, to_path: str, format: str) -> None:
-    drawing = svg2rlg(from_svg_path)
+    draw_to(svg2rlg(from_svg), to, format)
+
+
+def draw_to(drawing: 'Drawing', to: str | BinaryIO, format: str) -> None:
     if format == 'pdf':
-        renderPDF.drawToFile(drawing, to_path)
+        from reportlab.graphics import renderPDF
+
+        renderPDF.drawToFile(drawing, to)
     elif format == 'eps':
-        renderPS.drawToFile(drawing, to_path, fmt=format.upper())
+        from reportlab.graphics import renderPS
+
+        renderPS.drawToFile(drawing, to, fmt=format.upper())
     else:
-        renderPM.drawToFile(drawing, to_path, fmt=format.upper())
+        from reportlab.graphics import renderPM
+
+        renderPM.drawToFile(drawing, to, fmt=format.upper())
+
+
+def draw_pages_to(drawings: Iterable['Drawing'], to: str | BinaryIO) -> None:
+    """Draw each drawing on a page of its size, in a single PDF document;
+    each drawing is dropped once drawn."""
+    from reportlab.graphics import renderPDF
+    from reportlab.pdfgen.canvas import Canvas
+
+    canvas = Canvas(to)
+    for drawing in drawings:
+        canvas.setPageSize((drawing.width, drawing.height))
+        renderPDF.draw(drawing, canvas, 0, 0)
+        canvas.showPage()
+    canvas.save()
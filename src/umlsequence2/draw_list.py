@@ -0,0 +1,250 @@
+"""Compact recording of graphic primitives.
+
+The builder records what to draw in one DrawList per layer, and the
+renderer replays it at the end (see Renderer.draw). Instead of a
+tuple, argument tuple, keyword dict and bound method per primitive, a
+DrawList keeps flat typed arrays: an opcode and a flags byte per
+primitive, its coordinates in a shared array of doubles, and its text,
+if any, in a list of strings. The source lines the primitives are drawn
+from are recorded per run of primitives from the same lines.
+"""
+import bisect
+from array import array
+from typing import Iterator, Sequence
+
+# opcodes
+RECT = 0  # x, y, w, h
+TEXT = 1  # x, y; text
+LINE = 2  # x1, y1, x2, y2
+POLYLINE = 3  # n, then n points
+ACTOR = 4  # x, y
+CROSS = 5  # x, y, size
+ARROW_HEAD = 6  # x, y, size
+COMMENT_BOX = 7  # x, y, width, height, corner_size
+FRAME_LABEL_BOX = 8  # x, y, width, height, corner_size
+
+# number of coordinates of the opcodes, but POLYLINE
+NB_COORDS = {
+    RECT: 4,
+    TEXT: 2,
+    LINE: 4,
+    ACTOR: 2,
+    CROSS: 3,
+    ARROW_HEAD: 3,
+    COMMENT_BOX: 5,
+    FRAME_LABEL_BOX: 5,
+}
+
+# flags
+GREY = 1
+TRANSPARENT = 2  # rect
+FILLED = 2  # polyline
+DASHED = 2  # line
+DOTTED = 4  # line
+THICK = 8  # line
+UNDERLINE = 2  # text
+START = 4  # text
+MIDDLE = 8  # text
+END = 16  # text
+LIGHT = 32  # text
+FULL = 2  # arrow head
+INV = 4  # arrow head
+
+
+class DrawList:
+    __slots__ = (
+        'ops',
+        'flags',
+        'coords',
+        'texts',
+        'line_starts',
+        'first_lines',
+        'last_lines',
+    )
+
+    def __init__(self) -> None:
+        self.ops = array('B')
+        self.flags = array('B')
+        self.coords = array('d')
+        self.texts: list[str] = []
+        # per run of primitives from the same source lines: the index of
+        # its first primitive, and the first and last of these lines
+        self.line_starts = array('l')
+        self.first_lines = array('l')
+        self.last_lines = array('l')
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def __iter__(self) -> Iterator[tuple[int, int, Sequence[float], str | None]]:
+        """Yield the primitives as (opcode, flags, coordinates, text), the
+        text being None but for TEXT, see append()."""
+        coords, texts = self.coords, iter(self.texts)
+        i = 0
+        for op, f in zip(self.ops, self.flags):
+            n = 1 + 2 * int(coords[i]) if op == POLYLINE else NB_COORDS[op]
+            yield op, f, coords[i : i + n], next(texts) if op == TEXT else None
+            i += n
+
+    def append(
+        self,
+        op: int,
+        flags: int,
+        coords: Sequence[float],
+        text: str | None = None,
+        lines: tuple[int, int] | None = None,
+    ) -> None:
+        """Record a primitive as yielded by iteration, drawn from the
+        given source lines, if any, see set_lines()."""
+        if lines is not None:
+            self.set_lines(*lines)
+        self.ops.append(op)
+        self.flags.append(flags)
+        self.coords.extend(coords)
+        if text is not None:
+            self.texts.append(text)
+
+    def set_lines(self, first: int, last: int) -> None:
+        """Record that the next primitives are drawn from the source lines
+        first to last."""
+        if self.line_starts:
+            if self.first_lines[-1] == first and self.last_lines[-1] == last:
+                return
+            if self.line_starts[-1] == len(self.ops):
+                # (the last run is still empty)
+                self.first_lines[-1], self.last_lines[-1] = first, last
+                return
+        self.line_starts.append(len(self.ops))
+        self.first_lines.append(first)
+        self.last_lines.append(last)
+
+    def lines_at(self, k: int) -> tuple[int, int]:
+        """Return the first and last source lines of the k-th primitive,
+        (0, 0) if unknown."""
+        i = bisect.bisect_right(self.line_starts, k) - 1
+        if i < 0:
+            return 0, 0
+        return self.first_lines[i], self.last_lines[i]
+
+    def source_lines(self) -> Iterator[tuple[int, int]]:
+        """Yield the first and last source lines of each primitive, see
+        lines_at()."""
+        lines = 0, 0
+        runs = zip(self.line_starts, self.first_lines, self.last_lines)
+        start, first, last = next(runs, (len(self.ops), 0, 0))
+        for k in range(len(self.ops)):
+            if k == start:
+                lines = first, last
+                start, first, last = next(runs, (len(self.ops), 0, 0))
+            yield lines
+
+    def mark(self) -> tuple[int, int, int]:
+        """Return the current end of the list, see truncate()."""
+        return len(self.ops), len(self.coords), len(self.texts)
+
+    def truncate(self, mark: tuple[int, int, int]) -> None:
+        """Drop the primitives recorded after mark."""
+        nb_ops, nb_coords, nb_texts = mark
+        del self.ops[nb_ops:]
+        del self.flags[nb_ops:]
+        del self.coords[nb_coords:]
+        del self.texts[nb_texts:]
+        nb_runs = bisect.bisect_left(self.line_starts, nb_ops)
+        del self.line_starts[nb_runs:]
+        del self.first_lines[nb_runs:]
+        del self.last_lines[nb_runs:]
+
+    def rect(
+        self,
+        x: float,
+        y: float,
+        w: float,
+        h: float,
+        transparent: bool = False,
+        grey: bool = False,
+    ) -> None:
+        self.ops.append(RECT)
+        self.flags.append(TRANSPARENT * transparent | GREY * grey)
+        self.coords.extend((x, y, w, h))
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        underline: bool = False,
+        start: bool = False,
+        middle: bool = False,
+        end: bool = False,
+        light: bool = False,
+    ) -> None:
+        self.ops.append(TEXT)
+        self.flags.append(
+            UNDERLINE * underline
+            | START * start
+            | MIDDLE * middle
+            | END * end
+            | LIGHT * light
+        )
+        self.coords.extend((x, y))
+        self.texts.append(text)
+
+    def line(
+        self,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float,
+        grey: bool = False,
+        dashed: bool = False,
+        dotted: bool = False,
+        thick: bool = False,
+    ) -> None:
+        self.ops.append(LINE)
+        self.flags.append(
+            GREY * grey | DASHED * dashed | DOTTED * dotted | THICK * thick
+        )
+        self.coords.extend((x1, y1, x2, y2))
+
+    def polyline(
+        self,
+        points: Sequence[tuple[float, float]],
+        grey: bool = False,
+        filled: bool = False,
+    ) -> None:
+        self.ops.append(POLYLINE)
+        self.flags.append(GREY * grey | FILLED * filled)
+        self.coords.append(len(points))
+        for x, y in points:
+            self.coords.extend((x, y))
+
+    def actor(self, x: float, y: float) -> None:
+        self.ops.append(ACTOR)
+        self.flags.append(0)
+        self.coords.extend((x, y))
+
+    def cross(self, x: float, y: float, size: float) -> None:
+        self.ops.append(CROSS)
+        self.flags.append(0)
+        self.coords.extend((x, y, size))
+
+    def arrow_head(
+        self, x: float, y: float, size: float, full: bool, inv: bool
+    ) -> None:
+        self.ops.append(ARROW_HEAD)
+        self.flags.append(FULL * full | INV * inv)
+        self.coords.extend((x, y, size))
+
+    def comment_box(
+        self, x: float, y: float, width: float, height: float, corner_size: float
+    ) -> None:
+        self.ops.append(COMMENT_BOX)
+        self.flags.append(0)
+        self.coords.extend((x, y, width, height, corner_size))
+
+    def frame_label_box(
+        self, x: float, y: float, width: float, height: float, corner_size: float
+    ) -> None:
+        self.ops.append(FRAME_LABEL_BOX)
+        self.flags.append(0)
+        self.coords.extend((x, y, width, height, corner_size))
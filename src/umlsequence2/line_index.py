@@ -0,0 +1,52 @@
+"""Index of the source lines of a laid out diagram, for editors.
+
+The line index maps the ranges of source lines the elements of a
+diagram are drawn from to the bounding boxes of these elements, so that
+an editor can go from a click to the source, or scroll the diagram to
+the cursor, by binary search, without parsing the SVG. It is written as
+JSON (see --line-index):
+
+    {"version": 1, "unit": "px",
+     "ranges": [[first, last, x1, y1, x2, y2], ...]}
+
+Most elements come from a single line; lifelines, activation bars and
+frames span from the line that begins them to the line that ends them.
+The box of a range is the union of the bounding boxes of its elements,
+in the px of the SVG elements, before zooming (the zoom is applied by
+the transform of their group). Ranges are sorted by first, then last
+line. With SVG_LINES, the elements of each range are grouped in the SVG
+under a data-line attribute, "first" or "first-last".
+"""
+import math
+from typing import Any, Callable
+
+from .renderer import cm2px
+from .spatial_index import bounds
+from . import draw_list as dl
+from . import model
+
+VERSION = 1
+
+
+def make_line_index(
+    g: dict[int, dl.DrawList],
+    text_width: Callable[[str], float],
+    cfg: model.Config,
+) -> dict[str, Any]:
+    """Return the line index of the layers g, see above; text_width
+    measures texts, in cm."""
+    boxes: dict[tuple[int, int], list[float]] = {}
+    for draw_list in g.values():
+        primitives = zip(draw_list, draw_list.source_lines())
+        for (op, f, coords, text), lines in primitives:
+            x1, y1, x2, y2 = bounds(op, f, coords, text, text_width, cfg)
+            box = boxes.setdefault(lines, [math.inf, math.inf, -math.inf, -math.inf])
+            box[0] = min(box[0], x1)
+            box[1] = min(box[1], y1)
+            box[2] = max(box[2], x2)
+            box[3] = max(box[3], y2)
+    ranges = [
+        [first, last, *(round(cm2px(v), 2) for v in box)]
+        for (first, last), box in sorted(boxes.items())
+    ]
+    return dict(version=VERSION, unit='px', ranges=ranges)
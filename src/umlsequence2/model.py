@@ -28,6 +28,9 @@ class Config:
     STEP_NORMAL: float
     STEP_SMALL: float
 
+    SVG_LINES: bool
+    SVG_SYMBOLS: bool
+
     TEXT_CHAR_WIDTH: float
     TEXT_DOGEAR: float
     TEXT_FONT: dict[str, str]
@@ -40,10 +43,14 @@ class UmlSequenceError(Exception):
     pass
 
 
-@dataclass
+# command arguments: str, bool, None, or lists of str
+Args = tuple[Any, ...]
+
+
+@dataclass(slots=True)
 class Command:
     cmd: str
-    args: list[Any]
+    args: Args
 
 
 @dataclass
@@ -59,6 +66,7 @@ class Object(Element):
     label: str
     ypos: float
     row: int
+    line_nr: int = 0  # of its definition
 
 
 @dataclass
@@ -75,6 +83,7 @@ class Frame(Element):
     ypos: float
     label: str
     out: float
+    line_nr: int = 0  # of its beginning
 
 
 @dataclass
@@ -83,3 +92,4 @@ class Rectangle:
     y: float
     w: float
     h: float
+    lines: tuple[int, int] = (0, 0)  # source lines drawn from, first and last
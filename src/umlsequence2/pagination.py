@@ -0,0 +1,290 @@
+"""Split a laid out diagram into pages.
+
+Pages form a grid. Rows of pages end at the positions recorded by the
+builder before messages (UmlBuilder.breaks), as low as the page height
+allows; columns of pages hold as many lifelines as the page width
+allows. Each primitive is copied to the pages it overlaps: lines and
+rectangles (lifelines, activation bars, frames, messages) are clipped to
+each page, so that they continue from one page to the next, while texts,
+glyphs and boxes go whole to the page of their top left corner, or
+anchor. Rows but the first repeat the headers of the objects alive at
+their top.
+
+Page sizes are in cm, before zooming. A page is larger than requested
+when a single message (or a single lifeline column) does not fit, or
+when an element overflows it.
+"""
+import bisect
+import heapq
+import math
+from dataclasses import dataclass, field
+from typing import Iterator, Sequence
+
+from .uml_builder import UmlBuilder
+from . import draw_list as dl
+from . import model
+
+
+@dataclass
+class Band:
+    """A row or column of pages: the part of the diagram between start
+    and end, moved by offset."""
+
+    start: float
+    end: float
+    offset: float
+    # objects whose headers are repeated, for rows
+    objects: list[model.Object] = field(default_factory=list)
+
+
+@dataclass
+class Page:
+    row: int
+    column: int
+    g: dict[int, dl.DrawList] = field(default_factory=dict)
+
+    def layer(self, layer: int) -> dl.DrawList:
+        if layer not in self.g:
+            self.g[layer] = dl.DrawList()
+        return self.g[layer]
+
+
+def header_height(builder: UmlBuilder, objects: list[model.Object]) -> float:
+    # from the top of the page to the top of the diagram part of the row
+    cfg = builder.cfg
+    height = cfg.STEP_NORMAL + cfg.OBJECT_STEP
+    if any(o.type == 'actor' for o in objects):
+        height += cfg.ACTOR_DESCENT
+    return height
+
+
+def min_page_height(builder: UmlBuilder) -> float:
+    cfg = builder.cfg
+    return cfg.STEP_NORMAL * 2 + cfg.OBJECT_STEP + cfg.ACTOR_DESCENT
+
+
+def page_rows(builder: UmlBuilder, page_height: float | None) -> list[Band]:
+    """Return the rows of pages, from top to bottom."""
+    if page_height is None:
+        return [Band(-math.inf, math.inf, 0)]
+    if page_height < min_page_height(builder):
+        raise model.UmlSequenceError(
+            f'page height must be at least {min_page_height(builder):.2f} cm'
+        )
+    cfg = builder.cfg
+    breaks = builder.breaks
+    bottom = max([end for _, end in builder.lifelines], default=builder.ypos)
+
+    # objects by the top of their row, and the live ones, by their end
+    lifelines = sorted(
+        builder.lifelines,
+        key=lambda lifeline: lifeline[0].ypos,
+    )
+    next_lifeline = 0
+    alive: list[tuple[float, int, model.Object]] = []
+
+    rows = []
+    start, top, origin = -math.inf, 0.0, 0.0
+    objects: list[model.Object] = []
+    while bottom > origin + page_height - top:
+        # the lowest break that fits, or else the next one
+        i = bisect.bisect_right(breaks, origin + page_height - top)
+        if i == 0 or breaks[i - 1] <= origin:
+            i = bisect.bisect_right(breaks, origin) + 1
+            if i > len(breaks):
+                break
+        end = breaks[i - 1]
+        rows.append(Band(start, end, top - origin, objects))
+
+        # objects alive across the break
+        while next_lifeline < len(lifelines):
+            o, o_end = lifelines[next_lifeline]
+            o_top = o.ypos - (cfg.ACTOR_DESCENT if o.type == 'actor' else 0)
+            if o_top >= end:
+                break
+            heapq.heappush(alive, (o_end, next_lifeline, o))
+            next_lifeline += 1
+        while alive and alive[0][0] <= end:
+            heapq.heappop(alive)
+        objects = sorted([o for _, _, o in alive], key=lambda o: o.index)
+
+        start = origin = end
+        top = header_height(builder, objects)
+    rows.append(Band(start, math.inf, top - origin, objects))
+    return rows
+
+
+def page_columns(builder: UmlBuilder, page_width: float | None) -> list[Band]:
+    """Return the columns of pages, from left to right."""
+    if page_width is None:
+        return [Band(-math.inf, math.inf, 0)]
+    cfg = builder.cfg
+    pitch = cfg.COLUMN_WIDTH + cfg.COLUMN_SPACING
+    margin = cfg.COLUMN_SPACING / 2
+    nb_lifelines = max(
+        [o.index + 1 for o, _ in builder.lifelines], default=builder.nb_indices
+    )
+    per_page = max(1, int((page_width + cfg.COLUMN_SPACING) // pitch))
+
+    columns = []
+    for first in range(0, max(nb_lifelines, 1), per_page):
+        start = first * pitch - margin if first else -math.inf
+        last = first + per_page
+        end = last * pitch - margin if last < nb_lifelines else math.inf
+        columns.append(Band(start, end, margin - first * pitch if first else 0))
+    return columns
+
+
+def clip_line(
+    x1: float,
+    y1: float,
+    x2: float,
+    y2: float,
+    column: Band,
+    row: Band,
+) -> tuple[float, float, float, float] | None:
+    # Liang-Barsky; None if the line does not cross the page
+    dx, dy = x2 - x1, y2 - y1
+    t0, t1 = 0.0, 1.0
+    for p, q in (
+        (-dx, x1 - column.start),
+        (dx, column.end - x1),
+        (-dy, y1 - row.start),
+        (dy, row.end - y1),
+    ):
+        if p == 0:
+            if q < 0:
+                return None
+        elif p < 0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+    if t0 > t1 or t0 == t1 and (dx or dy):
+        return None
+    return x1 + t0 * dx, y1 + t0 * dy, x1 + t1 * dx, y1 + t1 * dy
+
+
+def clip_rect(
+    x: float, y: float, w: float, h: float, column: Band, row: Band
+) -> tuple[float, float, float, float] | None:
+    # None if the rectangle does not overlap the page
+    x1, x2 = max(x, column.start), min(x + w, column.end)
+    y1, y2 = max(y, row.start), min(y + h, row.end)
+    if x2 < x1 or y2 < y1 or x2 == x1 and w or y2 == y1 and h:
+        return None
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def split(
+    draw_list: dl.DrawList, rows: Sequence[Band], columns: Sequence[Band]
+) -> Iterator[tuple[int, int, int, int, Sequence[float], str | None, tuple[int, int]]]:
+    """Yield the primitives of draw_list as (row, column, opcode, flags,
+    coordinates, text, source lines), clipped to and moved within each
+    page."""
+    row_starts = [row.start for row in rows]
+    column_starts = [column.start for column in columns]
+
+    def bands(starts: list[float], lo: float, hi: float) -> range:
+        first = max(bisect.bisect_right(starts, lo) - 1, 0)
+        last = max(bisect.bisect_right(starts, hi) - 1, 0)
+        return range(first, last + 1)
+
+    primitives = zip(draw_list, draw_list.source_lines())
+    for (op, f, coords, text), lines in primitives:
+        if op == dl.LINE or op == dl.RECT:
+            if op == dl.LINE:
+                x1, y1, x2, y2 = coords
+                xlo, xhi, ylo, yhi = min(x1, x2), max(x1, x2), min(y1, y2), max(y1, y2)
+            else:
+                x, y, w, h = coords
+                xlo, xhi, ylo, yhi = x, x + w, y, y + h
+            for r in bands(row_starts, ylo, yhi):
+                row = rows[r]
+                for c in bands(column_starts, xlo, xhi):
+                    column = columns[c]
+                    if op == dl.LINE:
+                        clipped = clip_line(x1, y1, x2, y2, column, row)
+                        if clipped is None:
+                            continue
+                        cx1, cy1, cx2, cy2 = clipped
+                        moved = (
+                            cx1 + column.offset,
+                            cy1 + row.offset,
+                            cx2 + column.offset,
+                            cy2 + row.offset,
+                        )
+                    else:
+                        clipped = clip_rect(x, y, w, h, column, row)
+                        if clipped is None:
+                            continue
+                        cx, cy, cw, ch = clipped
+                        moved = (cx + column.offset, cy + row.offset, cw, ch)
+                    yield r, c, op, f, moved, text, lines
+        elif op == dl.POLYLINE:
+            xs, ys = coords[1::2], coords[2::2]
+            r = bands(row_starts, min(ys), min(ys))[0]
+            c = bands(column_starts, min(xs), min(xs))[0]
+            points = [coords[0]]
+            for x, y in zip(xs, ys):
+                points.extend((x + columns[c].offset, y + rows[r].offset))
+            yield r, c, op, f, points, text, lines
+        else:
+            # (x, y, then sizes)
+            x, y = coords[0], coords[1]
+            r = bands(row_starts, y, y)[0]
+            c = bands(column_starts, x, x)[0]
+            anchored = [x + columns[c].offset, y + rows[r].offset, *coords[2:]]
+            yield r, c, op, f, anchored, text, lines
+
+
+def draw_headers(
+    builder: UmlBuilder, objects: list[model.Object], draw_list: dl.DrawList
+) -> None:
+    # the objects at the top of a page, with the start of their lifelines
+    cfg = builder.cfg
+    top = header_height(builder, objects)
+    for o in objects:
+        draw_list.set_lines(o.line_nr, o.line_nr)
+        builder.draw_object(o, cfg.STEP_NORMAL, draw_list)
+        x = builder.get_x(o, True)
+        y = cfg.STEP_NORMAL * 2
+        if o.type == 'actor':
+            y += cfg.ACTOR_DESCENT
+        draw_list.line(x, y, x, top, dashed=True, grey=True)
+
+
+def paginate(
+    builder: UmlBuilder,
+    page_width: float | None = None,
+    page_height: float | None = None,
+) -> Iterator[Page]:
+    """Split the diagram laid out by builder into pages of at most
+    page_width by page_height cm (None for no limit), and return an
+    iterator over them, by rows, then columns. The pages are built at
+    once; each is released once iterated over."""
+    rows = page_rows(builder, page_height)
+    columns = page_columns(builder, page_width)
+    pages = [Page(r, c) for r in range(len(rows)) for c in range(len(columns))]
+
+    # repeated headers first, as the objects are drawn first in their layer
+    unbounded = [Band(-math.inf, math.inf, 0)]
+    for r, row in enumerate(rows):
+        if row.objects:
+            headers = dl.DrawList()
+            draw_headers(builder, row.objects, headers)
+            for _, c, op, f, coords, text, lines in split(headers, unbounded, columns):
+                page = pages[r * len(columns) + c]
+                page.layer(1).append(op, f, coords, text, lines)
+
+    for layer in sorted(builder.g):
+        for r, c, op, f, coords, text, lines in split(builder.g[layer], rows, columns):
+            page = pages[r * len(columns) + c]
+            page.layer(layer).append(op, f, coords, text, lines)
+    return drain(pages)
+
+
+def drain(pages: list[Page]) -> Iterator[Page]:
+    # yield the pages, dropping each once yielded
+    pages.reverse()
+    while pages:
+        yield pages.pop()
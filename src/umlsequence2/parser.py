@@ -3,8 +3,10 @@
 Tokenize and parse input code, and translate to intermediate commands.
 
 """
+import io
+import marshal
 import re
-from typing import Any
+from typing import Any, Iterable, Iterator, TextIO
 
 from . import model
 
@@ -13,53 +15,99 @@ def escape(s: str) -> str:
     return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 
+# Statements, tried in this order:
+# - a constraint anywhere in the line: [OBJECT[OP]] [_]{CONSTRAINT}
+CONSTRAINT_PATTERN = (
+    r"(?P<c_obj>[A-Za-z_0-9]*)(?P<c_op>[\+\-\#~!]?)"
+    r" *"
+    r"(?P<c_below>_?)\{(?P<c_text>.*)\}"
+)
+# - a message anywhere in the line: OBJECT[OP] OP OBJECT[OP] MORE
+MESSAGE_PATTERN = (
+    r"(?P<m_l>[A-Za-z_0-9]+?)(?P<m_lop>[\+\-\#~!]?)"
+    r" *"
+    r"(?P<m_op>\??-+>"
+    r"|<-+\??"
+    r"|\??=+>\??"
+    r"|\??<=+\??"
+    r"|\??#+>"
+    r"|<#+\??"
+    r"|\??:+>"
+    r"|<:+\??"
+    r"|//"
+    r"|:"
+    r"|>"
+    r"|\*"
+    r"|\["
+    r"|\]"
+    r"|\{_?\}"
+    r")"
+    r" *"
+    r"(?P<m_r>[#A-Za-z_0-9]*)(?P<m_rop>[\+\-\#~!]?)"
+    r" *"
+    r"(?P<m_edge>.*)"
+)
+# - object states, making the whole line: OBJECT[OP] [OBJECT[OP] ...]
+OBJ_STATE_PATTERN = r"(?:[A-Za-z_0-9]+[\+\-\#~!]|:)"
+
+
+def dump_commands(cmds: Iterable[model.Command]) -> bytes:
+    """Serialize commands to a compact binary form, which can only be
+    loaded by the same Python version."""
+    return marshal.dumps([(cmd.cmd, *cmd.args) for cmd in cmds])
+
+
+def load_commands(data: bytes) -> list[model.Command]:
+    """Return the commands serialized by dump_commands()."""
+    return [model.Command(t[0], t[1:]) for t in marshal.loads(data)]
+
+
 class Parser:
-    RE_MESSAGE = re.compile(
-        "([A-Za-z_0-9]+?)([\+\-\#~!]?)"
-        " *"
-        "(\??-+>"
-        "|<-+\??"
-        "|\??=+>\??"
-        "|\??<=+\??"
-        "|\??#+>"
-        "|<#+\??"
-        "|\??:+>"
-        "|<:+\??"
-        "|//"
-        "|:"
-        "|>"
-        "|\*"
-        "|\["
-        "|\]"
-        "|\{_?\}"
-        ")"
-        " *"
-        "([#A-Za-z_0-9]*)([\+\-\#~!]?)"
-        " *"
-        "(.*)"
+    # Identify the statement and its terms in a single match; the
+    # lookaheads search the line like re.search() would, and the first
+    # one only checks quickly that a constraint is possible.
+    RE_STATEMENT = re.compile(
+        rf"(?P<constraint>(?=[^{{]*\{{)(?=.*?{CONSTRAINT_PATTERN}))"
+        rf"|(?P<message>(?=.*?{MESSAGE_PATTERN}))"
+        rf"|(?P<state>{OBJ_STATE_PATTERN}(?:\s+{OBJ_STATE_PATTERN})*$)"
     )
     RE_MESSAGE_call = re.compile("(.*?) *(=) *(.*)")
-    RE_OBJ_STATE = re.compile("([A-Za-z_0-9]+[\+\-\#~!]|:)+")
-    RE_CONSTRAINT = re.compile("([A-Za-z_0-9]*)([\+\-\#~!]?) *(_?)\{(.*)\}")
 
     extensions = ['.dot']
 
-    def __init__(self, raw: str):
+    def __init__(self, raw: str = ''):
         self.raw = raw
 
-    def parse1(self, lines: list[str]) -> list[model.Command]:
+    def parse1(
+        self,
+        lines: list[str],
+        first_line_nr: int = 1,
+        objects: Iterable[str] | None = None,
+    ) -> list[model.Command]:
+        """Translate consecutive lines to commands. To continue a previous
+        call, pass the number of the first line and the live objects
+        left by that call (self.objects)."""
+        numbered = enumerate(lines, first_line_nr)
+        return list(self.iter_parse1(numbered, objects))
+
+    def iter_parse1(
+        self,
+        lines: Iterable[tuple[int, str]],
+        objects: Iterable[str] | None = None,
+    ) -> Iterator[model.Command]:
+        """Like parse1(), but take (line number, line) pairs, and yield
+        the commands line by line, as the lines are consumed."""
         cmds: list[model.Command] = []
 
         self.has_first_step = False
-        self.objects: list[str] = []
+        # live objects, in creation order (an ordered set)
+        self.objects: dict[str, None] = dict.fromkeys(objects or ())
 
         def add_obj(name: str) -> None:
-            if name not in self.objects:
-                self.objects.append(name)
+            self.objects.setdefault(name)
 
         def rem_obj(name: str) -> None:
-            if name in self.objects:
-                self.objects.remove(name)
+            self.objects.pop(name, None)
 
         def nl2str(text: str) -> tuple[str, str, int, int]:
             texts = text.split("\\n")
@@ -84,7 +132,7 @@ class Parser:
                 return
 
             def append(cmd: str, args: list[Any]) -> None:
-                cmds.append(model.Command(cmd, args))
+                cmds.append(model.Command(cmd, tuple(args)))
 
             append('#####', [str(line_nr), line])
             oline = line
@@ -96,10 +144,12 @@ class Parser:
             if line.startswith("#"):
                 return
 
-            # try to match: [OBJECT[OP]] [_]{CONSTRAINT}
-            terms = Parser.RE_CONSTRAINT.findall(line)
-            if terms:
-                l, lop, below, r = terms[0]
+            m = Parser.RE_STATEMENT.match(line)
+            kind = m and m.lastgroup
+
+            # [OBJECT[OP]] [_]{CONSTRAINT}
+            if kind == 'constraint':
+                l, lop, below, r = m.group('c_obj', 'c_op', 'c_below', 'c_text')
                 r, _, nlines, maxlen = nl2str(r)
                 if not l:
                     if not self.objects:
@@ -107,7 +157,7 @@ class Parser:
                             f'{line}: Adding constraint to last object, '
                             f'while no object is defined'
                         )
-                    append('oconstraint', [self.objects[-1], r])
+                    append('oconstraint', [next(reversed(self.objects)), r])
                 elif not below:
                     append('lconstraint', [l, r])
                     if lop:
@@ -118,10 +168,11 @@ class Parser:
                         do_line(line_nr, l + lop, level + 1)
                 return
 
-            # try to match: OBJECT[OP] OP OBJECT[OP] MORE
-            terms = Parser.RE_MESSAGE.findall(line)
-            if terms:
-                l, lop, op, r, rop, edge = terms[0]
+            # OBJECT[OP] OP OBJECT[OP] MORE
+            if kind == 'message':
+                l, lop, op, r, rop, edge = m.group(
+                    'm_l', 'm_lop', 'm_op', 'm_r', 'm_rop', 'm_edge'
+                )
 
                 async_head = False
                 async_tail = False
@@ -269,9 +320,9 @@ class Parser:
 
                 return
 
-            # try to match: OBJECT[OP] [OBJECT[OP] ...]
-            terms = Parser.RE_OBJ_STATE.findall(line)
-            if terms == line.split():
+            # OBJECT[OP] [OBJECT[OP] ...]
+            if kind == 'state':
+                terms = line.split()
                 for term in terms:
                     l, op = term[:-1], term[-1]
                     if op == "+":
@@ -290,31 +341,55 @@ class Parser:
                     append('step', [])
                 return
 
-            # all attemps to match by RE failed => output as-is
-
-        for line_nr, line in enumerate(lines):
-            do_line(line_nr + 1, line)
+            # no statement matched => output as-is
 
-        return cmds
+        for line_nr, line in lines:
+            do_line(line_nr, line)
+            yield from cmds
+            cmds.clear()
 
     def preprocess(self, raw: str) -> list[str]:
-        # preprocess:
-        # - remove tabs
-        raw = raw.replace("\t", " ")
-        # - join lines ending with '\' with the next one
-        #   (lazy way, TODO: use regex)
-        while raw.find("\\\n ") >= 0:
-            raw = raw.replace("\\\n ", "\\\n")
-        while raw.find(" \\\n") >= 0:
-            raw = raw.replace(" \\\n", "\\\n")
-        raw = raw.replace("\\\n", " ")
-        lines = raw.split('\n')
-        return lines
+        """Return the lines of raw, see iter_lines()."""
+        return [line for _, line in self.iter_lines(io.StringIO(raw))]
+
+    def iter_lines(self, fileobj: Iterable[str]) -> Iterator[tuple[int, str]]:
+        """Read the lines of fileobj, and yield them preprocessed, each
+        with the number of its first physical line.
+
+        Preprocessing replaces tabs with spaces, and joins each line
+        ending with '\\' with the next one, with a single space instead
+        of the '\\' and the spaces around it. This is done in a single
+        pass, as the lines are read.
+        """
+        parts: list[str] = []  # of a line continued with '\'
+        first_line_nr = 1
+        for line_nr, line in enumerate(fileobj, 1):
+            line = line.replace("\t", " ")
+            if parts:
+                line = line.lstrip(" ")
+            else:
+                first_line_nr = line_nr
+            if line.endswith("\\\n"):
+                parts.append(line[:-2].rstrip(" "))
+                continue
+            parts.append(line.removesuffix("\n"))
+            yield first_line_nr, " ".join(parts)
+            parts.clear()
+        if parts:
+            # (the input ends with a continued line)
+            parts.append("")
+            yield first_line_nr, " ".join(parts)
+
+    def iter_commands(self, fileobj: TextIO) -> Iterator[model.Command]:
+        """Read the input from fileobj, and yield the commands as they
+        are parsed, so that they can be fed to UmlBuilder without
+        holding the whole input or command list in memory."""
+        return self.iter_parse1(self.iter_lines(fileobj))
 
     def parse(self) -> tuple[list[model.Command], str]:
         """
         The parser's entry point
         """
 
-        cmds = self.parse1(self.preprocess(self.raw))
+        cmds = list(self.iter_commands(io.StringIO(self.raw)))
         return cmds, self.raw
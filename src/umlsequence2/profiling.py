@@ -0,0 +1,147 @@
+"""Per-phase measurements of renders, for --profile.
+
+A Profile is passed to render_to() and the like, which then run the
+phases of a render separately (parse, layout, draw, write), and record
+for each its wall and CPU time and the peak of the memory it traced,
+above what was traced when it began; the peak of all traced memory is
+reported too. It also counts the parsed commands per kind, the draw
+list entries per layer, and the output bytes. Phases run several times
+(e.g. drawing several outputs) add up.
+
+Without a Profile, nothing is measured. Memory tracing and cProfile
+slow rendering down, the times are inflated accordingly.
+"""
+import cProfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from types import TracebackType
+from typing import Any, Iterable, Iterator
+
+from . import model
+from .draw_list import DrawList
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    wall: float = 0.0  # s
+    cpu: float = 0.0  # s
+    peak_memory: int = 0  # bytes traced, at most, above those at its start
+
+
+class Profile:
+    def __init__(self, memory: bool = True, cprofile: bool = False):
+        """With memory, trace memory allocations (tracemalloc); with
+        cprofile, run each phase under cProfile, see dump_hottest()."""
+        self.memory = memory
+        self.cprofile = cprofile
+        self.phases: dict[str, PhaseStats] = {}
+        self.commands: Counter[str] = Counter()
+        self.layers: Counter[int] = Counter()  # draw list entries
+        self.output_bytes = 0
+        self.peak_memory = 0
+        self.profilers: dict[str, cProfile.Profile] = {}
+        self.depth = 0  # of nested with blocks
+        self.tracing = False  # tracemalloc started by us
+
+    def __enter__(self) -> 'Profile':
+        """Trace memory until the outermost with block exits."""
+        if self.depth == 0 and self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        self.depth += 1
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.depth -= 1
+        if self.depth == 0 and self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Measure the phase run within the with block."""
+        stats = self.phases.setdefault(name, PhaseStats())
+        profiler = None
+        if self.cprofile:
+            profiler = self.profilers.setdefault(name, cProfile.Profile())
+        start = 0
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            stats.calls += 1
+            stats.wall += time.perf_counter() - wall0
+            stats.cpu += time.process_time() - cpu0
+            if tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+                stats.peak_memory = max(stats.peak_memory, peak - start)
+                self.peak_memory = max(self.peak_memory, peak)
+
+    def count_commands(self, cmds: Iterable[model.Command]) -> None:
+        self.commands.update(cmd.cmd for cmd in cmds)
+
+    def count_layers(self, g: dict[int, DrawList]) -> None:
+        for layer, draw_list in g.items():
+            self.layers[layer] += len(draw_list)
+
+    def hottest(self) -> str | None:
+        """Return the name of the phase that took the most time."""
+        if not self.phases:
+            return None
+        return max(self.phases, key=lambda name: self.phases[name].wall)
+
+    def dump_hottest(self, path: str) -> str | None:
+        """Write the cProfile statistics of the hottest phase to path,
+        in the pstats format, and return the name of that phase."""
+        name = self.hottest()
+        if name is None or name not in self.profilers:
+            return None
+        self.profilers[name].dump_stats(path)
+        return name
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(
+            phases={name: asdict(stats) for name, stats in self.phases.items()},
+            peak_memory=self.peak_memory if self.memory else None,
+            commands=dict(self.commands.most_common()),
+            draw_list={str(k): v for k, v in sorted(self.layers.items())},
+            output_bytes=self.output_bytes,
+        )
+
+    def format(self) -> str:
+        """Return a human-readable report."""
+        lines = [
+            f'{"phase":10s} {"calls":>5s} {"wall s":>9s} {"cpu s":>9s} {"peak MB":>9s}'
+        ]
+        for name, stats in self.phases.items():
+            peak = f'{stats.peak_memory / 1e6:9.1f}' if self.memory else f'{"-":>9s}'
+            lines.append(
+                f'{name:10s} {stats.calls:5d} {stats.wall:9.4f} {stats.cpu:9.4f} {peak}'
+            )
+        wall = sum(stats.wall for stats in self.phases.values())
+        cpu = sum(stats.cpu for stats in self.phases.values())
+        lines.append(f'{"total":10s} {"":5s} {wall:9.4f} {cpu:9.4f}')
+        if self.memory:
+            lines.append(f'peak memory: {self.peak_memory / 1e6:.1f} MB')
+        commands = ', '.join(f'{k} {n}' for k, n in self.commands.most_common())
+        lines.append(f'commands: {sum(self.commands.values())} ({commands})')
+        layers = ', '.join(f'{k}: {n}' for k, n in sorted(self.layers.items()))
+        lines.append(f'draw list entries: {sum(self.layers.values())} ({layers})')
+        lines.append(f'output: {self.output_bytes} bytes')
+        return '\n'.join(lines)
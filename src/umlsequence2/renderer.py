@@ -0,0 +1,361 @@
+"""Base class of the graphic backends.
+
+A backend implements the graphic primitives (circle, polyline,
+polygon, text, rect, line); the composite shapes are drawn with them
+here. Coordinates are given in cm, and tracked in px to compute the
+diagram size. Text widths are measured with the metrics of the text
+font, or estimated with TEXT_CHAR_WIDTH for fonts without metrics.
+
+If SVG_LINES is set, the primitives drawn from the same source lines
+are grouped, see begin_source().
+"""
+import functools
+import math
+from typing import Any, BinaryIO, Callable, Sequence
+
+from .config import get_config
+from .text_metrics import find_font_name, text_width, to_font_size
+from . import draw_list as dl
+from . import model
+
+
+def cm2px(cm: float) -> float:
+    return cm * 35.43307
+
+
+def px2cm(px: float) -> float:
+    return px / 35.43307
+
+
+def format_lines(first: int, last: int) -> str:
+    # the data-line attribute value of a group: its line, or range of lines
+    return str(first) if first == last else f'{first}-{last}'
+
+
+class Renderer:
+    def __init__(self, percent_zoom: int, cfg: model.Config | None = None):
+        self.zoom = percent_zoom / 100.0
+        self.cfg = cfg or get_config()
+        self.x_max: float = 0
+        self.y_max: float = 0
+
+        font = self.cfg.TEXT_FONT
+        self.metrics_font_name = find_font_name(font.get('font_family', 'Helvetica'))
+        font_size = to_font_size(font.get('font_size', '10'))
+        if font_size is None:
+            # relative to a size unknown here: estimate
+            self.metrics_font_name = None
+            font_size = 10
+        self.metrics_font_size = font_size
+
+    def set_max(self, x: float, y: float) -> None:
+        self.x_max = max(self.x_max, x)
+        self.y_max = max(self.y_max, y)
+
+    def get_size(self) -> tuple[int, int]:
+        # real size in px
+        w = int(round(self.x_max * self.zoom + 0.5, 0))
+        h = int(round(self.y_max * self.zoom + 0.5, 0))
+        return w, h
+
+    def draw(self, draw_list: dl.DrawList) -> None:
+        """Draw all the primitives recorded in draw_list, in order."""
+        coords, texts = draw_list.coords, iter(draw_list.texts)
+        i = 0
+        # the next run of primitives from the same source lines, if grouped
+        nb_runs = len(draw_list.line_starts) if self.cfg.SVG_LINES else 0
+        run, grouped = 0, False
+        run_start = draw_list.line_starts[0] if nb_runs else -1
+        for k, (op, f) in enumerate(zip(draw_list.ops, draw_list.flags)):
+            if k == run_start:
+                if grouped:
+                    self.end_source()
+                self.begin_source(draw_list.first_lines[run], draw_list.last_lines[run])
+                grouped = True
+                run += 1
+                run_start = draw_list.line_starts[run] if run < nb_runs else -1
+            if op == dl.TEXT:
+                self.text(
+                    coords[i],
+                    coords[i + 1],
+                    next(texts),
+                    underline=bool(f & dl.UNDERLINE),
+                    start=bool(f & dl.START),
+                    middle=bool(f & dl.MIDDLE),
+                    end=bool(f & dl.END),
+                    light=bool(f & dl.LIGHT),
+                )
+                i += 2
+            elif op == dl.LINE:
+                x1, y1, x2, y2 = coords[i : i + 4]
+                self.line(
+                    x1,
+                    y1,
+                    x2,
+                    y2,
+                    grey=bool(f & dl.GREY),
+                    dashed=bool(f & dl.DASHED),
+                    dotted=bool(f & dl.DOTTED),
+                    thick=bool(f & dl.THICK),
+                )
+                i += 4
+            elif op == dl.ARROW_HEAD:
+                x, y, size = coords[i : i + 3]
+                self.arrow_head(x, y, size, bool(f & dl.FULL), bool(f & dl.INV))
+                i += 3
+            elif op == dl.RECT:
+                x, y, w, h = coords[i : i + 4]
+                self.rect(
+                    x,
+                    y,
+                    w,
+                    h,
+                    transparent=bool(f & dl.TRANSPARENT),
+                    grey=bool(f & dl.GREY),
+                )
+                i += 4
+            elif op == dl.POLYLINE:
+                n = int(coords[i])
+                xy = coords[i + 1 : i + 1 + 2 * n]
+                points = list(zip(xy[::2], xy[1::2]))
+                self.polyline(
+                    points, grey=bool(f & dl.GREY), filled=bool(f & dl.FILLED)
+                )
+                i += 1 + 2 * n
+            elif op == dl.ACTOR:
+                self.actor(coords[i], coords[i + 1])
+                i += 2
+            elif op == dl.CROSS:
+                x, y, size = coords[i : i + 3]
+                self.cross(x, y, size)
+                i += 3
+            elif op == dl.COMMENT_BOX:
+                x, y, w, h, d = coords[i : i + 5]
+                self.comment_box(x, y, w, h, d)
+                i += 5
+            elif op == dl.FRAME_LABEL_BOX:
+                x, y, w, h, d = coords[i : i + 5]
+                self.frame_label_box(x, y, w, h, d)
+                i += 5
+        if grouped:
+            self.end_source()
+
+    def begin_source(self, first: int, last: int) -> None:
+        """Group what is drawn next, up to end_source(), as drawn from the
+        source lines first to last; only SVG backends do."""
+        pass
+
+    def end_source(self) -> None:
+        pass
+
+    def save(self) -> None:
+        raise NotImplementedError
+
+    def write(self, fp: BinaryIO) -> None:
+        raise NotImplementedError
+
+    def circle(self, x: float, y: float, r: float) -> None:
+        raise NotImplementedError
+
+    def polyline(
+        self,
+        points: Sequence[tuple[float, float]],
+        grey: bool = False,
+        filled: bool = False,
+    ) -> None:
+        raise NotImplementedError
+
+    def polygon(self, points: Sequence[tuple[float, float]]) -> None:
+        raise NotImplementedError
+
+    def get_text_width(self, text: str) -> float:
+        if self.metrics_font_name is None:
+            return self.cfg.TEXT_CHAR_WIDTH * len(text)
+        width = text_width(text, self.metrics_font_name, self.metrics_font_size)
+        return px2cm(width)
+
+    def set_text_max(
+        self, xp: float, yp: float, text: str, start: bool, middle: bool, end: bool
+    ) -> None:
+        l = cm2px(self.get_text_width(text))
+        if start or not start and not middle and not end:
+            self.set_max(xp + l, yp)
+        if middle:
+            self.set_max(xp + l / 2, yp)
+        if end:
+            self.set_max(xp, yp)
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        underline: bool = False,
+        start: bool = False,
+        middle: bool = False,
+        end: bool = False,
+        light: bool = False,
+    ) -> None:
+        raise NotImplementedError
+
+    def rect(
+        self,
+        x: float,
+        y: float,
+        w: float,
+        h: float,
+        transparent: bool = False,
+        grey: bool = False,
+    ) -> None:
+        raise NotImplementedError
+
+    def line(
+        self,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float,
+        grey: bool = False,
+        dashed: bool = False,
+        dotted: bool = False,
+        thick: bool = False,
+    ) -> None:
+        raise NotImplementedError
+
+    def actor(self, x: float, y: float) -> None:
+        r = 0.13
+        self.circle(x, y - r, r)
+        vertices = [
+            (
+                (x - 0.3, y + 0.1),
+                (x + 0.3, y + 0.1),
+            ),
+            (
+                (x, y),
+                (x, y + 0.4),
+            ),
+            (
+                (x - 0.2, y + 0.8),
+                (x, y + 0.4),
+                (x + 0.2, y + 0.8),
+            ),
+        ]
+        for points in vertices:
+            self.polyline(points)
+
+    def cross(self, x: float, y: float, size: float) -> None:
+        d = size / 2
+        x1, x2 = x - d, x + d
+        y1, y2 = y - d, y + d
+        self.line(x1, y2, x2, y1, thick=True)
+        self.line(x1, y1, x2, y2, thick=True)
+
+    def arrow_head(
+        self, x: float, y: float, size: float, full: bool, inv: bool
+    ) -> None:
+        dx = size if inv else -size
+        dy = size / 3
+        points = [
+            (x + dx, y + dy),
+            (x, y),
+            (x + dx, y - dy),
+        ]
+
+        if full:
+            self.polygon(points)
+        else:
+            self.polyline(points)
+
+    def comment_box(
+        self, x: float, y: float, width: float, height: float, corner_size: float
+    ) -> None:
+        d = corner_size
+        points = [
+            (x + width, y + d),
+            (x + width - d, y),
+            (x, y),
+            (x, y + height),
+            (x + width, y + height),
+            (x + width, y + d),
+            (x + width - d, y + d),
+            (x + width - d, y),
+        ]
+        self.polyline(points, filled=True, grey=True)
+
+    def frame_label_box(
+        self, x: float, y: float, width: float, height: float, corner_size: float
+    ) -> None:
+        d = corner_size
+        points = [
+            (x, y),
+            (x + width, y),
+            (x + width, y + height - d),
+            (x + width - d, y + height),
+            (x, y + height),
+            (x, y),
+        ]
+        self.polyline(points, filled=True, grey=True)
+
+
+class SymbolRenderer(Renderer):
+    """A backend that can define the repeated glyphs (actor, cross, arrow
+    head) once, and draw references to them, if SVG_SYMBOLS is set.
+
+    A glyph is defined by drawing it at (0, 0) between begin_symbol() and
+    end_symbol(), once per set of parameters; mirrored arrow heads are
+    distinct glyphs. The diagram size accounts for each reference with
+    the extent of its glyph.
+    """
+
+    def __init__(self, percent_zoom: int, cfg: model.Config | None = None):
+        super().__init__(percent_zoom, cfg)
+        # glyph key -> symbol name, extent of the glyph from its origin
+        self.symbols: dict[tuple[Any, ...], tuple[str, float, float]] = {}
+
+    def begin_symbol(self, name: str) -> None:
+        raise NotImplementedError
+
+    def end_symbol(self) -> None:
+        raise NotImplementedError
+
+    def use_symbol(self, name: str, xp: float, yp: float) -> None:
+        raise NotImplementedError
+
+    def symbol(
+        self, key: tuple[Any, ...], draw: Callable[[], None], x: float, y: float
+    ) -> None:
+        if key not in self.symbols:
+            x_max, y_max = self.x_max, self.y_max
+            self.x_max = self.y_max = -math.inf
+            name = f'{key[0]}-{len(self.symbols)}'
+            self.begin_symbol(name)
+            draw()
+            self.end_symbol()
+            self.symbols[key] = name, self.x_max, self.y_max
+            self.x_max, self.y_max = x_max, y_max
+        name, dx, dy = self.symbols[key]
+        xp, yp = cm2px(x), cm2px(y)
+        self.use_symbol(name, xp, yp)
+        self.set_max(xp + dx, yp + dy)
+
+    def actor(self, x: float, y: float) -> None:
+        if not self.cfg.SVG_SYMBOLS:
+            super().actor(x, y)
+            return
+        self.symbol(('actor',), functools.partial(super().actor, 0, 0), x, y)
+
+    def cross(self, x: float, y: float, size: float) -> None:
+        if not self.cfg.SVG_SYMBOLS:
+            super().cross(x, y, size)
+            return
+        draw = functools.partial(super().cross, 0, 0, size)
+        self.symbol(('cross', size), draw, x, y)
+
+    def arrow_head(
+        self, x: float, y: float, size: float, full: bool, inv: bool
+    ) -> None:
+        if not self.cfg.SVG_SYMBOLS:
+            super().arrow_head(x, y, size, full, inv)
+            return
+        draw = functools.partial(super().arrow_head, 0, 0, size, full, inv)
+        self.symbol(('arrow-head', size, full, inv), draw, x, y)
@@ -0,0 +1,224 @@
+"""Implement graphic primitives as reportlab shapes.
+
+This backend draws straight into a reportlab Drawing, to produce PDF,
+EPS and raster formats without going through SVG. The shapes mirror
+those svglib makes out of the SVG backend output.
+"""
+from typing import BinaryIO, Sequence
+
+from reportlab.graphics.shapes import (
+    FILL_NON_ZERO,
+    Circle,
+    Drawing,
+    Group,
+    Line,
+    PolyLine,
+    Polygon,
+    Rect,
+    String,
+)
+from reportlab.lib import colors
+
+from .converter import draw_to
+from .renderer import Renderer, cm2px
+from .text_metrics import find_font_name, to_font_size
+from . import model
+
+# CSS px to pt
+PX2PT = 0.75
+
+
+def to_color(value: str) -> colors.Color | None:
+    if value == 'none':
+        return None
+    if value.startswith('#') and len(value) == 4:
+        value = '#' + ''.join(c * 2 for c in value[1:])
+    if value.startswith('#'):
+        return colors.HexColor(value)
+    color: colors.Color | None = colors.cssParse(value)
+    if color is None and isinstance(getattr(colors, value, None), colors.Color):
+        color = getattr(colors, value).clone()
+    return color
+
+
+def to_font_name(font_family: str) -> str:
+    return find_font_name(font_family) or 'Helvetica'
+
+
+class RlRenderer(Renderer):
+    def __init__(
+        self,
+        out_path: str | None,
+        percent_zoom: int,
+        bg_color: str = 'white',
+        cfg: model.Config | None = None,
+        format: str = 'pdf',
+    ):
+        super().__init__(percent_zoom, cfg)
+        self.out_path = out_path
+        self.format = format
+        self.bg_color = to_color(bg_color)
+        self.shapes = Group(transform=(self.zoom, 0.0, 0.0, self.zoom, 0, 0))
+        self.add = self.shapes.add
+
+        font = self.cfg.TEXT_FONT
+        self.font_name = to_font_name(font.get('font_family', 'Helvetica'))
+        font_size = to_font_size(font.get('font_size', '10'))
+        # (relative sizes: the default size)
+        self.font_size = 10.0 if font_size is None else font_size
+        self.black = colors.black
+        self.white = colors.white
+        self.grey = to_color(self.cfg.COLOR_GREY)
+        self.light = to_color('#444')
+
+    def get_drawing(self) -> Drawing:
+        """Return a drawing of the shapes drawn so far; it can be called
+        again, after drawing more."""
+        w, h = self.get_size()
+        shapes = self.shapes
+        if self.bg_color is not None:
+            # (like SVG's 100%, unaffected by the zoom)
+            bg = Rect(
+                0,
+                0,
+                w,
+                h,
+                fillColor=self.bg_color,
+                strokeColor=None,
+                fillMode=FILL_NON_ZERO,
+            )
+            # (in a copy of the group, so that self.shapes is unchanged)
+            shapes = Group(bg, *self.shapes.contents, transform=self.shapes.transform)
+        page = Group(shapes, transform=(PX2PT, 0.0, 0.0, -PX2PT, 0.0, h * PX2PT))
+        drawing = Drawing(w * PX2PT, h * PX2PT)
+        drawing.add(page)
+        return drawing
+
+    def save(self) -> None:
+        draw_to(self.get_drawing(), self.out_path, self.format)
+
+    def write(self, fp: BinaryIO) -> None:
+        draw_to(self.get_drawing(), fp, self.format)
+
+    def circle(self, x: float, y: float, r: float) -> None:
+        xp, yp = cm2px(x), cm2px(y)
+        rp = cm2px(r)
+        c = Circle(
+            xp,
+            yp,
+            rp,
+            fillColor=self.white,
+            strokeColor=self.black,
+            fillMode=FILL_NON_ZERO,
+        )
+        self.add(c)
+        self.set_max(xp + rp, yp + rp)
+
+    def polyline(
+        self,
+        points: Sequence[tuple[float, float]],
+        grey: bool = False,
+        filled: bool = False,
+    ) -> None:
+        points_px = [(cm2px(x), cm2px(y)) for x, y in points]
+        flat = [v for p in points_px for v in p]
+        stroke = self.grey if grey else self.black
+        line = PolyLine(flat, strokeColor=stroke)
+        if filled:
+            fill = Polygon(
+                flat, fillColor=self.white, strokeColor=None, fillMode=FILL_NON_ZERO
+            )
+            self.add(Group(fill, line))
+        else:
+            self.add(line)
+        self.set_max(max(x for x, _ in points_px), max(y for _, y in points_px))
+
+    def polygon(self, points: Sequence[tuple[float, float]]) -> None:
+        points_px = [(cm2px(x), cm2px(y)) for x, y in points]
+        flat = [v for p in points_px for v in p]
+        p = Polygon(
+            flat, fillColor=self.black, strokeColor=self.black, fillMode=FILL_NON_ZERO
+        )
+        self.add(p)
+        self.set_max(max(x for x, _ in points_px), max(y for _, y in points_px))
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        underline: bool = False,
+        start: bool = False,
+        middle: bool = False,
+        end: bool = False,
+        light: bool = False,
+    ) -> None:
+        xp, yp = cm2px(x), cm2px(y)
+        anchor = 'start'
+        if middle:
+            anchor = 'middle'
+        if end:
+            anchor = 'end'
+        self.set_text_max(xp, yp, text, start, middle, end)
+        # strings are drawn upright in the flipped coordinates
+        s = String(
+            xp,
+            -yp,
+            text,
+            fontName=self.font_name,
+            fontSize=self.font_size,
+            textAnchor=anchor,
+            fillColor=self.light if light else self.black,
+        )
+        self.add(Group(s, transform=(1, 0, 0, -1, 0, 0)))
+
+    def rect(
+        self,
+        x: float,
+        y: float,
+        w: float,
+        h: float,
+        transparent: bool = False,
+        grey: bool = False,
+    ) -> None:
+        xp, yp = cm2px(x), cm2px(y)
+        wp, hp = cm2px(w), cm2px(h)
+        r = Rect(
+            xp,
+            yp,
+            wp,
+            hp,
+            fillColor=None if transparent else self.white,
+            strokeColor=self.grey if grey else self.black,
+            fillMode=FILL_NON_ZERO,
+        )
+        self.add(r)
+        self.set_max(xp + wp, yp + hp)
+
+    def line(
+        self,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float,
+        grey: bool = False,
+        dashed: bool = False,
+        dotted: bool = False,
+        thick: bool = False,
+    ) -> None:
+        x1p, y1p = cm2px(x1), cm2px(y1)
+        x2p, y2p = cm2px(x2), cm2px(y2)
+        dash = [4.0] if dashed else None
+        if dotted:
+            dash = [2.0]
+        l = Line(
+            x1p,
+            y1p,
+            x2p,
+            y2p,
+            strokeColor=self.grey if grey else self.black,
+            strokeWidth=2.0 if thick else 1.0,
+            strokeDashArray=dash,
+        )
+        self.add(l)
+        self.set_max(max(x1p, x2p), max(y1p, y2p))
@@ -0,0 +1,93 @@
+"""Persistent render server.
+
+Keep the interpreter and the heavy imports (svgwrite, reportlab,
+svglib) warm, and render many diagrams, read as JSON lines from
+stdin or from a Unix socket.
+
+Protocol: each request line is a JSON object (a job), or a JSON list
+of jobs (a batch). A job has the keys:
+- "source": the diagram source text (mandatory),
+- "format": output format (default "svg"),
+- "options": render options, see render_to() (default none),
+- "id": any value, echoed in the reply (optional).
+
+Each request line gets one reply line: for a job, a JSON object with
+"id" and either "data" (the rendered output, base64-encoded) or
+"error"; for a batch, the list of such objects, in order.
+
+Requests may be pipelined: replies come in request order.
+"""
+import base64
+import json
+import os
+import socketserver
+import stat
+import sys
+from typing import Any, TextIO
+
+from . import render
+
+
+def handle_job(job: Any) -> dict[str, Any]:
+    if not isinstance(job, dict):
+        return dict(id=None, error='job must be a JSON object')
+    reply: dict[str, Any] = dict(id=job.get('id'))
+    try:
+        options = dict(job.get('options') or {})
+        if options.pop('debug', False):
+            raise ValueError('option "debug" is not supported by the server')
+        data = render(job['source'], job.get('format', 'svg').lower(), **options)
+    except KeyError as e:
+        reply['error'] = f'missing key {e}'
+    except Exception as e:  # report any failure and keep serving
+        reply['error'] = str(e) or type(e).__name__
+    else:
+        reply['data'] = base64.b64encode(data).decode('ascii')
+    return reply
+
+
+def handle_line(line: str) -> str:
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return json.dumps(dict(id=None, error=f'invalid JSON: {e}'))
+    if isinstance(request, list):
+        return json.dumps([handle_job(job) for job in request])
+    return json.dumps(handle_job(request))
+
+
+def serve_stream(inp: TextIO, out: TextIO) -> None:
+    for line in inp:
+        if not line.strip():
+            continue
+        print(handle_line(line), file=out, flush=True)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for raw in self.rfile:
+            line = raw.decode('utf-8')
+            if not line.strip():
+                continue
+            self.wfile.write(handle_line(line).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def serve(socket_path: str) -> None:
+    """Serve on stdin/stdout if socket_path is '-', else on the Unix
+    socket at socket_path, until interrupted."""
+    if socket_path == '-':
+        serve_stream(sys.stdin, sys.stdout)
+        return
+
+    # remove a stale socket left by a previous server
+    if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        os.unlink(socket_path)
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as server:
+        print(f'umlsequence2: serving on {socket_path}', file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
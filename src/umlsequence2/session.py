@@ -0,0 +1,129 @@
+"""Incremental rendering, for live previews.
+
+A Session renders successive versions of the same diagram. It keeps
+checkpoints of the parser and layout states every few source lines;
+after an edit, parsing and layout resume from the last checkpoint
+before the first changed line, instead of starting over.
+
+Writing the output still takes time proportional to the size of the
+diagram; for SVG, svg_writer='stream' makes it much cheaper. Rendering
+a viewport takes time proportional to what it shows, and view()
+renders other viewports of the last version without laying it out
+again.
+"""
+import io
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Iterable, Sequence
+
+from .config import override_config
+from .parser import Parser
+from .spatial_index import check_viewport
+from .uml_builder import SVG_WRITERS, BuilderState, UmlBuilder
+from . import model
+
+# number of source lines between checkpoints
+CHECKPOINT_INTERVAL = 32
+
+
+@dataclass
+class Checkpoint:
+    line_index: int  # of the next line to parse
+    objects: tuple[str, ...]  # live objects of the parser
+    state: BuilderState
+
+
+class Session:
+    def __init__(
+        self,
+        fmt: str = 'svg',
+        *,
+        percent_zoom: int = 100,
+        bgcolor: str = 'white',
+        svg_writer: str = 'svgwrite',
+        **config: Any,
+    ):
+        """Options are those of render_to()."""
+        if svg_writer not in SVG_WRITERS:
+            raise ValueError(f'unknown SVG writer: {svg_writer}')
+        cfg = override_config(**config)
+        self.builder = UmlBuilder([], None, percent_zoom, bgcolor, cfg, fmt, svg_writer)
+        self.builder.start()
+
+        # (line number, preprocessed line) of the last version, and
+        # checkpoints within them, at multiples of CHECKPOINT_INTERVAL
+        self.lines: list[tuple[int, str]] = []
+        self.checkpoints = [Checkpoint(0, (), self.builder.snapshot())]
+        self.laid_out = False  # the last version, completely
+
+    def render(self, source: str, viewport: Sequence[float] | None = None) -> bytes:
+        """Render the given version of the diagram, and return it."""
+        fp = io.BytesIO()
+        self.render_to(fp, source, viewport)
+        return fp.getvalue()
+
+    def render_to(
+        self,
+        fileobj: BinaryIO,
+        source: str,
+        viewport: Sequence[float] | None = None,
+    ) -> None:
+        """Render the given version of the diagram, and write it to the
+        binary file object fileobj. viewport is that of render_to()."""
+        self.laid_out = False
+        parser = Parser(source)
+        lines = list(parser.iter_lines(io.StringIO(source)))
+
+        # resume from the last checkpoint before the first changed line
+        nb_same = 0
+        for old, new in zip(self.lines, lines):
+            if old != new:
+                break
+            nb_same += 1
+        while self.checkpoints[-1].line_index > nb_same:
+            self.checkpoints.pop()
+        checkpoint = self.checkpoints[-1]
+
+        builder = self.builder
+        builder.restore(checkpoint.state)
+        objects: Iterable[str] = checkpoint.objects
+        i = checkpoint.line_index
+        try:
+            while i < len(lines):
+                chunk = lines[i : i + CHECKPOINT_INTERVAL]
+                builder.feed(parser.iter_parse1(chunk, objects))
+                objects = parser.objects
+                i += len(chunk)
+                if len(chunk) == CHECKPOINT_INTERVAL:
+                    snapshot = builder.snapshot()
+                    self.checkpoints.append(Checkpoint(i, tuple(objects), snapshot))
+        finally:
+            # the lines up to the last checkpoint are known good
+            self.lines = lines[: self.checkpoints[-1].line_index]
+
+        builder.finish()
+        self.laid_out = True
+        self.view_to(fileobj, viewport)
+
+    def line_index(self) -> dict[str, Any]:
+        """Return the line index of the last version of the diagram, see
+        line_index."""
+        if not self.laid_out:
+            raise model.UmlSequenceError('no diagram to index')
+        return self.builder.line_index()
+
+    def view(self, viewport: Sequence[float] | None = None) -> bytes:
+        """Render the last version of the diagram again, e.g. in another
+        viewport, and return it."""
+        fp = io.BytesIO()
+        self.view_to(fp, viewport)
+        return fp.getvalue()
+
+    def view_to(
+        self, fileobj: BinaryIO, viewport: Sequence[float] | None = None
+    ) -> None:
+        """Like view(), writing to the binary file object fileobj."""
+        if not self.laid_out:
+            raise model.UmlSequenceError('no diagram to view')
+        builder = self.builder
+        builder.gfx = builder.make_renderer()
+        builder.render(fileobj, check_viewport(viewport))
@@ -0,0 +1,217 @@
+"""Find the primitives of a laid out diagram within a region.
+
+A SpatialIndex records the bounding box of each primitive of the draw
+lists, and an interval tree of their vertical extents: a region
+(viewport) of the diagram is then drawn from the primitives it
+intersects, found in time proportional to the logarithm of their total
+number plus the number found, instead of replaying them all. Diagrams
+are tall rather than wide, so the horizontal extents are only checked
+on the primitives found.
+
+Bounding boxes are conservative: a primitive may be found for a region
+it does not quite reach, which is harmless, as the output is clipped to
+the region.
+"""
+import math
+from array import array
+from typing import Callable, Sequence
+
+from . import draw_list as dl
+from . import model
+
+# added around each bounding box, for line widths and rounding, in cm
+MARGIN = 0.1
+
+
+class IntervalTree:
+    """Static intervals [lo, hi], sorted by lo, as an implicit balanced
+    binary search tree: the node of the range [i, j) is its middle
+    (i + j) // 2, which also records the largest hi of the range."""
+
+    def __init__(self, los: Sequence[float], his: Sequence[float]):
+        self.order = array('l', sorted(range(len(los)), key=los.__getitem__))
+        self.los = array('d', (los[i] for i in self.order))
+        self.his = array('d', (his[i] for i in self.order))
+        self.max_his = array('d', self.his)
+        self.build(0, len(self.order))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def build(self, i: int, j: int) -> float:
+        # compute max_his of the range [i, j), and return it
+        if i >= j:
+            return -math.inf
+        m = (i + j) // 2
+        hi = max(self.his[m], self.build(i, m), self.build(m + 1, j))
+        self.max_his[m] = hi
+        return hi
+
+    def query(self, lo: float, hi: float) -> list[int]:
+        """Return the indices, in the order given, of the intervals that
+        intersect [lo, hi], unsorted."""
+        found = []
+        ranges = [(0, len(self.order))]
+        while ranges:
+            i, j = ranges.pop()
+            if i >= j:
+                continue
+            m = (i + j) // 2
+            if self.max_his[m] < lo:
+                continue  # all end above
+            ranges.append((i, m))
+            if self.los[m] <= hi:
+                if self.his[m] >= lo:
+                    found.append(self.order[m])
+                ranges.append((m + 1, j))
+        return found
+
+
+def bounds(
+    op: int,
+    flags: int,
+    coords: Sequence[float],
+    text: str | None,
+    text_width: Callable[[str], float],
+    cfg: model.Config,
+) -> tuple[float, float, float, float]:
+    """Return the bounding box of a primitive, as (x1, y1, x2, y2)."""
+    if op == dl.RECT or op == dl.COMMENT_BOX or op == dl.FRAME_LABEL_BOX:
+        x, y, w, h = coords[:4]
+        return x, y, x + w, y + h
+    elif op == dl.LINE:
+        x1, y1, x2, y2 = coords
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+    elif op == dl.POLYLINE:
+        xs, ys = coords[1::2], coords[2::2]
+        return min(xs), min(ys), max(xs), max(ys)
+    elif op == dl.TEXT:
+        # (y is the baseline)
+        x, y = coords
+        assert text is not None
+        w = text_width(text)
+        if flags & dl.MIDDLE:
+            x -= w / 2
+        elif flags & dl.END:
+            x -= w
+        return x, y - cfg.TEXT_HEIGHT, x + w, y + cfg.TEXT_HEIGHT / 2
+    elif op == dl.ACTOR:
+        # see Renderer.actor()
+        x, y = coords
+        return x - 0.3, y - 0.26, x + 0.3, y + 0.8
+    elif op == dl.CROSS:
+        x, y, size = coords
+        return x - size / 2, y - size / 2, x + size / 2, y + size / 2
+    elif op == dl.ARROW_HEAD:
+        x, y, size = coords
+        return x - size, y - size / 3, x + size, y + size / 3
+    raise ValueError(f'unknown opcode: {op}')
+
+
+def check_viewport(
+    viewport: Sequence[float] | None,
+) -> tuple[float, float, float, float] | None:
+    """Return viewport, given as (x, y, width, height), as a tuple, or
+    raise ValueError if it is not one."""
+    if viewport is None:
+        return None
+    if len(viewport) != 4:
+        raise ValueError(f'viewport must be (x, y, width, height): {viewport}')
+    x, y, w, h = (float(v) for v in viewport)
+    if w <= 0 or h <= 0:
+        raise ValueError(f'viewport must have a positive size: {viewport}')
+    return x, y, w, h
+
+
+def translate(op: int, coords: Sequence[float], dx: float, dy: float) -> list[float]:
+    """Return the coordinates of a primitive moved by (dx, dy)."""
+    moved = list(coords)
+    if op == dl.LINE:
+        moved[0] += dx
+        moved[1] += dy
+        moved[2] += dx
+        moved[3] += dy
+    elif op == dl.POLYLINE:
+        for i in range(1, len(moved), 2):
+            moved[i] += dx
+            moved[i + 1] += dy
+    else:
+        # (x, y, then sizes)
+        moved[0] += dx
+        moved[1] += dy
+    return moved
+
+
+class SpatialIndex:
+    def __init__(
+        self,
+        g: dict[int, dl.DrawList],
+        text_width: Callable[[str], float],
+        cfg: model.Config,
+    ):
+        """Index the primitives of the layers g; text_width measures
+        texts, in cm."""
+        self.g = g
+        # per primitive, in drawing order: its layer, its position in
+        # the draw list of the layer, of its coordinates and text
+        self.layers = array('l')
+        self.positions = array('l')
+        self.coord_offsets = array('l')
+        self.text_offsets = array('l')
+        self.x1s, self.x2s = array('d'), array('d')
+        y1s, y2s = array('d'), array('d')
+
+        for layer in sorted(g):
+            draw_list = g[layer]
+            i = t = 0
+            for k, (op, f, coords, text) in enumerate(draw_list):
+                x1, y1, x2, y2 = bounds(op, f, coords, text, text_width, cfg)
+                self.layers.append(layer)
+                self.positions.append(k)
+                self.coord_offsets.append(i)
+                self.text_offsets.append(t)
+                self.x1s.append(x1 - MARGIN)
+                self.x2s.append(x2 + MARGIN)
+                y1s.append(y1 - MARGIN)
+                y2s.append(y2 + MARGIN)
+                i += len(coords)
+                t += text is not None
+        self.tree = IntervalTree(y1s, y2s)
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def find(self, x: float, y: float, w: float, h: float) -> list[int]:
+        """Return the primitives that intersect the region of size w by h
+        at (x, y), in drawing order."""
+        x2 = x + w
+        found = [
+            k
+            for k in self.tree.query(y, y + h)
+            if self.x1s[k] <= x2 and self.x2s[k] >= x
+        ]
+        found.sort()
+        return found
+
+    def query(self, x: float, y: float, w: float, h: float) -> dict[int, dl.DrawList]:
+        """Return the layers of the primitives that intersect the region
+        of size w by h at (x, y), moved so that the region is at the
+        origin."""
+        view: dict[int, dl.DrawList] = {}
+        for k in self.find(x, y, w, h):
+            layer = self.layers[k]
+            draw_list = self.g[layer]
+            op = draw_list.ops[self.positions[k]]
+            i = self.coord_offsets[k]
+            if op == dl.POLYLINE:
+                n = 1 + 2 * int(draw_list.coords[i])
+            else:
+                n = dl.NB_COORDS[op]
+            coords = translate(op, draw_list.coords[i : i + n], -x, -y)
+            text = draw_list.texts[self.text_offsets[k]] if op == dl.TEXT else None
+            lines = draw_list.lines_at(self.positions[k])
+            if layer not in view:
+                view[layer] = dl.DrawList()
+            f = draw_list.flags[self.positions[k]]
+            view[layer].append(op, f, coords, text, lines)
+        return view
@@ -1,50 +1,69 @@
 """Implement graphic primitives as SVG elements."""
-from typing import Sequence
+import io
+from typing import BinaryIO, Sequence
 
 import svgwrite
+import svgwrite.container
 
-from .config import get_config
+from .renderer import SymbolRenderer, cm2px, format_lines
+from . import model
 
 
-def cm2px(cm: float) -> float:
-    return cm * 35.43307
-    return round(cm * 35.43307, 2)
-
-
-def px2cm(px: float) -> float:
-    return px / 35.43307
-    return round(px / 35.43307, 2)
-
-
-class SvgRenderer:
-    def __init__(self, out_path: str, percent_zoom: int, bg_color: str = 'white'):
+class SvgRenderer(SymbolRenderer):
+    def __init__(
+        self,
+        out_path: str | None,
+        percent_zoom: int,
+        bg_color: str = 'white',
+        cfg: model.Config | None = None,
+    ):
+        super().__init__(percent_zoom, cfg)
         self.dwg = svgwrite.Drawing(filename=out_path, debug=True)
-        self.zoom = percent_zoom / 100.0
 
         self.shapes = self.dwg.add(
             self.dwg.g(id='shapes', transform=f'scale({self.zoom})')
         )
+        self.container = self.shapes  # where shapes are added
         self.add = self.shapes.add
 
         if bg_color != 'none':
             self.add(self.dwg.rect(insert=(0, 0), size=('100%', '100%'), fill=bg_color))
-        self.x_max: float = 0
-        self.y_max: float = 0
 
-    def set_max(self, x: float, y: float) -> None:
-        self.x_max = max(self.x_max, x)
-        self.y_max = max(self.y_max, y)
-
-    def save(self) -> None:
-        # compute and set real size
-        w = int(round(self.x_max * self.zoom + 0.5, 0))
-        h = int(round(self.y_max * self.zoom + 0.5, 0))
-        # print(w, h)
+    def set_size(self) -> None:
+        w, h = self.get_size()
         self.dwg.update(dict(width=f'{w}px', height=f'{h}px'))
 
-        # print(self.dwg.tostring())
+    def save(self) -> None:
+        self.set_size()
         self.dwg.save()
 
+    def write(self, fp: BinaryIO) -> None:
+        """Write the SVG document, UTF-8 encoded, to a binary file object."""
+        self.set_size()
+        text = io.StringIO()
+        self.dwg.write(text)
+        fp.write(text.getvalue().encode('utf-8'))
+
+    def begin_symbol(self, name: str) -> None:
+        self.add = self.dwg.defs.add(self.dwg.g(id=name)).add
+
+    def end_symbol(self) -> None:
+        self.add = self.container.add
+
+    def begin_source(self, first: int, last: int) -> None:
+        # (svgwrite rejects data- attributes: the group is not validated)
+        group = svgwrite.container.Group(debug=False)
+        group['data-line'] = format_lines(first, last)
+        self.container = self.shapes.add(group)
+        self.add = self.container.add
+
+    def end_source(self) -> None:
+        self.container = self.shapes
+        self.add = self.shapes.add
+
+    def use_symbol(self, name: str, xp: float, yp: float) -> None:
+        self.add(self.dwg.use(f'#{name}', transform=f'translate({xp},{yp})'))
+
     def circle(self, x: float, y: float, r: float) -> None:
         xp, yp = cm2px(x), cm2px(y)
         rp = cm2px(r)
@@ -62,22 +81,16 @@ class SvgRenderer:
         a = dict(
             points=points_px,
             fill='white' if filled else 'none',
-            stroke=get_config().COLOR_GREY if grey else 'black',
+            stroke=self.cfg.COLOR_GREY if grey else 'black',
         )
         self.add(self.dwg.polyline(**a))
-        for xp, yp in points_px:
-            self.set_max(xp, yp)
+        self.set_max(max(x for x, _ in points_px), max(y for _, y in points_px))
 
     def polygon(self, points: Sequence[tuple[float, float]]) -> None:
         points_px = [(cm2px(x), cm2px(y)) for x, y in points]
         a = dict(points=points_px, stroke='black', fill='black')
         self.add(self.dwg.polygon(**a))
-        for xp, yp in points_px:
-            self.set_max(xp, yp)
-
-    def get_text_width(self, text: str) -> float:
-        # FIXME
-        return get_config().TEXT_CHAR_WIDTH * len(text)
+        self.set_max(max(x for x, _ in points_px), max(y for _, y in points_px))
 
     def text(
         self,
@@ -92,18 +105,15 @@ class SvgRenderer:
     ) -> None:
         xp, yp = cm2px(x), cm2px(y)
         a = dict(
-            fill='#444' if light else 'black', insert=(xp, yp), **get_config().TEXT_FONT
+            fill='#444' if light else 'black', insert=(xp, yp), **self.cfg.TEXT_FONT
         )
-        l = cm2px(self.get_text_width(text))
         if start or not start and not middle and not end:
             a['text_anchor'] = 'start'
-            self.set_max(xp + l, yp)
         if middle:
             a['text_anchor'] = 'middle'
-            self.set_max(xp + l / 2, yp)
         if end:
             a['text_anchor'] = 'end'
-            self.set_max(xp, yp)
+        self.set_text_max(xp, yp, text, start, middle, end)
         if underline:
             a['text_decoration'] = 'underline'
         self.add(self.dwg.text(text, **a))
@@ -123,7 +133,7 @@ class SvgRenderer:
             insert=(xp, yp),
             size=(wp, hp),
             fill='none' if transparent else 'white',
-            stroke=get_config().COLOR_GREY if grey else 'black',
+            stroke=self.cfg.COLOR_GREY if grey else 'black',
             stroke_width=1,
         )
         self.add(self.dwg.rect(**a))
@@ -145,7 +155,7 @@ class SvgRenderer:
         a = dict(
             start=(x1p, y1p),
             end=(x2p, y2p),
-            stroke=get_config().COLOR_GREY if grey else 'black',
+            stroke=self.cfg.COLOR_GREY if grey else 'black',
             stroke_width=2 if thick else 1,
         )
         if dashed:
@@ -153,79 +163,4 @@ class SvgRenderer:
         if dotted:
             a['stroke_dasharray'] = '2'
         self.add(self.dwg.line(**a))
-        self.set_max(x1p, y1p)
-        self.set_max(x2p, y2p)
-
-    def actor(self, x: float, y: float) -> None:
-        r = 0.13
-        self.circle(x, y - r, r)
-        vertices = [
-            (
-                (x - 0.3, y + 0.1),
-                (x + 0.3, y + 0.1),
-            ),
-            (
-                (x, y),
-                (x, y + 0.4),
-            ),
-            (
-                (x - 0.2, y + 0.8),
-                (x, y + 0.4),
-                (x + 0.2, y + 0.8),
-            ),
-        ]
-        for points in vertices:
-            self.polyline(points)
-
-    def cross(self, x: float, y: float, size: float) -> None:
-        d = size / 2
-        x1, x2 = x - d, x + d
-        y1, y2 = y - d, y + d
-        self.line(x1, y2, x2, y1, thick=True)
-        self.line(x1, y1, x2, y2, thick=True)
-
-    def arrow_head(
-        self, x: float, y: float, size: float, full: bool, inv: bool
-    ) -> None:
-        dx = size if inv else -size
-        dy = size / 3
-        points = [
-            (x + dx, y + dy),
-            (x, y),
-            (x + dx, y - dy),
-        ]
-
-        if full:
-            self.polygon(points)
-        else:
-            self.polyline(points)
-
-    def comment_box(
-        self, x: float, y: float, width: float, height: float, corner_size: float
-    ) -> None:
-        d = corner_size
-        points = [
-            (x + width, y + d),
-            (x + width - d, y),
-            (x, y),
-            (x, y + height),
-            (x + width, y + height),
-            (x + width, y + d),
-            (x + width - d, y + d),
-            (x + width - d, y),
-        ]
-        self.polyline(points, filled=True, grey=True)
-
-    def frame_label_box(
-        self, x: float, y: float, width: float, height: float, corner_size: float
-    ) -> None:
-        d = corner_size
-        points = [
-            (x, y),
-            (x + width, y),
-            (x + width, y + height - d),
-            (x + width - d, y + height),
-            (x, y + height),
-            (x, y),
-        ]
-        self.polyline(points, filled=True, grey=True)
+        self.set_max(max(x1p, x2p), max(y1p, y2p))
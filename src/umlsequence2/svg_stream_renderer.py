@@ -0,0 +1,253 @@
+"""Implement graphic primitives as SVG elements, written as text.
+
+A lightweight alternative to SvgRenderer: instead of building (and
+validating) an svgwrite element tree, elements are serialized as soon
+as they are drawn, and the document is assembled on save, once its
+size is known. The output is the same as SvgRenderer's.
+
+Each primitive formats its elements from a template, made once per
+combination of style options: only the coordinates and text are
+formatted per element, and only the text is escaped.
+"""
+import io
+from typing import Any, BinaryIO, Iterable, Sequence
+
+from .renderer import SymbolRenderer, cm2px, format_lines
+from . import model
+
+SVG_ATTRIBUTES = (
+    'baseProfile="full" height="{h}px" version="1.1" width="{w}px" '
+    'xmlns="http://www.w3.org/2000/svg" '
+    'xmlns:ev="http://www.w3.org/2001/xml-events" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink"'
+)
+
+
+def escape_text(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def escape_attribute(text: str) -> str:
+    return (
+        escape_text(text)
+        .replace('"', '&quot;')
+        .replace('\r', '&#13;')
+        .replace('\n', '&#10;')
+        .replace('\t', '&#09;')
+    )
+
+
+def format_points(points: Iterable[tuple[float, float]]) -> str:
+    return ' '.join(f'{x},{y}' for x, y in points)
+
+
+class SvgStreamRenderer(SymbolRenderer):
+    def __init__(
+        self,
+        out_path: str | None,
+        percent_zoom: int,
+        bg_color: str = 'white',
+        cfg: model.Config | None = None,
+    ):
+        super().__init__(percent_zoom, cfg)
+        self.out_path = out_path
+        self.body = io.StringIO()
+        self.add = self.body.write
+        self.defs = io.StringIO()
+        self.templates: dict[tuple[Any, ...], str] = {}
+
+        if bg_color != 'none':
+            self.element('rect', fill=bg_color, height='100%', width='100%', x=0, y=0)
+
+    def element(self, tag: str, text: str | None = None, **attributes: Any) -> None:
+        # attributes in alphabetical order, as svgwrite does
+        attrs = ' '.join(
+            f'{k.replace("_", "-")}="{escape_attribute(str(v))}"'
+            for k, v in sorted(attributes.items())
+        )
+        if text is None:
+            self.add(f'<{tag} {attrs} />')
+        else:
+            self.add(f'<{tag} {attrs}>{escape_text(text)}</{tag}>')
+
+    def template(self, tag: str, text: bool = False, **attributes: Any) -> str:
+        # like element(), as a str.format() template whose fields are the
+        # attributes given as None, and the text
+        attrs = ' '.join(
+            f'{k.replace("_", "-")}="{{{k}}}"'
+            if v is None
+            else f'{k.replace("_", "-")}="{escape_attribute(str(v))}"'.replace(
+                '{', '{{'
+            ).replace('}', '}}')
+            for k, v in sorted(attributes.items())
+        )
+        if not text:
+            return f'<{tag} {attrs} />'
+        return f'<{tag} {attrs}>{{text}}</{tag}>'
+
+    def write(self, fp: BinaryIO) -> None:
+        """Write the SVG document, UTF-8 encoded, to a binary file object."""
+        w, h = self.get_size()
+        defs = f'<defs>{self.defs.getvalue()}</defs>' if self.symbols else '<defs />'
+        header = (
+            '<?xml version="1.0" encoding="utf-8" ?>\n'
+            f'<svg {SVG_ATTRIBUTES.format(w=w, h=h)}>{defs}'
+            f'<g id="shapes" transform="scale({self.zoom})">'
+        )
+        fp.write(header.encode('utf-8'))
+        fp.write(self.body.getvalue().encode('utf-8'))
+        fp.write(b'</g></svg>')
+
+    def save(self) -> None:
+        with open(self.out_path, 'wb') as f:
+            self.write(f)
+
+    def begin_symbol(self, name: str) -> None:
+        self.add = self.defs.write
+        self.add(f'<g id="{name}">')
+
+    def end_symbol(self) -> None:
+        self.add('</g>')
+        self.add = self.body.write
+
+    def begin_source(self, first: int, last: int) -> None:
+        self.add(f'<g data-line="{format_lines(first, last)}">')
+
+    def end_source(self) -> None:
+        self.add('</g>')
+
+    def use_symbol(self, name: str, xp: float, yp: float) -> None:
+        self.add(f'<use transform="translate({xp},{yp})" xlink:href="#{name}" />')
+
+    def circle(self, x: float, y: float, r: float) -> None:
+        xp, yp = cm2px(x), cm2px(y)
+        rp = cm2px(r)
+        key = ('circle',)
+        if key not in self.templates:
+            self.templates[key] = self.template(
+                'circle',
+                cx=None,
+                cy=None,
+                fill='white',
+                r=None,
+                stroke='black',
+                stroke_width=1,
+            )
+        self.add(self.templates[key].format(cx=xp, cy=yp, r=rp))
+        self.set_max(xp + rp, yp + rp)
+
+    def polyline(
+        self,
+        points: Sequence[tuple[float, float]],
+        grey: bool = False,
+        filled: bool = False,
+    ) -> None:
+        xs = [cm2px(x) for x, _ in points]
+        ys = [cm2px(y) for _, y in points]
+        key = ('polyline', grey, filled)
+        if key not in self.templates:
+            self.templates[key] = self.template(
+                'polyline',
+                fill='white' if filled else 'none',
+                points=None,
+                stroke=self.cfg.COLOR_GREY if grey else 'black',
+            )
+        self.add(self.templates[key].format(points=format_points(zip(xs, ys))))
+        self.set_max(max(xs), max(ys))
+
+    def polygon(self, points: Sequence[tuple[float, float]]) -> None:
+        xs = [cm2px(x) for x, _ in points]
+        ys = [cm2px(y) for _, y in points]
+        key = ('polygon',)
+        if key not in self.templates:
+            self.templates[key] = self.template(
+                'polygon', fill='black', points=None, stroke='black'
+            )
+        self.add(self.templates[key].format(points=format_points(zip(xs, ys))))
+        self.set_max(max(xs), max(ys))
+
+    def text(
+        self,
+        x: float,
+        y: float,
+        text: str,
+        underline: bool = False,
+        start: bool = False,
+        middle: bool = False,
+        end: bool = False,
+        light: bool = False,
+    ) -> None:
+        xp, yp = cm2px(x), cm2px(y)
+        key = ('text', underline, start, middle, end, light)
+        if key not in self.templates:
+            a = dict(
+                fill='#444' if light else 'black', x=None, y=None, **self.cfg.TEXT_FONT
+            )
+            if start or not start and not middle and not end:
+                a['text_anchor'] = 'start'
+            if middle:
+                a['text_anchor'] = 'middle'
+            if end:
+                a['text_anchor'] = 'end'
+            if underline:
+                a['text_decoration'] = 'underline'
+            self.templates[key] = self.template('text', True, **a)
+        self.set_text_max(xp, yp, text, start, middle, end)
+        self.add(self.templates[key].format(x=xp, y=yp, text=escape_text(text)))
+
+    def rect(
+        self,
+        x: float,
+        y: float,
+        w: float,
+        h: float,
+        transparent: bool = False,
+        grey: bool = False,
+    ) -> None:
+        xp, yp = cm2px(x), cm2px(y)
+        wp, hp = cm2px(w), cm2px(h)
+        key = ('rect', transparent, grey)
+        if key not in self.templates:
+            self.templates[key] = self.template(
+                'rect',
+                fill='none' if transparent else 'white',
+                height=None,
+                stroke=self.cfg.COLOR_GREY if grey else 'black',
+                stroke_width=1,
+                width=None,
+                x=None,
+                y=None,
+            )
+        self.add(self.templates[key].format(height=hp, width=wp, x=xp, y=yp))
+        self.set_max(xp + wp, yp + hp)
+
+    def line(
+        self,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float,
+        grey: bool = False,
+        dashed: bool = False,
+        dotted: bool = False,
+        thick: bool = False,
+    ) -> None:
+        x1p, y1p = cm2px(x1), cm2px(y1)
+        x2p, y2p = cm2px(x2), cm2px(y2)
+        key = ('line', grey, dashed, dotted, thick)
+        if key not in self.templates:
+            a: dict[str, Any] = dict(
+                x1=None,
+                y1=None,
+                x2=None,
+                y2=None,
+                stroke=self.cfg.COLOR_GREY if grey else 'black',
+                stroke_width=2 if thick else 1,
+            )
+            if dashed:
+                a['stroke_dasharray'] = '4'
+            if dotted:
+                a['stroke_dasharray'] = '2'
+            self.templates[key] = self.template('line', **a)
+        self.add(self.templates[key].format(x1=x1p, y1=y1p, x2=x2p, y2=y2p))
+        self.set_max(max(x1p, x2p), max(y1p, y2p))
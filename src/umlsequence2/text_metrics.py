@@ -0,0 +1,76 @@
+"""Text widths, from the font metrics shipped with reportlab.
+
+Widths are those of the first font family of TEXT_FONT that reportlab
+knows, which is also the font the reportlab backend draws with. The
+widths of the glyphs of each font are looked up once, and labels repeat
+a lot (object names, calls), so text widths are memoized too.
+
+reportlab is imported on first use, to keep the package import fast.
+"""
+import functools
+import re
+
+# number of (text, font, size) widths kept
+CACHE_SIZE = 4096
+
+
+def find_font_name(font_family: str) -> str | None:
+    from reportlab.pdfbase import pdfmetrics
+
+    # first family known to reportlab, as svglib does
+    for name in font_family.split(','):
+        name = name.strip().strip('\'"')
+        if (
+            name in pdfmetrics.standardFonts
+            or name in pdfmetrics.getRegisteredFontNames()
+        ):
+            return name
+    return None
+
+
+# px per unit of absolute CSS lengths
+FONT_SIZE_UNITS = {
+    'px': 1.0,
+    '': 1.0,
+    'pt': 96 / 72,
+    'pc': 16.0,
+    'in': 96.0,
+    'cm': 96 / 2.54,
+    'mm': 96 / 25.4,
+}
+
+
+def to_font_size(font_size: str) -> float | None:
+    """Return font_size in px, as SVG font sizes are, or None if it is
+    not an absolute size (1em, 120%, large)."""
+    match = re.fullmatch(
+        r'\s*([0-9.]+(?:[eE][-+]?[0-9]+)?)\s*([a-z]*)\s*', font_size.lower()
+    )
+    if match is None or match[2] not in FONT_SIZE_UNITS:
+        return None
+    try:
+        return float(match[1]) * FONT_SIZE_UNITS[match[2]]
+    except ValueError:
+        return None
+
+
+@functools.cache
+def glyph_widths(font_name: str) -> dict[str, float]:
+    # character -> width, in thousandths of the font size
+    return {}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def text_width(text: str, font_name: str, font_size: float) -> float:
+    """Return the width of text, in the unit of font_size."""
+    widths = glyph_widths(font_name)
+    try:
+        total = sum([widths[c] for c in text])
+    except KeyError:
+        from reportlab.pdfbase import pdfmetrics
+
+        for c in text:
+            if c not in widths:
+                widths[c] = pdfmetrics.stringWidth(c, font_name, 1000)
+        total = sum([widths[c] for c in text])
+    return total * font_size / 1000
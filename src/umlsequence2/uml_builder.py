@@ -1,13 +1,18 @@
 """Render intermediate UML code to graphic primitives."""
 from __future__ import annotations
 
+import heapq
 import re
 import sys
 from collections import OrderedDict
-from typing import Any, Callable, TypeVar
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterable, TypeVar
 
 from .config import get_config
-from .svg_renderer import SvgRenderer
+from .draw_list import DrawList
+from .line_index import make_line_index
+from .renderer import Renderer, cm2px
+from .spatial_index import SpatialIndex
 
 from . import model
 
@@ -40,42 +45,141 @@ class CheckedOrderedDict(OrderedDict[str, T]):
 
 CODict = CheckedOrderedDict
 
+OBJECT_CMDS = ('object', 'pobject', 'actor')
+MESSAGE_CMDS = ('message', 'cmessage', 'dmessage', 'rmessage')
+
+
+@dataclass
+class BuilderState:
+    """Layout state of an UmlBuilder between two commands."""
+
+    last_cmd: str | None
+    objects: CODict[model.Object]
+    dead_objects: CODict[model.Object]
+    activity: dict[str, tuple[tuple[float, int], ...]]
+    ypos: float
+    nb_activity_boxes: int
+    activity_row: int
+    comments: CODict[model.Comment]
+    frames: CODict[model.Frame]
+    line_nr: int
+    line: str | None
+    marks: dict[int, tuple[int, int, int]]
+    nb_breaks: int
+    nb_lifelines: int
+
+
+# SVG backends: svgwrite document tree, or text stream (faster)
+SVG_WRITERS = ('svgwrite', 'stream')
+
 
 class UmlBuilder:
     def __init__(
         self,
-        lines: list[model.Command],
-        out_path: str,
+        lines: Iterable[model.Command],
+        out_path: str | None,
         percent_zoom: int,
         bg_color: str,
+        cfg: model.Config | None = None,
+        format: str = 'svg',
+        svg_writer: str = 'svgwrite',
     ) -> None:
         self.lines = lines
-        self.gfx = SvgRenderer(out_path, percent_zoom, bg_color)
+        self.cfg = cfg or get_config()
+        self.out_path = out_path
+        self.percent_zoom = percent_zoom
+        self.bg_color = bg_color
+        self.format = format
+        self.svg_writer = svg_writer
+        self.gfx = self.make_renderer()
         self.warnings: set[str] = set()
-        self.g: dict[int, Any] = {}  # Any = (fn, args, kw)
-        self.cfg = get_config()
+        self.g: dict[int, DrawList] = {}
+        self.index: SpatialIndex | None = None
+        self.handlers: dict[str, Callable[[str, model.Args], None]] = {
+            'object': self.handle_object,
+            'pobject': self.handle_object,
+            'actor': self.handle_object,
+            'oconstraint': self.handle_oconstraint,
+            'lconstraint': self.handle_lconstraint,
+            'lconstraint_below': self.handle_lconstraint_below,
+            'active': self.handle_active,
+            'inactive': self.handle_inactive,
+            'message': self.handle_message,
+            'cmessage': self.handle_cmessage,
+            'dmessage': self.handle_dmessage,
+            'rmessage': self.handle_rmessage,
+            'step': self.handle_step,
+            'blip': self.handle_blip,
+            'comment': self.handle_comment,
+            'connect_to_comment': self.handle_connect_to_comment,
+            'begin_frame': self.handle_begin_frame,
+            'end_frame': self.handle_end_frame,
+            'complete': self.handle_complete,
+            'delete': self.handle_delete,
+        }
+
+    def make_renderer(self) -> Renderer:
+        # (backends are imported on demand, as their libraries are large)
+        args = (self.out_path, self.percent_zoom, self.bg_color, self.cfg)
+        if self.format == 'svg' and self.svg_writer == 'stream':
+            from .svg_stream_renderer import SvgStreamRenderer
+
+            return SvgStreamRenderer(*args)
+        elif self.format == 'svg':
+            from .svg_renderer import SvgRenderer
+
+            return SvgRenderer(*args)
+        else:
+            from .rl_renderer import RlRenderer
+
+            return RlRenderer(*args, self.format)
 
-    def run(self) -> None:
+    def run(
+        self,
+        fp: BinaryIO | None = None,
+        viewport: tuple[float, float, float, float] | None = None,
+    ) -> None:
+        self.build()
+        self.render(fp, viewport)
+
+    def build(self) -> None:
+        self.start()
+        self.feed(self.lines)
+        self.finish()
+
+    def start(self) -> None:
+        """Initialize the layout state, before the first command."""
+        self.g = {}
+        self.index = None
         self.last_cmd: str = None
         self.objects_dic: CODict[model.Object] = CODict('object', self)
         self.dead_objects_dic: CODict[model.Object] = CODict('object', self)
-        self.activity_dic: CODict[list[float]] = CODict('object', self)
+        self.reset_indices()
+        self.run_objects: list[str] | None = []
+        # per object, the stack of its activations: y, and source line
+        self.activity_dic: CODict[list[tuple[float, int]]] = CODict('object', self)
         self.ypos = self.cfg.STEP_NORMAL
         self.activity_boxes: list[model.Rectangle] = []
         self.activity_row = 0
         self.comment_dic: CODict[model.Comment] = CODict('comment', self)
         self.frame_dic: CODict[model.Frame] = CODict('frame', self)
         self.line_nr = 0
-        self.line = None
-        self.x_max = 0.0
-        self.y_max = 0.0
-
+        self.line: str | None = None
+        # where pages may end (before messages), and the completed
+        # objects with the end of their lifelines, see pagination
+        self.breaks: list[float] = []
+        self.lifelines: list[tuple[model.Object, float]] = []
+
+    def feed(self, lines: Iterable[model.Command]) -> None:
+        """Lay out the given commands, following those already fed."""
         # execute each line
-        for line in self.lines:
+        for line in lines:
             cmd = line.cmd
             args = line.args
             self.handle_cmd(cmd, args)
 
+    def finish(self) -> None:
+        """Lay out what remains open after the last command."""
         # some commands are rendered on command change, so have a fake cmd
         self.handle_cmd(None, None)
 
@@ -89,30 +193,123 @@ class UmlBuilder:
         names = list(self.objects_dic.keys())
         for name in names:
             o = self.objects_dic[name]
-            self.handle_complete('complete', [name])
+            self.handle_complete('complete', (name,))
 
         # draw activations in reverse order
-        self.activity_boxes.reverse()
-        for rect in self.activity_boxes:
-            self.add(1, self.gfx.rect, rect.x, rect.y, rect.w, rect.h)
+        for rect in reversed(self.activity_boxes):
+            self.layer(1, rect.lines).rect(rect.x, rect.y, rect.w, rect.h)
+
+    def snapshot(self) -> BuilderState:
+        """Return a copy of the layout state, see restore()."""
+        return BuilderState(
+            last_cmd=self.last_cmd,
+            objects=self.copy_dic(self.objects_dic),
+            dead_objects=self.copy_dic(self.dead_objects_dic),
+            activity={k: tuple(v) for k, v in self.activity_dic.items()},
+            ypos=self.ypos,
+            nb_activity_boxes=len(self.activity_boxes),
+            activity_row=self.activity_row,
+            comments=self.copy_dic(self.comment_dic),
+            frames=self.copy_dic(self.frame_dic),
+            line_nr=self.line_nr,
+            line=self.line,
+            marks={layer: dl.mark() for layer, dl in self.g.items()},
+            nb_breaks=len(self.breaks),
+            nb_lifelines=len(self.lifelines),
+        )
 
-        # render graphics
-        layers = sorted(self.g.keys())
+    def restore(self, state: BuilderState) -> None:
+        """Go back to the layout state of a snapshot taken since start(),
+        dropping what was laid out after it. This invalidates the
+        snapshots taken after that one."""
+        self.last_cmd = state.last_cmd
+        self.objects_dic = self.copy_dic(state.objects)
+        self.dead_objects_dic = self.copy_dic(state.dead_objects)
+        self.reset_indices()
+        self.run_objects = None
+        self.activity_dic = CODict('object', self)
+        for k, v in state.activity.items():
+            self.activity_dic[k] = list(v)
+        self.ypos = state.ypos
+        del self.activity_boxes[state.nb_activity_boxes :]
+        self.activity_row = state.activity_row
+        self.comment_dic = self.copy_dic(state.comments)
+        self.frame_dic = self.copy_dic(state.frames)
+        self.line_nr = state.line_nr
+        self.line = state.line
+        for layer in list(self.g):
+            if layer in state.marks:
+                self.g[layer].truncate(state.marks[layer])
+            else:
+                del self.g[layer]
+        del self.breaks[state.nb_breaks :]
+        del self.lifelines[state.nb_lifelines :]
+        self.index = None
+
+    def copy_dic(self, dic: CODict[T]) -> CODict[T]:
+        # (elements are not modified once created, so can be shared)
+        copy: CODict[T] = CODict(dic.name, self)
+        copy.update(dic)
+        return copy
+
+    def render(
+        self,
+        fp: BinaryIO | None = None,
+        viewport: tuple[float, float, float, float] | None = None,
+    ) -> None:
+        """Render graphics, and save them to the output path, or write
+        them to fp if given. With viewport, (x, y, width, height) in cm,
+        render only that region of the diagram."""
+        self.draw(viewport)
+        self.write(fp)
+
+    def draw(self, viewport: tuple[float, float, float, float] | None = None) -> None:
+        """Replay the layers into the renderer, see render()."""
+        if viewport is None:
+            g = self.g
+        else:
+            g = self.spatial_index().query(*viewport)
+        layers = sorted(g.keys())
         for layer in layers:
-            for fn, args, kw in self.g[layer]:
-                fn(*args, **kw)
+            self.gfx.draw(g[layer])
+        if viewport is not None:
+            # the output is the region, whatever overflows it
+            self.set_size(viewport[2], viewport[3])
+
+    def set_size(self, width: float, height: float) -> None:
+        """Make the output width by height, in cm, whatever was drawn."""
+        self.gfx.x_max, self.gfx.y_max = cm2px(width), cm2px(height)
+
+    def spatial_index(self) -> SpatialIndex:
+        """Return the index of the laid out primitives, built on first
+        use, to render viewports."""
+        if self.index is None:
+            self.index = SpatialIndex(self.g, self.gfx.get_text_width, self.cfg)
+        return self.index
+
+    def write(self, fp: BinaryIO | None = None) -> None:
+        """Output what was drawn, see render()."""
+        if fp is None:
+            self.gfx.save()
+        else:
+            self.gfx.write(fp)
 
-        # done
-        self.gfx.save()
+    def line_index(self) -> dict[str, Any]:
+        """Return the line index of the laid out diagram, see line_index."""
+        return make_line_index(self.g, self.gfx.get_text_width, self.cfg)
 
-    def add(self, layer: int, fn: Callable[..., Any], *args: Any, **kw: Any) -> None:
+    def layer(self, layer: int, lines: tuple[int, int] | None = None) -> DrawList:
+        """Return the draw list of the given layer; higher layers are
+        drawn on top. What is drawn next in it comes from the source
+        lines (first, last), by default the current line."""
         if layer not in self.g:
-            self.g[layer] = []
-        self.g[layer].append((fn, args, kw))
-
-    def set_max(self, x: float, y: float) -> None:
-        self.x_max = max(self.x_max, x)
-        self.y_max = max(self.y_max, y)
+            self.g[layer] = DrawList()
+        draw_list = self.g[layer]
+        if lines is None:
+            draw_list.set_lines(self.line_nr, self.line_nr)
+        else:
+            draw_list.set_lines(*lines)
+        return draw_list
 
     def get_x(
         self, obj: model.Object, center: bool = False, activity: bool = False
@@ -124,8 +321,8 @@ class UmlBuilder:
             x += self.nb_active(obj.name) * self.cfg.ACTIVITY_WIDTH / 2
         return x
 
-    def warn(self, cmd: str, args: list[Any], warning: str) -> None:
-        text = f'WARNING: {warning}: {cmd} {args}'
+    def warn(self, cmd: str, args: model.Args, warning: str) -> None:
+        text = f'WARNING: {warning}: {cmd} {list(args)}'
         if text not in self.warnings:
             self.warnings.add(text)
             print(text, file=sys.stderr)
@@ -133,136 +330,126 @@ class UmlBuilder:
     def nb_active(self, name: str) -> int:
         return len(self.activity_dic.get(name, []))
 
+    def reset_indices(self) -> None:
+        # column indices below nb_indices are either used by a live
+        # object, or free, in the free_indices min-heap
+        used = {o.index for o in self.objects_dic.values()}
+        self.nb_indices = max(used, default=-1) + 1
+        self.free_indices = [i for i in range(self.nb_indices) if i not in used]
+
     def compute_object_index(self) -> int:
-        if not self.objects_dic:
-            index = 0
+        # the lowest index not used by a live object
+        if self.free_indices:
+            return heapq.heappop(self.free_indices)
+        self.nb_indices += 1
+        return self.nb_indices - 1
+
+    def handle_trace(self, cmd: str, args: model.Args) -> None:
+        line_nr, self.line = args
+        self.line_nr = int(line_nr)
+
+    def handle_object(self, cmd: str, args: model.Args) -> None:
+        # create objects; they are drawn by leave_objects()
+        if cmd in ('object', 'actor'):
+            name, label = args
         else:
-            index = None
-            indices = [o.index for o in self.objects_dic.values()]
-            for i in range(len(self.objects_dic)):
-                if i not in indices:
-                    index = i
-                    break
-            if index is None:
-                index = max(indices) + 1
-        return index
-
-    def handle_trace(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'trace':
-            return
-        self.line_nr, self.line = args
-
-    def handle_object(self, cmd: str, args: list[Any]) -> None:
-        olike = ('object', 'pobject', 'actor')
-        if cmd in olike:
-            # create objects
-            if cmd in ('object', 'actor'):
-                name, label = args
-            else:
-                (name,) = args
-                label = None
-
-            if name in self.objects_dic:
-                index = self.objects_dic[name].index
-            else:
-                index = self.compute_object_index()
+            (name,) = args
+            label = None
 
-            ypos = self.ypos
-            if cmd == 'actor':
-                ypos += self.cfg.ACTOR_DESCENT
-            self.objects_dic[name] = model.Object(
-                cmd, index, name, label, ypos, self.activity_row
+        if name in self.objects_dic:
+            index = self.objects_dic[name].index
+            # (it is then drawn in its former order)
+            self.run_objects = None
+        else:
+            index = self.compute_object_index()
+            if self.run_objects is not None:
+                self.run_objects.append(name)
+
+        ypos = self.ypos
+        if cmd == 'actor':
+            ypos += self.cfg.ACTOR_DESCENT
+        self.objects_dic[name] = model.Object(
+            cmd, index, name, label, ypos, self.activity_row, self.line_nr
+        )
+        self.activity_dic[name] = []
+
+    def leave_objects(self) -> None:
+        # draw the objects created by the preceding run of object commands,
+        # in the order of objects_dic; unless known, find them by their row
+        objects: Iterable[model.Object]
+        if self.run_objects is None:
+            objects = self.objects_dic.values()
+        else:
+            objects = [self.objects_dic[name] for name in self.run_objects]
+        self.run_objects = []
+        for o in objects:
+            if o.type == 'pobject':
+                continue
+            if self.activity_row != o.row:
+                continue
+            self.draw_object(o, self.ypos, self.layer(1, (o.line_nr, o.line_nr)))
+        self.ypos += self.cfg.OBJECT_STEP
+        self.activity_row += 1
+
+    def draw_object(self, o: model.Object, ypos: float, draw_list: DrawList) -> None:
+        # the box or actor of an object, with its label, in the row at ypos
+        if o.type == 'actor':
+            x, y = self.get_x(o, True), ypos - self.cfg.ACTOR_ASCENT
+            draw_list.actor(x, y)
+            x, y = self.get_x(o, True), ypos + self.cfg.ACTOR_LABEL_Y
+            draw_list.text(x, y, o.label, middle=True)
+        else:  # regular object
+            x, y = self.get_x(o), ypos
+            draw_list.rect(
+                x,
+                y,
+                self.cfg.COLUMN_WIDTH,
+                self.cfg.OBJECT_HEIGHT,
             )
-            self.activity_dic[name] = []
-        elif self.last_cmd in olike:
-            # draw objects
-            for o in self.objects_dic.values():
-                if o.type == 'pobject':
-                    continue
-                if self.activity_row != o.row:
-                    continue
-                if o.type == 'actor':
-                    x, y = self.get_x(o, True), self.ypos - self.cfg.ACTOR_ASCENT
-                    self.add(1, self.gfx.actor, x, y)
-                    x, y = self.get_x(o, True), self.ypos + self.cfg.ACTOR_LABEL_Y
-                    self.add(1, self.gfx.text, x, y, o.label, middle=True)
-                else:  # regular object
-                    x, y = self.get_x(o), self.ypos
-                    self.add(
-                        1,
-                        self.gfx.rect,
-                        x,
-                        y,
-                        self.cfg.COLUMN_WIDTH,
-                        self.cfg.OBJECT_HEIGHT,
-                    )
-                    x, y = self.get_x(o, True), self.ypos + self.cfg.OBJECT_LABEL_Y
-                    self.add(
-                        1, self.gfx.text, x, y, o.label, middle=True, underline=True
-                    )
-            self.ypos += self.cfg.OBJECT_STEP
-            self.activity_row += 1
-
-    def handle_pobject(self, cmd: str, args: list[Any]) -> None:
-        return
-
-    def handle_actor(self, cmd: str, args: list[Any]) -> None:
-        return
-
-    def handle_oconstraint(self, cmd: str, args: list[Any]) -> bool:
-        if cmd != 'oconstraint':
-            return False
+            x, y = self.get_x(o, True), ypos + self.cfg.OBJECT_LABEL_Y
+            draw_list.text(x, y, o.label, middle=True, underline=True)
+
+    def handle_oconstraint(self, cmd: str, args: model.Args) -> None:
         name, text = args
         o = self.objects_dic[name]
         x, y = self.get_x(o), o.ypos - self.cfg.TEXT_MARGIN_Y
-        self.add(1, self.gfx.text, x, y, text)
-        return True
+        self.layer(1).text(x, y, text)
 
-    def handle_lconstraint(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'lconstraint':
-            return
+    def handle_lconstraint(self, cmd: str, args: model.Args) -> None:
         name, text = args
         o = self.objects_dic[name]
         x = self.get_x(o, True, True) + self.cfg.TEXT_MARGIN_X
         y = self.ypos - self.cfg.TEXT_MARGIN_Y
-        self.add(1, self.gfx.text, x, y, text)
+        self.layer(1).text(x, y, text)
         self.ypos += self.cfg.STEP_SMALL
 
-    def handle_lconstraint_below(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'lconstraint_below':
-            return
+    def handle_lconstraint_below(self, cmd: str, args: model.Args) -> None:
         name, text = args
         o = self.objects_dic[name]
         x = self.get_x(o, True, True) + self.cfg.TEXT_MARGIN_X
         y = self.ypos - self.cfg.TEXT_MARGIN_Y + self.cfg.STEP_SMALL
-        self.add(1, self.gfx.text, x, y, text)
+        self.layer(1).text(x, y, text)
 
-    def handle_active(self, cmd: str, args: list[Any]) -> None:
-        if cmd == 'active':
-            (name,) = args
-            self.activity_dic[name].append(self.ypos)
+    def handle_active(self, cmd: str, args: model.Args) -> None:
+        (name,) = args
+        self.activity_dic[name].append((self.ypos, self.line_nr))
 
-    def handle_inactive(self, cmd: str, args: list[Any]) -> None:
-        if cmd == 'inactive':
-            (name,) = args
-            self.inactivate(name)
+    def handle_inactive(self, cmd: str, args: model.Args) -> None:
+        (name,) = args
+        self.inactivate(name)
 
-    def handle_message(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'message':
-            return
+    def handle_message(self, cmd: str, args: model.Args) -> None:
         src, dst, txt, asynch, align = args
         self._handle_message(src, dst, txt, False, asynch, align=align)
 
-    def handle_cmessage(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'cmessage':
-            return
+    def handle_cmessage(self, cmd: str, args: model.Args) -> None:
         src, dst, label, message, asynch = args
         self.ypos += self.cfg.STEP_NORMAL
         save1_y = self.ypos
-        self.handle_object('object', [dst, label])  # create
+        self.handle_object('object', (dst, label))  # create
         self.last_cmd = 'object'
 
-        self.handle_object('', None)  # draw
+        self.leave_objects()  # draw
         save2_y = self.ypos
         self.ypos = save1_y - self.cfg.OBJECT_STEP / 2
         text = message or "«create»"
@@ -271,22 +458,18 @@ class UmlBuilder:
         )
         self.ypos = save2_y
 
-    def handle_dmessage(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'dmessage':
-            return
+    def handle_dmessage(self, cmd: str, args: model.Args) -> None:
         dst, src = args
         text = "«destroy»"
         self._handle_message(src, dst, text, True, True)
         o = self.objects_dic[dst]
         x = self.get_x(o, True)
-        self.add(2, self.gfx.cross, x, self.ypos, self.cfg.CROSS_SIZE)
+        self.layer(2).cross(x, self.ypos, self.cfg.CROSS_SIZE)
 
-        self.handle_complete('complete', [dst])
+        self.handle_complete('complete', (dst,))
         self.ypos += self.cfg.STEP_NORMAL
 
-    def handle_rmessage(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'rmessage':
-            return
+    def handle_rmessage(self, cmd: str, args: model.Args) -> None:
         src, dst, txt, asynch = args
         self._handle_message(dst, src, txt, True, True)
 
@@ -312,7 +495,7 @@ class UmlBuilder:
             if txt:
                 x = self.get_x(o1, True, True) + self.cfg.TEXT_MARGIN_X
                 y = self.ypos
-                self.add(2, self.gfx.text, x, y, txt)
+                self.layer(2).text(x, y, txt)
 
             sgn = 1
             x0 = self.get_x(o1, True, True)
@@ -329,7 +512,7 @@ class UmlBuilder:
                 (xb, self.ypos + step),
                 (x1, self.ypos + step),
             ]
-            self.add(2, self.gfx.polyline, points)
+            self.layer(2).polyline(points)
             self.ypos += step
         else:
             if txt:
@@ -344,9 +527,7 @@ class UmlBuilder:
                     x = (self.get_x(o1, True) + self.get_x(o2, True) - shorten) / 2
                     middle = True
                 y = self.ypos
-                self.add(
-                    2, self.gfx.text, x, y, txt, start=start, middle=middle, end=end
-                )
+                self.layer(2).text(x, y, txt, start=start, middle=middle, end=end)
                 self.ypos += self.cfg.TEXT_MARGIN_Y
 
             x1 = self.get_x(o1, True, True) + self.cfg.MESSAGE_SPACING
@@ -358,16 +539,14 @@ class UmlBuilder:
                 x1 += self.cfg.MESSAGE_SPACING
             else:
                 x2 -= self.cfg.MESSAGE_SPACING
-            self.add(2, self.gfx.line, x1, self.ypos, x2, self.ypos, dashed=dashed)
+            self.layer(2).line(x1, self.ypos, x2, self.ypos, dashed=dashed)
             if inv:
                 x1 -= self.cfg.MESSAGE_SPACING
             else:
                 x2 += self.cfg.MESSAGE_SPACING
 
         # arrow head
-        self.add(
-            2,
-            self.gfx.arrow_head,
+        self.layer(2).arrow_head(
             x1 if inv else x2,
             self.ypos,
             self.cfg.ARROW_HEAD_SIZE,
@@ -375,22 +554,16 @@ class UmlBuilder:
             inv,
         )
 
-    def handle_step(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'step':
-            return
+    def handle_step(self, cmd: str, args: model.Args) -> None:
         self.ypos += self.cfg.STEP_NORMAL
 
-    def handle_blip(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'blip':
-            return
+    def handle_blip(self, cmd: str, args: model.Args) -> None:
         (name,) = args
-        self.handle_active('active', [name])
+        self.handle_active('active', (name,))
         self.ypos += self.cfg.STEP_NORMAL
-        self.handle_inactive('inactive', [name])
+        self.handle_inactive('inactive', (name,))
 
-    def handle_comment(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'comment':
-            return
+    def handle_comment(self, cmd: str, args: model.Args) -> None:
         name, options, text = args
         comment_name, pos = options
 
@@ -424,13 +597,13 @@ class UmlBuilder:
         if comment_name:
             self.comment_dic[comment_name] = comment
 
-        self.add(3, self.gfx.comment_box, x2, y2, width, height, self.cfg.TEXT_DOGEAR)
+        self.layer(3).comment_box(x2, y2, width, height, self.cfg.TEXT_DOGEAR)
         self.make_comment_connector(x1, y1, comment)
 
         dx = self.cfg.TEXT_MARGIN_X
         dy = self.cfg.TEXT_HEIGHT
         for line in lines:
-            self.add(3, self.gfx.text, x2 + dx, y2 + dy, line, light=True)
+            self.layer(3).text(x2 + dx, y2 + dy, line, light=True)
             dy += self.cfg.TEXT_HEIGHT
 
     def make_comment_connector(
@@ -450,20 +623,16 @@ class UmlBuilder:
             y2 = comment.y + comment.height
         else:
             return
-        self.add(3, self.gfx.line, x, y, x2, y2, grey=True, dotted=True)
+        self.layer(3).line(x, y, x2, y2, grey=True, dotted=True)
 
-    def handle_connect_to_comment(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'connect_to_comment':
-            return
+    def handle_connect_to_comment(self, cmd: str, args: model.Args) -> None:
         src, dst = args
         o = self.objects_dic[src]
         c = self.comment_dic[dst]
         x1, y1 = self.get_x(o, True), self.ypos
         self.make_comment_connector(x1, y1, c)
 
-    def handle_begin_frame(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'begin_frame':
-            return
+    def handle_begin_frame(self, cmd: str, args: model.Args) -> None:
         src, fname, options, label = args
         out = 0
 
@@ -481,12 +650,10 @@ class UmlBuilder:
         o = self.objects_dic[src]
         x = self.get_x(o)
         y = self.ypos
-        self.frame_dic[fname] = model.Frame(x, y, label, out)
+        self.frame_dic[fname] = model.Frame(x, y, label, out, self.line_nr)
         self.ypos += self.cfg.STEP_NORMAL
 
-    def handle_end_frame(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'end_frame':
-            return
+    def handle_end_frame(self, cmd: str, args: model.Args) -> None:
         fname, dst = args
         o = self.objects_dic.get(dst) or self.dead_objects_dic.get(dst)
         frame = self.frame_dic[fname]
@@ -500,81 +667,85 @@ class UmlBuilder:
             x -= frame.out
             w += frame.out * 2
 
-        self.add(2, self.gfx.rect, x, y, w, h, transparent=True, grey=True)
+        # the frame spans its lines, its label comes from the first one
+        lines = frame.line_nr, self.line_nr
+        self.layer(2, lines).rect(x, y, w, h, transparent=True, grey=True)
         d = self.cfg.TEXT_DOGEAR
         width = self.gfx.get_text_width(frame.label) + self.cfg.TEXT_MARGIN_X * 2 + d
         height = self.cfg.TEXT_HEIGHT + self.cfg.TEXT_MARGIN_Y
-        self.add(2, self.gfx.frame_label_box, x, y, width, height, d)
+        label = self.layer(2, (frame.line_nr, frame.line_nr))
+        label.frame_label_box(x, y, width, height, d)
 
         dx = self.cfg.TEXT_MARGIN_X
         dy = self.cfg.TEXT_HEIGHT
-        self.add(2, self.gfx.text, x + dx, y + dy, frame.label, light=True)
+        label.text(x + dx, y + dy, frame.label, light=True)
         self.ypos += self.cfg.STEP_SMALL
 
-    def handle_delete(self, cmd: str, args: list[Any]) -> None:
-        if cmd != 'delete':
-            return
+    def handle_delete(self, cmd: str, args: model.Args) -> None:
         (name,) = args
         o = self.objects_dic[name]
         x = self.get_x(o, True)
-        self.add(
-            2,
-            self.gfx.cross,
+        self.layer(2).cross(
             x,
             self.ypos + self.cfg.CROSS_SIZE / 2,
             self.cfg.CROSS_SIZE,
         )
-        self.handle_complete('complete', [name])
+        self.handle_complete('complete', (name,))
         self.ypos += self.cfg.STEP_NORMAL
 
-    def handle_complete(self, cmd: str, args: list[Any]) -> None:
-        if cmd == 'complete':
-            (name,) = args
-            stack = self.activity_dic[name]
-            # inactivate all levels
-            for i in range(len(stack)):
-                self.inactivate(name)
-            # draw lifeline
-            o = self.objects_dic[name]
-            if o.label is not None:
-                x = self.get_x(o, True)
-                y1 = o.ypos + self.cfg.STEP_NORMAL
-                y2 = self.ypos + 0.1
-                self.add(1, self.gfx.line, x, y1, x, y2, dashed=True, grey=True)
-            self.dead_objects_dic[name] = self.objects_dic[name]
-            del self.objects_dic[name]
-
-        elif self.last_cmd == 'complete':
-            self.ypos += self.cfg.STEP_NORMAL
+    def handle_complete(self, cmd: str, args: model.Args) -> None:
+        (name,) = args
+        stack = self.activity_dic[name]
+        # inactivate all levels
+        for i in range(len(stack)):
+            self.inactivate(name)
+        # draw lifeline
+        o = self.objects_dic[name]
+        if o.label is not None:
+            x = self.get_x(o, True)
+            y1 = o.ypos + self.cfg.STEP_NORMAL
+            y2 = self.ypos + 0.1
+            lines = o.line_nr, self.line_nr
+            self.layer(1, lines).line(x, y1, x, y2, dashed=True, grey=True)
+            self.lifelines.append((o, y2))
+        heapq.heappush(self.free_indices, o.index)
+        self.dead_objects_dic[name] = o
+        del self.objects_dic[name]
+
+    def leave_complete(self) -> None:
+        # a run of complete commands is followed by a step
+        self.ypos += self.cfg.STEP_NORMAL
 
-    def handle_cmd(self, cmd: str, args: list[Any]) -> None:
+    def handle_cmd(self, cmd: str, args: model.Args) -> None:
         if cmd == '#####':
-            cmd = 'trace'
-            self.handle_trace(cmd, args)
+            self.handle_trace('trace', args)
             return
 
-        if cmd:
-            f = getattr(self, 'handle_' + cmd)  # check we have a handler
-
-        if self.handle_oconstraint(cmd, args):
+        if cmd == 'oconstraint':
+            # transparent: does not count as a command change
+            self.handle_oconstraint(cmd, args)
             return
-        self.handle_object(cmd, args)
-        self.handle_active(cmd, args)
-        self.handle_inactive(cmd, args)
-        self.handle_message(cmd, args)
-        self.handle_cmessage(cmd, args)
-        self.handle_dmessage(cmd, args)
-        self.handle_rmessage(cmd, args)
-        self.handle_step(cmd, args)
-        self.handle_blip(cmd, args)
-        self.handle_lconstraint(cmd, args)
-        self.handle_lconstraint_below(cmd, args)
-        self.handle_comment(cmd, args)
-        self.handle_connect_to_comment(cmd, args)
-        self.handle_begin_frame(cmd, args)
-        self.handle_end_frame(cmd, args)
-        self.handle_complete(cmd, args)
-        self.handle_delete(cmd, args)
+
+        handler = self.handlers[cmd] if cmd else None
+
+        # on command change: draw the objects created so far
+        if self.last_cmd in OBJECT_CMDS and cmd not in OBJECT_CMDS:
+            self.leave_objects()
+
+        # on command change: step after completions; a deletion takes
+        # this step before drawing its cross, other commands after
+        # being handled
+        if cmd == 'delete' and self.last_cmd == 'complete':
+            self.leave_complete()
+
+        if handler:
+            if cmd in MESSAGE_CMDS:
+                self.breaks.append(self.ypos + self.cfg.STEP_NORMAL / 3)
+            handler(cmd, args)
+
+        # (note: cmessage resets last_cmd while creating its object)
+        if cmd not in ('complete', 'delete') and self.last_cmd == 'complete':
+            self.leave_complete()
 
         self.last_cmd = cmd
 
@@ -587,11 +758,12 @@ class UmlBuilder:
         )
         if not len(self.activity_dic[name]):
             error(f'Cannot inactivate {name} because it is not active', self)
-        y = self.activity_dic[name][-1]
+        y, line_nr = self.activity_dic[name][-1]
         w = self.cfg.ACTIVITY_WIDTH
-        h = self.ypos - self.activity_dic[name][-1]
+        h = self.ypos - y
         if h == 0:
             self.ypos += self.cfg.STEP_NORMAL
-            h = self.ypos - self.activity_dic[name][-1]
-        self.activity_boxes.append(model.Rectangle(x, y, w, h))
+            h = self.ypos - y
+        lines = line_nr, self.line_nr
+        self.activity_boxes.append(model.Rectangle(x, y, w, h, lines))
         self.activity_dic[name].pop()
@@ -0,0 +1,140 @@
+"""Watch directories, and regenerate the diagrams of changed files.
+
+The .umlsequence and markdown files of the watched directories (not
+recursively) are polled. A changed .umlsequence file is regenerated;
+for a changed markdown file, only the snippets whose source changed,
+or whose output is missing, are regenerated. Snippet output names are
+relative to the markdown file directory.
+
+A file is handled once it has not changed for a poll period, so that a
+burst of saves triggers a single generation.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from . import RX_MARKDOWN_SNIPPET, generate, get_cache
+from . import error, model
+
+POLL_INTERVAL = 0.5  # s
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+Stat = tuple[int, int]  # modification time (ns), size
+
+
+def scan(directories: list[str]) -> dict[str, Stat]:
+    files: dict[str, Stat] = {}
+    for directory in directories:
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(('.umlsequence',) + MARKDOWN_EXTENSIONS):
+                        continue
+                    if entry.is_file():
+                        st = entry.stat()
+                        files[entry.path] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            pass  # may be created later
+    return files
+
+
+class Watcher:
+    def __init__(self, directories: list[str], args: argparse.Namespace):
+        self.directories = directories
+        self.args = args
+        self.cache = get_cache(args)
+        self.stats: dict[str, Stat] = {}  # of the files as last handled
+        # generated snippets: markdown path -> output path -> source
+        self.snippets: dict[str, dict[str, str]] = {}
+        self.nb_errors = 0
+
+    def run(self, once: bool = False) -> None:
+        """Generate the diagrams of all files, then, unless once is
+        True, keep regenerating those of changed files."""
+        previous = scan(self.directories)
+        self.update(previous, previous)
+        while not once:
+            time.sleep(POLL_INTERVAL)
+            current = scan(self.directories)
+            settled = {p: s for p, s in current.items() if previous.get(p) == s}
+            self.update(settled, current)
+            previous = current
+
+    def update(self, settled: dict[str, Stat], current: dict[str, Stat]) -> None:
+        # forget deleted files
+        for path in list(self.stats):
+            if path not in current:
+                del self.stats[path]
+                self.snippets.pop(path, None)
+
+        for path, stat in sorted(settled.items()):
+            if self.stats.get(path) == stat:
+                continue
+            self.stats[path] = stat
+            try:
+                with open(path) as f:
+                    text = f.read()
+            except OSError as e:
+                self.report(path, str(e))
+                continue
+            if path.endswith(MARKDOWN_EXTENSIONS):
+                self.update_markdown(path, text)
+            else:
+                name = os.path.splitext(path)[0] + '.' + self.args.format
+                self.generate(path, name, text)
+
+    def update_markdown(self, path: str, text: str) -> None:
+        directory = os.path.dirname(path)
+        snippets: dict[str, str] = {}
+        for m in RX_MARKDOWN_SNIPPET.finditer(text):
+            # (when snippets share an output, the last one wins)
+            snippets[os.path.join(directory, m['output'])] = m['src']
+
+        old = self.snippets.get(path, {})
+        done: dict[str, str] = {}
+        for name, src in snippets.items():
+            if old.get(name) == src and os.path.exists(name):
+                done[name] = src
+            elif self.generate(path, name, src):
+                done[name] = src
+        self.snippets[path] = done
+
+    def generate(self, path: str, name: str, src: str) -> bool:
+        inp = io.StringIO(src)
+        inp.name = path
+        args = self.args
+        try:
+            generate(
+                inp,
+                name,
+                args.percent_zoom,
+                args.verbose,
+                args.debug,
+                args.background_color,
+                args.format,
+                self.cache,
+                args.svg_writer,
+            )
+        except (model.UmlSequenceError, OSError) as e:
+            self.report(name, str(e))
+            return False
+        print(f'{sys.argv[0]}: generated {name}', file=sys.stderr)
+        return True
+
+    def report(self, name: str, message: str) -> None:
+        self.nb_errors += 1
+        error.print_error(f'{name}: {message}')
+
+
+def watch(directories: list[str], args: argparse.Namespace, once: bool = False) -> int:
+    """Watch the given directories until interrupted, or generate their
+    diagrams once if once is True. Return the number of errors."""
+    watcher = Watcher(directories, args)
+    try:
+        watcher.run(once)
+    except KeyboardInterrupt:
+        pass
+    return watcher.nb_errors
@@ -1,7 +1,7 @@
 #!/bin/bash
 . ../set-ex.sh
 
-#python3 tests/unit_tests.py -v
+python3 unit_tests.py -v
 
 for f in test*.umlsequence; do
     umlsequence2 $f
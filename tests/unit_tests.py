@@ -0,0 +1,903 @@
+#!/usr/bin/env python3
+"""Unit tests, run from the tests directory by run-tests.sh."""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from typing import Any
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# the package of this checkout, rather than an installed one
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+import umlsequence2  # noqa: E402
+from umlsequence2 import draw_list as dl  # noqa: E402
+from umlsequence2 import model, server  # noqa: E402
+from umlsequence2.cache import EVICT_RATIO, RenderCache, cache_key  # noqa: E402
+from umlsequence2.config import get_config, override_config  # noqa: E402
+from umlsequence2.pagination import Band, clip_line, clip_rect  # noqa: E402
+from umlsequence2.parser import Parser, dump_commands, load_commands  # noqa: E402
+from umlsequence2.renderer import cm2px, format_lines  # noqa: E402
+from umlsequence2.session import Session  # noqa: E402
+from umlsequence2.spatial_index import bounds  # noqa: E402
+from umlsequence2.uml_builder import UmlBuilder  # noqa: E402
+
+SOURCE = '''\
+a : A
+b : B
+a -> b+ call
+b-> a result
+b ~
+'''
+
+
+def long_source(nb_messages: int) -> str:
+    # spans several session checkpoints
+    lines = ['a : A', 'b : B', 'c : C']
+    for i in range(nb_messages):
+        x, y = 'abc'[i % 3], 'abc'[(i + 1) % 3]
+        lines.append(f'{x} -> {y} message {i}')
+        if i % 10 == 5:
+            lines.append(f'{y} // note {i}')
+    return '\n'.join(lines) + '\n'
+
+
+# most statements, with line continuations; a valid diagram
+RICH_SOURCE = '''\
+u * User
+a : A
+b : B
+c :
+u -> a+ start
+a -> b+ \\
+    call(x, \\
+\ty)
+b -> a- reply
+a :> c+ c:C
+a => c async
+c ?-> b lost
+b <--? c found
+a > self call
+a // [n1 down 0.5] a comment \\n on two lines
+b _{below}
+a { constraint }
+f [ a title
+a -> b in frame
+b ] f
+c- #> b
+a : Relabel
+a!
+:
+u ~
+'''
+
+
+def run_command(*args: str, input: str = '') -> subprocess.CompletedProcess[str]:
+    # the command line of this checkout
+    command = [sys.executable, os.path.join(ROOT, 'umlsequence2'), *args]
+    return subprocess.run(
+        command, cwd=ROOT, input=input, capture_output=True, text=True
+    )
+
+
+class ServerTest(unittest.TestCase):
+    def test_job(self) -> None:
+        reply = json.loads(server.handle_line(json.dumps(dict(id=7, source=SOURCE))))
+        self.assertEqual(reply.keys(), {'id', 'data'})
+        self.assertEqual(reply['id'], 7)
+        self.assertEqual(base64.b64decode(reply['data']), umlsequence2.render(SOURCE))
+
+    def test_format_and_options(self) -> None:
+        job = dict(source=SOURCE, format='SVG', options=dict(percent_zoom=200))
+        reply = json.loads(server.handle_line(json.dumps(job)))
+        self.assertIsNone(reply['id'])
+        expected = umlsequence2.render(SOURCE, 'svg', percent_zoom=200)
+        self.assertEqual(base64.b64decode(reply['data']), expected)
+
+    def test_batch(self) -> None:
+        jobs = [
+            dict(id='x', source=SOURCE),
+            dict(id='y'),
+            dict(id='z', source='a : A\n'),
+        ]
+        replies = json.loads(server.handle_line(json.dumps(jobs)))
+        self.assertEqual([reply['id'] for reply in replies], ['x', 'y', 'z'])
+        self.assertIn('data', replies[0])
+        self.assertEqual(replies[1]['error'], "missing key 'source'")
+        self.assertIn('data', replies[2])
+
+    def test_errors(self) -> None:
+        reply = json.loads(server.handle_line('{"source": '))
+        self.assertIsNone(reply['id'])
+        self.assertTrue(reply['error'].startswith('invalid JSON: '))
+
+        reply = json.loads(server.handle_line('[1]'))
+        self.assertEqual(reply, [dict(id=None, error='job must be a JSON object')])
+
+        job = dict(id=1, source=SOURCE, options=dict(debug=True))
+        reply = json.loads(server.handle_line(json.dumps(job)))
+        self.assertEqual(reply.keys(), {'id', 'error'})
+
+        job = dict(id=2, source=SOURCE, options=dict(NO_SUCH_OPTION=1))
+        reply = json.loads(server.handle_line(json.dumps(job)))
+        self.assertEqual(reply.keys(), {'id', 'error'})
+
+        job = dict(id=3, source='a -> b call\n')
+        reply = json.loads(server.handle_line(json.dumps(job)))
+        self.assertEqual(reply.keys(), {'id', 'error'})
+        self.assertTrue(reply['error'])
+
+    def test_stream(self) -> None:
+        # one reply line per request line, in order, blank lines skipped
+        requests = [
+            json.dumps(dict(id=1, source=SOURCE)),
+            '',
+            'not json',
+            json.dumps([dict(id=2, source=SOURCE)]),
+        ]
+        out = io.StringIO()
+        server.serve_stream(io.StringIO('\n'.join(requests) + '\n'), out)
+        replies = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(replies), 3)
+        self.assertEqual(replies[0]['id'], 1)
+        self.assertIn('error', replies[1])
+        self.assertEqual([reply['id'] for reply in replies[2]], [2])
+
+
+class SessionTest(unittest.TestCase):
+    def check_edits(self, **options: object) -> None:
+        # each version as rendered from scratch
+        source = long_source(100)
+        lines = source.splitlines(keepends=True)
+        versions = [
+            source,
+            source + 'c -> a appended\n',  # at the end
+            ''.join(lines[:70] + ['a -> c inserted\n'] + lines[70:]),
+            ''.join(lines[:10] + lines[11:]),  # near the start
+            ''.join(lines[:50]),  # shorter
+            source,
+        ]
+        session = Session(**options)
+        for version in versions:
+            self.assertEqual(
+                session.render(version), umlsequence2.render(version, **options)
+            )
+
+    def test_edits(self) -> None:
+        self.check_edits()
+
+    def test_edits_stream(self) -> None:
+        self.check_edits(svg_writer='stream', percent_zoom=150)
+
+    def test_errors(self) -> None:
+        session = Session()
+        with self.assertRaises(model.UmlSequenceError):
+            session.view()
+        source = long_source(100)
+        session.render(source)
+
+        # an error in the middle, then fixed, or the previous version
+        lines = source.splitlines(keepends=True)
+        broken = ''.join(lines[:60] + ['a -> nobody call\n'] + lines[60:])
+        with self.assertRaises(model.UmlSequenceError):
+            session.render(broken)
+        with self.assertRaises(model.UmlSequenceError):
+            session.view()
+        fixed = ''.join(lines[:60] + ['a -> b call\n'] + lines[60:])
+        self.assertEqual(session.render(fixed), umlsequence2.render(fixed))
+        with self.assertRaises(model.UmlSequenceError):
+            session.render(broken)
+        self.assertEqual(session.render(source), umlsequence2.render(source))
+
+    def test_viewport(self) -> None:
+        session = Session()
+        source = long_source(100)
+        viewport = (1.0, 10.0, 8.0, 6.0)
+        self.assertEqual(
+            session.render(source, viewport),
+            umlsequence2.render(source, viewport=viewport),
+        )
+        self.assertEqual(session.view(), umlsequence2.render(source))
+
+
+def preprocess_reference(raw: str) -> list[str]:
+    # the original preprocessing, rewriting the whole input
+    raw = raw.replace("\t", " ")
+    while raw.find("\\\n ") >= 0:
+        raw = raw.replace("\\\n ", "\\\n")
+    while raw.find(" \\\n") >= 0:
+        raw = raw.replace(" \\\n", "\\\n")
+    raw = raw.replace("\\\n", " ")
+    return raw.split('\n')
+
+
+class ParserTest(unittest.TestCase):
+    def test_stream(self) -> None:
+        # commands streamed from a file object, or parsed at once
+        cmds, _ = Parser(RICH_SOURCE).parse()
+        self.assertGreater(len(cmds), 40)
+        streamed = list(Parser().iter_commands(io.StringIO(RICH_SOURCE)))
+        self.assertEqual(streamed, cmds)
+
+    def test_continued(self) -> None:
+        # parse1() in chunks, passing the live objects on
+        cmds, _ = Parser(RICH_SOURCE).parse()
+        parser = Parser(RICH_SOURCE)
+        lines = list(parser.iter_lines(io.StringIO(RICH_SOURCE)))
+        chunked: list[model.Command] = []
+        objects: list[str] = []
+        for i in range(0, len(lines), 3):
+            chunk = lines[i : i + 3]
+            chunked += parser.parse1([line for _, line in chunk], chunk[0][0], objects)
+            objects = list(parser.objects)
+        self.assertEqual(chunked, cmds)
+
+    def test_preprocess(self) -> None:
+        for raw in [
+            RICH_SOURCE,
+            'a : A\n',
+            'a : A',
+            'a \\\n   \\\n : A\n',
+            'a\t:\tA \\\n\t\tB\n\n',
+            'a -> b x  \\\n',
+            '\\\n\\\n',
+        ]:
+            expected = preprocess_reference(raw)
+            if expected[-1] == '':
+                expected.pop()  # (no line after the last newline)
+            self.assertEqual(Parser().preprocess(raw), expected, repr(raw))
+
+    def test_dump(self) -> None:
+        # as cached, with frames, comments and constraints
+        cmds, _ = Parser(RICH_SOURCE).parse()
+        kinds = {cmd.cmd for cmd in cmds}
+        for kind in ['begin_frame', 'end_frame', 'comment', 'lconstraint']:
+            self.assertIn(kind, kinds)
+        self.assertEqual(load_commands(dump_commands(cmds)), cmds)
+
+    def test_line_numbers(self) -> None:
+        # of the first physical line of continued lines
+        raw = 'a : A\nb : \\\n  B\\\n\nc : C\n'
+        self.assertEqual(
+            list(Parser().iter_lines(io.StringIO(raw))),
+            [(1, 'a : A'), (2, 'b : B '), (5, 'c : C')],
+        )
+        cmds, _ = Parser(raw).parse()
+        self.assertEqual(
+            [cmd.args[0] for cmd in cmds if cmd.cmd == '#####'], ['1', '2', '5']
+        )
+
+
+def svg_size(svg: bytes) -> tuple[float, float]:
+    match = re.search(
+        rb'<svg [^>]*?height="([0-9.]+)px"[^>]*? width="([0-9.]+)px"', svg
+    )
+    assert match is not None
+    return float(match[2]), float(match[1])
+
+
+class PaginationTest(unittest.TestCase):
+    def test_clip_line(self) -> None:
+        # the parts of a line on consecutive pages make it whole
+        column = Band(-math.inf, math.inf, 0)
+        rows = [Band(-math.inf, 4, 0), Band(4, 8, -4), Band(8, math.inf, -8)]
+        parts = [clip_line(0, 0, 4, 16, column, row) for row in rows]
+        self.assertEqual(parts, [(0, 0, 1, 4), (1, 4, 2, 8), (2, 8, 4, 16)])
+
+        self.assertIsNone(clip_line(1, 1, 1, 3, column, rows[1]))
+        self.assertIsNone(clip_line(1, 6, 4, 6, Band(5, 10, 0), rows[1]))
+        # (ending on a page border: not on the next page)
+        self.assertIsNone(clip_line(1, 2, 1, 4, column, rows[1]))
+        self.assertEqual(clip_line(0, 7, 9, 7, Band(3, 6, 0), rows[1]), (3, 7, 6, 7))
+
+    def test_clip_rect(self) -> None:
+        column = Band(-math.inf, math.inf, 0)
+        rows = [Band(-math.inf, 5, 0), Band(5, 10, -5)]
+        self.assertEqual(clip_rect(1, 3, 2, 4, column, rows[0]), (1, 3, 2, 2))
+        self.assertEqual(clip_rect(1, 3, 2, 4, column, rows[1]), (1, 5, 2, 2))
+        self.assertIsNone(clip_rect(1, 1, 2, 4, column, rows[1]))
+        self.assertIsNone(clip_rect(1, 6, 2, 1, Band(4, 8, 0), rows[1]))
+        self.assertEqual(clip_rect(1, 6, 9, 1, Band(4, 8, 0), rows[1]), (4, 6, 4, 1))
+
+    def test_rows(self) -> None:
+        source = long_source(60)
+        full_height = svg_size(umlsequence2.render(source))[1]
+        for page_height in [5, 10, 20]:
+            pages = list(umlsequence2.render_pages(source, page_height=page_height))
+            self.assertGreaterEqual(len(pages), full_height / cm2px(page_height))
+            text = b''.join(pages)
+            for page in pages:
+                self.assertLessEqual(svg_size(page)[1], cm2px(page_height) + 1)
+                # with the headers of the objects
+                for label in [b'>A<', b'>B<', b'>C<']:
+                    self.assertEqual(page.count(label), 1)
+            # texts are not split
+            for i in range(60):
+                self.assertEqual(text.count(b'>message %d<' % i), 1)
+
+    def test_columns(self) -> None:
+        source = long_source(10)
+        labels = [b'>A<', b'>B<', b'>C<']
+        for page_width, per_page in [(4, 1), (6, 2)]:
+            pages = list(umlsequence2.render_pages(source, page_width=page_width))
+            self.assertEqual(len(pages), math.ceil(3 / per_page))
+            for i, page in enumerate(pages):
+                self.assertLessEqual(svg_size(page)[0], cm2px(page_width) + 1)
+                shown = labels[i * per_page : (i + 1) * per_page]
+                for label in labels:
+                    self.assertEqual(page.count(label), label in shown)
+
+    def test_page_too_small(self) -> None:
+        with self.assertRaises(model.UmlSequenceError):
+            list(umlsequence2.render_pages(long_source(10), page_height=1))
+
+
+def svg_texts(
+    svg: bytes, dx: float = 0, dy: float = 0
+) -> set[tuple[float, float, str]]:
+    # the texts and their positions, moved by (dx, dy) px
+    return {
+        (round(float(x) + dx, 3), round(float(y) + dy, 3), text.decode())
+        for x, y, text in re.findall(
+            rb'<text [^>]*?x="([-0-9.]+)" y="([-0-9.]+)">([^<]*)<', svg
+        )
+    }
+
+
+class ViewportTest(unittest.TestCase):
+    VIEWPORTS = [(0, 0, 5, 3), (1, 10, 8, 6), (4.5, 20.2, 2, 2.5), (-5, -5, 100, 100)]
+
+    def test_crop(self) -> None:
+        # the texts of a viewport are those of the full render within it
+        source = long_source(60)
+        full = umlsequence2.render(source)
+        for x, y, w, h in self.VIEWPORTS:
+            view = umlsequence2.render(source, viewport=(x, y, w, h))
+            self.assertEqual(
+                svg_size(view), (round(cm2px(w) + 0.5), round(cm2px(h) + 0.5))
+            )
+            texts = svg_texts(view)
+            cropped = svg_texts(full, -cm2px(x), -cm2px(y))
+            self.assertLessEqual(texts, cropped)
+            inside = {
+                (tx, ty, text)
+                for tx, ty, text in cropped
+                if 0 <= tx <= cm2px(w) and 0 <= ty <= cm2px(h)
+            }
+            self.assertLessEqual(inside, texts)
+            if w == 100:
+                self.assertEqual(texts, cropped)
+
+    def test_find(self) -> None:
+        # against the bounding boxes of all primitives
+        cfg = get_config()
+        builder = UmlBuilder(
+            Parser(long_source(60)).parse()[0], None, 100, 'white', cfg
+        )
+        builder.build()
+        index = builder.spatial_index()
+        boxes = [
+            bounds(op, f, coords, text, builder.gfx.get_text_width, cfg)
+            for layer in sorted(builder.g)
+            for op, f, coords, text in builder.g[layer]
+        ]
+        self.assertEqual(len(index), len(boxes))
+        for x, y, w, h in self.VIEWPORTS:
+            found = set(index.find(x, y, w, h))
+            for k, (x1, y1, x2, y2) in enumerate(boxes):
+                if x1 <= x + w and x2 >= x and y1 <= y + h and y2 >= y:
+                    self.assertIn(k, found)
+
+    def test_outputs(self) -> None:
+        source = long_source(60)
+        viewport = self.VIEWPORTS[1]
+        outputs = umlsequence2.render_all(
+            source, [('svg', 100), ('svg', 200)], viewport=viewport
+        )
+        self.assertEqual(outputs[0], umlsequence2.render(source, viewport=viewport))
+        self.assertEqual(
+            outputs[1],
+            umlsequence2.render(source, viewport=viewport, percent_zoom=200),
+        )
+
+    def test_invalid(self) -> None:
+        for viewport in [(0, 0, 5), (0, 0, 0, 5), (0, 0, 5, -1)]:
+            with self.assertRaises(ValueError):
+                umlsequence2.render(SOURCE, viewport=viewport)
+
+
+class LineIndexTest(unittest.TestCase):
+    def line_index(self, source: str, **options: object) -> dict[str, object]:
+        fp = io.StringIO()
+        umlsequence2.render(source, line_index=fp, **options)
+        data: dict[str, object] = json.loads(fp.getvalue())
+        return data
+
+    def test_format(self) -> None:
+        data = self.line_index(SOURCE)
+        self.assertEqual(data.keys(), {'version', 'unit', 'ranges'})
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(data['unit'], 'px')
+        ranges = data['ranges']
+        assert isinstance(ranges, list)
+        self.assertEqual(
+            [(first, last) for first, last, *_ in ranges],
+            [(1, 1), (1, 5), (2, 2), (2, 5), (3, 3), (3, 4), (4, 4)],
+        )
+        for first, last, x1, y1, x2, y2 in ranges:
+            self.assertIsInstance(first, int)
+            self.assertIsInstance(last, int)
+            self.assertLessEqual(x1, x2)
+            self.assertLessEqual(y1, y2)
+
+    def test_svg_lines(self) -> None:
+        # the SVG groups are those of the index, and within its boxes
+        source = long_source(30)
+        fp = io.StringIO()
+        svg = umlsequence2.render(source, line_index=fp, SVG_LINES=True)
+        boxes = {
+            format_lines(first, last): box
+            for first, last, *box in json.loads(fp.getvalue())['ranges']
+        }
+        groups = re.findall(rb'<g data-line="([-0-9]+)">(.*?)</g>', svg)
+        self.assertEqual({lines.decode() for lines, _ in groups}, boxes.keys())
+        for lines, group in groups:
+            x1, y1, x2, y2 = boxes[lines.decode()]
+            for x, y, _ in svg_texts(group):
+                self.assertTrue(x1 <= x <= x2 and y1 <= y <= y2, (lines, x, y))
+        # (the grouping changes nothing else)
+        plain = re.sub(rb'<g data-line="[-0-9]+">(.*?)</g>', rb'\1', svg)
+        self.assertEqual(plain, umlsequence2.render(source))
+
+    def test_same_index(self) -> None:
+        # whatever the output
+        source = long_source(30)
+        data = self.line_index(source)
+        self.assertEqual(self.line_index(source, svg_writer='stream'), data)
+        self.assertEqual(self.line_index(source, percent_zoom=200), data)
+        session = Session()
+        session.render(source)
+        self.assertEqual(session.line_index(), data)
+
+    def test_command_line(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'diagram.umlsequence')
+            with open(path, 'w') as f:
+                f.write(SOURCE)
+            index_path = os.path.join(tmp, 'diagram.json')
+            result = run_command(path, '--line-index', index_path)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            with open(index_path) as f:
+                self.assertEqual(json.load(f), self.line_index(SOURCE))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'diagram.svg')))
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.directory = os.path.join(self.tmp, 'cache')
+
+    def entries(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.listdir(self.directory))
+
+    def generate(
+        self, source: str, cache: RenderCache | None, **options: object
+    ) -> bytes:
+        # render source to a file, and return it
+        inp = io.StringIO(source)
+        inp.name = 'diagram.umlsequence'
+        path = os.path.join(self.tmp, 'diagram.svg')
+        arguments: dict[str, object] = dict(
+            percent_zoom=100,
+            verbose=False,
+            debug=False,
+            bgcolor='white',
+            format='svg',
+            cache=cache,
+        )
+        arguments.update(options)
+        umlsequence2.generate(inp, path, **arguments)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_hit(self) -> None:
+        cache = RenderCache(self.directory)
+        data = self.generate(SOURCE, cache)
+        self.assertEqual(data, umlsequence2.render(SOURCE))
+        # (the output and the parsed commands)
+        self.assertEqual(len(self.entries()), 2)
+        with mock.patch.object(umlsequence2, 'render_all') as render_all:
+            self.assertEqual(self.generate(SOURCE, cache), data)
+        render_all.assert_not_called()
+
+    def test_miss(self) -> None:
+        cache = RenderCache(self.directory)
+        self.generate(SOURCE, cache)
+        with mock.patch.object(
+            umlsequence2, 'render_all', wraps=umlsequence2.render_all
+        ) as render_all:
+            self.generate(SOURCE, cache, percent_zoom=200)
+            self.generate(SOURCE + 'a -> b more\n', cache)
+            self.generate(SOURCE, cache, bgcolor='none')
+        self.assertEqual(render_all.call_count, 3)
+
+    def test_keys(self) -> None:
+        # any input of the output changes the key
+        cfg = get_config()
+        params = dict(percent_zoom=100, bgcolor='white', format='svg', version='1')
+        key = cache_key(SOURCE, cfg, **params)
+        self.assertEqual(cache_key(io.StringIO(SOURCE), cfg, **params), key)
+        keys = {
+            key,
+            cache_key(SOURCE + '\n', cfg, **params),
+            cache_key(SOURCE, override_config(COLUMN_WIDTH=5.0), **params),
+            cache_key(SOURCE, override_config(SVG_SYMBOLS=True), **params),
+            cache_key(SOURCE, cfg, **dict(params, percent_zoom=200)),
+            cache_key(SOURCE, cfg, **dict(params, bgcolor='none')),
+            cache_key(SOURCE, cfg, **dict(params, format='pdf')),
+            cache_key(SOURCE, cfg, **dict(params, version='2')),
+            cache_key(SOURCE, cfg, **dict(params, viewport=[0, 0, 1, 1])),
+        }
+        with mock.patch('umlsequence2.cache.code_fingerprint', return_value='new'):
+            keys.add(cache_key(SOURCE, cfg, **params))
+        self.assertEqual(len(keys), 10)
+
+    def store(self, cache: RenderCache, key: str, size: int, mtime: float) -> None:
+        cache.store(key, b'x' * size)
+        os.utime(cache.path(key), (mtime, mtime))
+
+    def test_evict(self) -> None:
+        # the oldest entries, down to EVICT_RATIO of the limit
+        cache = RenderCache(self.directory, 1000)
+        self.store(cache, 'a', 300, 1000)
+        self.store(cache, 'b', 300, 2000)
+        self.store(cache, 'c', 300, 3000)
+        self.assertEqual(self.entries(), ['a', 'b', 'c'])
+        self.store(cache, 'd', 200, 4000)
+        self.assertEqual(self.entries(), ['b', 'c', 'd'])
+        self.assertEqual(cache.size, 800)
+        self.assertLessEqual(cache.size, 1000 * EVICT_RATIO)
+
+    def test_refresh(self) -> None:
+        # a hit makes an entry the most recently used
+        cache = RenderCache(self.directory, 1000)
+        self.store(cache, 'a', 400, 1000)
+        self.store(cache, 'b', 400, 2000)
+        self.assertTrue(cache.fetch('a', os.path.join(self.tmp, 'out')))
+        self.assertGreater(os.stat(cache.path('a')).st_mtime, 2000)
+        self.assertFalse(cache.fetch('z', os.path.join(self.tmp, 'out')))
+        self.store(cache, 'c', 400, 3000)
+        self.assertEqual(self.entries(), ['a', 'c'])
+
+    def test_size(self) -> None:
+        # kept up to date, and scanned again once over the limit
+        cache = RenderCache(self.directory, 1000)
+        with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+            self.store(cache, 'a', 300, 1000)
+            self.store(cache, 'b', 300, 2000)
+            self.store(cache, 'a', 100, 3000)  # (replaced)
+            self.assertEqual(cache.size, 400)
+            self.assertEqual(evict.call_count, 1)
+            # by another process, unknown until the next scan
+            self.store(RenderCache(self.directory, 1000), 'c', 500, 4000)
+            self.store(cache, 'd', 200, 5000)
+            self.assertEqual(cache.size, 600)
+            self.assertEqual(evict.call_count, 1)
+            cache.store('e', b'x' * 500)
+            self.assertEqual(evict.call_count, 2)
+        self.assertEqual(cache.size, 700)
+        self.assertEqual(self.entries(), ['d', 'e'])
+
+    def test_commands(self) -> None:
+        # a miss for another zoom renders the cached commands
+        cache = RenderCache(self.directory)
+        self.generate(RICH_SOURCE, cache)
+        with mock.patch.object(Parser, 'iter_commands') as iter_commands:
+            data = self.generate(RICH_SOURCE, cache, percent_zoom=200)
+        iter_commands.assert_not_called()
+        self.assertEqual(data, umlsequence2.render(RICH_SOURCE, percent_zoom=200))
+        self.assertEqual(len(self.entries()), 3)
+
+    def test_atomic(self) -> None:
+        # no temporary file is left, even on failure
+        cache = RenderCache(self.directory)
+        cache.store('a', b'data')
+        with mock.patch.object(os, 'replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                cache.store('a', b'other')
+        self.assertEqual(cache.load('a'), b'data')
+        self.assertEqual(os.listdir(self.directory), ['a'])
+
+    def test_bypass(self) -> None:
+        # debug runs and --no-cache
+        cache = RenderCache(self.directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.generate(SOURCE, cache, debug=True)
+        self.assertEqual(self.entries(), [])
+        args = argparse.Namespace(no_cache=True, cache_dir=self.directory)
+        self.assertIsNone(umlsequence2.get_cache(args))
+
+        path = os.path.join(self.tmp, 'diagram.umlsequence')
+        with open(path, 'w') as f:
+            f.write(SOURCE)
+        result = run_command(path, '--no-cache', '--cache-dir', self.directory)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(self.entries(), [])
+        result = run_command(path, '--cache-dir', self.directory)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(len(self.entries()), 2)
+
+
+class OutputsTest(unittest.TestCase):
+    OUTPUTS = [('svg', 100), ('svg', 200), ('eps', 100)]
+
+    def test_render_all(self) -> None:
+        # byte-identical to separate runs
+        source = long_source(30)
+        expected = [
+            umlsequence2.render(source, fmt, percent_zoom=zoom)
+            for fmt, zoom in self.OUTPUTS
+        ]
+        self.assertEqual(umlsequence2.render_all(source, self.OUTPUTS), expected)
+        self.assertEqual(
+            umlsequence2.render_all(source, self.OUTPUTS, jobs=2), expected
+        )
+        with self.assertRaises(ValueError):
+            umlsequence2.render_all(source, self.OUTPUTS, jobs=-1)
+
+    def test_command_line(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'diagram.umlsequence')
+            with open(path, 'w') as f:
+                f.write(SOURCE)
+            result = run_command(path, '--no-cache', '-f', 'svg,eps', '-p', '100,200')
+            self.assertEqual(result.returncode, 0, result.stderr)
+            names = ['diagram-100.eps', 'diagram-100.svg', 'diagram-200.eps']
+            names += ['diagram-200.svg', 'diagram.umlsequence']
+            self.assertEqual(sorted(os.listdir(tmp)), names)
+            for fmt, zoom in [('svg', 200), ('eps', 100)]:
+                with open(os.path.join(tmp, f'diagram-{zoom}.{fmt}'), 'rb') as f:
+                    expected = umlsequence2.render(SOURCE, fmt, percent_zoom=zoom)
+                    self.assertEqual(f.read(), expected)
+
+            # a single zoom: no suffix
+            output = os.path.join(tmp, 'out.svg')
+            result = run_command(path, '--no-cache', '-f', 'svg,eps', '-o', output)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'out.svg')))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'out.eps')))
+
+    def test_rejected(self) -> None:
+        # several outputs without an input or output file
+        result = run_command('-f', 'svg,eps', input=SOURCE)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('several formats or zooms require', result.stderr)
+        for option in ['--markdown', '--watch=.', '--serve']:
+            result = run_command(option, '-p', '100,200')
+            self.assertEqual(result.returncode, 2, option)
+            self.assertIn(
+                'several formats or zooms require an input file', result.stderr
+            )
+
+
+class SnippetsTest(unittest.TestCase):
+    # (output name, source), with a failing snippet, and two snippets
+    # writing the same output
+    SNIPPETS = [
+        ('one.svg', 'a : A\n'),
+        ('same.svg', 'a : A\nb : B\n'),
+        ('same.svg', SOURCE),
+        ('bad.svg', 'a -> b call\n'),
+        ('last.svg', 'c : C\n'),
+    ]
+
+    def generate(self, directory: str, jobs: int) -> subprocess.CompletedProcess[str]:
+        path = os.path.join(directory, 'doc.md')
+        with open(path, 'w') as f:
+            for name, source in self.SNIPPETS:
+                output = os.path.join(directory, name)
+                f.write(f'Text\n\n```umlsequence {output}\n{source}```\n\n')
+        return run_command('--markdown', path, '--no-cache', '--jobs', str(jobs))
+
+    def test_jobs(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            sequential, parallel = os.path.join(tmp, '1'), os.path.join(tmp, '2')
+            os.mkdir(sequential)
+            os.mkdir(parallel)
+            result1 = self.generate(sequential, 1)
+            result2 = self.generate(parallel, 2)
+
+            # sequentially, up to the failing snippet
+            self.assertEqual(result1.returncode, 1)
+            self.assertEqual(
+                sorted(os.listdir(sequential)), ['doc.md', 'one.svg', 'same.svg']
+            )
+            # in parallel, all the others, then the failure
+            self.assertEqual(result2.returncode, 1)
+            self.assertEqual(
+                sorted(os.listdir(parallel)),
+                ['doc.md', 'last.svg', 'one.svg', 'same.svg'],
+            )
+            for name in ['one.svg', 'same.svg']:
+                with open(os.path.join(sequential, name), 'rb') as f1:
+                    with open(os.path.join(parallel, name), 'rb') as f2:
+                        self.assertEqual(f1.read(), f2.read())
+            # (the last snippet of the same output wins)
+            with open(os.path.join(parallel, 'same.svg'), 'rb') as f:
+                self.assertEqual(f.read(), umlsequence2.render(SOURCE))
+            with open(os.path.join(parallel, 'last.svg'), 'rb') as f:
+                self.assertEqual(f.read(), umlsequence2.render('c : C\n'))
+
+            # progress in the order of the snippets
+            names = ['one.svg', 'same.svg', 'same.svg', 'last.svg']
+            generated = re.findall(r'generated (.*)', result1.stderr)
+            self.assertEqual(
+                generated, [os.path.join(sequential, n) for n in names[:3]]
+            )
+            generated = re.findall(r'generated (.*)', result2.stderr)
+            self.assertEqual(generated, [os.path.join(parallel, n) for n in names])
+            self.assertIn(os.path.join(parallel, 'bad.svg') + ': ', result2.stderr)
+            self.assertIn('There is no object named "a"', result2.stderr)
+
+
+class SymbolsTest(unittest.TestCase):
+    def render(
+        self, source: str, svg_writer: str, symbols: bool
+    ) -> tuple[UmlBuilder, str]:
+        cfg = override_config(SVG_SYMBOLS=symbols)
+        cmds, _ = Parser(source).parse()
+        builder = UmlBuilder(cmds, None, 100, 'white', cfg, 'svg', svg_writer)
+        fp = io.BytesIO()
+        builder.run(fp)
+        return builder, fp.getvalue().decode()
+
+    def test_symbols(self) -> None:
+        # one definition per glyph, one reference per use, same size
+        for svg_writer in umlsequence2.SVG_WRITERS:
+            plain, plain_svg = self.render(RICH_SOURCE, svg_writer, False)
+            builder, svg = self.render(RICH_SOURCE, svg_writer, True)
+
+            glyphs = [
+                (op, f, tuple(coords[2:]))
+                for draw_list in builder.g.values()
+                for op, f, coords, _ in draw_list
+                if op in (dl.ACTOR, dl.CROSS, dl.ARROW_HEAD)
+            ]
+            defs = re.search('<defs>(.*)</defs>', svg)
+            assert defs is not None
+            ids = re.findall(r'<g id="([^"]+)">', defs[1])
+            self.assertEqual(len(ids), len(set(glyphs)))
+            self.assertEqual(len(ids), len(builder.gfx.symbols))
+            uses = re.findall(r'<use [^>]*xlink:href="#([^"]+)"', svg)
+            self.assertEqual(len(uses), len(glyphs))
+            self.assertEqual(set(uses), set(ids))
+
+            self.assertEqual(builder.gfx.get_size(), plain.gfx.get_size())
+            self.assertEqual(svg_size(svg.encode()), svg_size(plain_svg.encode()))
+            self.assertNotIn('<use ', plain_svg)
+
+
+class SvgWritersTest(unittest.TestCase):
+    # every primitive and flag, and texts to escape
+    SOURCE = (
+        RICH_SOURCE
+        + """\
+d : <D> & "d"
+a -> d <(> left & aligned
+a -> d <)> right <aligned>
+a -> d 'single' "double" <&>
+d // <note> & "x"
+"""
+    )
+
+    def test_coverage(self) -> None:
+        builder = UmlBuilder(
+            Parser(self.SOURCE).parse()[0], None, 100, 'white', get_config()
+        )
+        builder.build()
+        used = set()
+        for draw_list in builder.g.values():
+            for op, f, _, _ in draw_list:
+                used.add((op, 0))
+                used.update((op, 1 << bit) for bit in range(8) if f & 1 << bit)
+        expected = {(op, 0) for op in range(9)}
+        expected |= {(dl.RECT, dl.GREY), (dl.RECT, dl.TRANSPARENT)}
+        expected |= {(dl.LINE, flag) for flag in [dl.GREY, dl.DASHED, dl.DOTTED]}
+        text_flags = [dl.UNDERLINE, dl.START, dl.MIDDLE, dl.END, dl.LIGHT]
+        expected |= {(dl.TEXT, flag) for flag in text_flags}
+        expected |= {(dl.ARROW_HEAD, dl.FULL), (dl.ARROW_HEAD, dl.INV)}
+        self.assertLessEqual(expected, used)
+
+    def test_same_output(self) -> None:
+        # byte-identical to the svgwrite backend
+        for options in [
+            {},
+            dict(percent_zoom=150, bgcolor='none'),
+            dict(SVG_SYMBOLS=True),
+            dict(SVG_LINES=True),
+        ]:
+            expected = umlsequence2.render(self.SOURCE, **options)
+            self.assertIn(b'\'single\' "double" &lt;&amp;&gt;', expected)
+            self.assertEqual(
+                umlsequence2.render(self.SOURCE, svg_writer='stream', **options),
+                expected,
+                options,
+            )
+
+
+def rl_shapes(group: Any) -> list[Any]:
+    # the shapes of a reportlab drawing, out of their groups
+    from reportlab.graphics.shapes import Group
+
+    shapes = []
+    for shape in group.getContents():
+        if isinstance(shape, Group):
+            shapes += rl_shapes(shape)
+        else:
+            shapes.append(shape)
+    return shapes
+
+
+class RlRendererTest(unittest.TestCase):
+    def test_svglib(self) -> None:
+        # the drawing matches that of svglib from the SVG output
+        from reportlab.graphics.shapes import String
+        from svglib.svglib import svg2rlg
+
+        cmds, _ = Parser(SvgWritersTest.SOURCE).parse()
+        for percent_zoom in [100, 150]:
+            builder = UmlBuilder(cmds, None, percent_zoom, 'white', get_config(), 'pdf')
+            builder.build()
+            builder.draw()
+            drawing = builder.gfx.get_drawing()
+            svg = umlsequence2.render(SvgWritersTest.SOURCE, percent_zoom=percent_zoom)
+            expected = svg2rlg(io.BytesIO(svg))
+
+            self.assertEqual(
+                (drawing.width, drawing.height), (expected.width, expected.height)
+            )
+            shapes, expected_shapes = rl_shapes(drawing), rl_shapes(expected)
+            self.assertEqual(
+                Counter(type(shape).__name__ for shape in shapes),
+                Counter(type(shape).__name__ for shape in expected_shapes),
+            )
+
+            def texts(shapes: list[Any]) -> list[tuple[str, float, float, str]]:
+                return sorted(
+                    (shape.text, round(shape.x, 1), round(shape.y, 1), shape.textAnchor)
+                    for shape in shapes
+                    if isinstance(shape, String)
+                )
+
+            self.assertEqual(texts(shapes), texts(expected_shapes))
+
+    def test_page_size(self) -> None:
+        # of the PDF output, in pt, that of the SVG output
+        for source in [SOURCE, SvgWritersTest.SOURCE]:
+            pdf = umlsequence2.render(source, 'pdf', percent_zoom=150)
+            media_box = re.search(rb'/MediaBox \[ 0 0 ([0-9.]+) ([0-9.]+) \]', pdf)
+            assert media_box is not None
+            width, height = svg_size(umlsequence2.render(source, percent_zoom=150))
+            self.assertEqual(
+                (float(media_box[1]), float(media_box[2])),
+                (width * 0.75, height * 0.75),
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()